@@ -0,0 +1,125 @@
+import functools
+import inspect
+import threading
+import time
+
+from django.conf import settings
+
+from alerts.metrics import ALERTS_SHED, WEBHOOK_IN_FLIGHT
+from alerts.models.sent_notification import SentNotification
+
+
+class AdmissionController:
+    """
+    Admission control of the alert webhooks, shedding the alerts which are not critical when the service is overloaded.
+
+    The service is overloaded when more than max_in_flight requests are being processed by this process, or when more
+    than max_outbox_depth notifications are pending in the outbox, the dispatch falling behind. The critical alerts are
+    always accepted, the other ones are rejected so that the edge devices send them again after retry_after seconds.
+    The outbox depth is counted at most every refresh_interval seconds, so that the admission stays cheap under load.
+    A threshold of 0 disables it.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_outbox_depth: int,
+        refresh_interval: float,
+        retry_after: int,
+        clock=time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_outbox_depth = max_outbox_depth
+        self.refresh_interval = refresh_interval
+        self.retry_after = retry_after
+        self.clock = clock
+        self._in_flight = 0
+        self._outbox_depth = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _add_in_flight(self, count: int) -> None:
+        with self._lock:
+            self._in_flight += count
+            WEBHOOK_IN_FLIGHT.set(self._in_flight)
+
+    def track(self, post):
+        """
+        Decorate the post method of a webhook view, sync or async, to count the requests being processed.
+        """
+        if inspect.iscoroutinefunction(post):
+            @functools.wraps(post)
+            async def async_wrapper(*args, **kwargs):
+                self._add_in_flight(1)
+                try:
+                    return await post(*args, **kwargs)
+                finally:
+                    self._add_in_flight(-1)
+
+            return async_wrapper
+
+        @functools.wraps(post)
+        def wrapper(*args, **kwargs):
+            self._add_in_flight(1)
+            try:
+                return post(*args, **kwargs)
+            finally:
+                self._add_in_flight(-1)
+
+        return wrapper
+
+    def get_outbox_depth(self) -> int:
+        """
+        Number of pending notifications in the outbox, counted again at most every refresh_interval seconds.
+        """
+        now = self.clock()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return self._outbox_depth
+            # The requests arriving meanwhile use the previous depth instead of all counting it
+            self._checked_at = now
+        outbox_depth = SentNotification.objects.filter(status="pending").count()
+        self._outbox_depth = outbox_depth
+        return outbox_depth
+
+    def get_overload(self) -> str | None:
+        """
+        Reason why the service is overloaded, "in_flight" or "outbox_depth", None when it is not.
+        """
+        if self.max_in_flight and self._in_flight > self.max_in_flight:
+            return "in_flight"
+        if self.max_outbox_depth and self.get_outbox_depth() > self.max_outbox_depth:
+            return "outbox_depth"
+        return None
+
+    def admit(self, severity: str) -> bool:
+        """
+        Whether an alert of the given severity is accepted, counting it as shed when it is not.
+        """
+        if severity == "critical":
+            return True
+        reason = self.get_overload()
+        if reason is None:
+            return True
+        ALERTS_SHED.inc(reason=reason, severity=severity)
+        return False
+
+    def clear(self) -> None:
+        """
+        Forget the outbox depth, it is counted again on the next check.
+        """
+        with self._lock:
+            self._checked_at = None
+            self._outbox_depth = 0
+
+
+webhook_admission = AdmissionController(
+    max_in_flight=settings.ALERTS_ADMISSION_MAX_IN_FLIGHT,
+    max_outbox_depth=settings.ALERTS_ADMISSION_MAX_OUTBOX_DEPTH,
+    refresh_interval=settings.ALERTS_ADMISSION_REFRESH_INTERVAL,
+    retry_after=settings.ALERTS_ADMISSION_RETRY_AFTER,
+)
@@ -1,12 +1,26 @@
+from alerts.classification import ClassificationIndex
+
+
+# Default severity of the labels, overridden by the classification rules
 ALERT_CLASSIFICATION = {
     "theft": "critical",
     "suspicious": "standard",
     "normal": "standard",
 }
 
-def get_alert_classification(label):
+classification_index = ClassificationIndex(ALERT_CLASSIFICATION)
+
+
+def get_alert_classification(label, location=None, time_spotted=None):
+    """
+    Returns the classification of the alert based on its label,
+    and on the classification rules of its store and time of day when they are given.
+    """
+    return classification_index.classify(label, location, time_spotted)
+
+
+def get_alert_severity(alert):
     """
-    Returns the classification of the alert based on its label.
+    Returns the classification of an alert, with the rules of its store at the time it was spotted.
     """
-    return ALERT_CLASSIFICATION.get(label.lower(), "standard")
-    
\ No newline at end of file
+    return classification_index.classify(alert.label, alert.location_id, alert.time_spotted)
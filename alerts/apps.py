@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AlertsConfig(AppConfig):
     name = 'alerts'
+
+    def ready(self):
+        # Connect the signal handlers keeping the in-memory caches up to date
+        from alerts import signals  # noqa: F401
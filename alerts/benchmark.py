@@ -0,0 +1,279 @@
+import math
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import time as time_of_day
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from alerts.alerts import classification_index, get_alert_classification
+from alerts.channels import NOTIFICATION_CHANNELS
+from alerts.classification import CLASSIFICATION_CACHE_NAME
+from alerts.dispatch import dispatch_pending
+from alerts.models.alert import ALERT_LABELS
+from alerts.models.cache_version import CacheVersion
+from alerts.models.classification_rule import ClassificationRule
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.receiver import FaultProfile, NotificationReceiver
+from alerts.routing import ROUTING_CACHE_NAME, routing_index
+
+
+@contextmanager
+def api_channel_targeting(api_root: str, batch: bool = False):
+    """
+    Point the API channel to another API root while in the context.
+
+    :param api_root: The root URL of the API.
+    :param batch: Whether the channel sends an alert once for all its recipients.
+    """
+    channel = NOTIFICATION_CHANNELS["api"]
+    urls = (channel.api_hook_url, channel.api_batch_hook_url, channel.api_capabilities_url)
+    batch_enabled = channel.batch_enabled
+    channel.batch_enabled = batch
+    channel.api_hook_url = f"{api_root}/webhook/notifications"
+    channel.api_batch_hook_url = f"{api_root}/webhook/notifications/batch"
+    channel.api_capabilities_url = f"{api_root}/webhook/capabilities"
+    channel._batch_supported = None
+    try:
+        yield channel
+    finally:
+        channel.api_hook_url, channel.api_batch_hook_url, channel.api_capabilities_url = urls
+        channel.batch_enabled = batch_enabled
+        channel._batch_supported = None
+
+
+def seed(stores: int, subscribers_per_store: int) -> list[str]:
+    """
+    Create the stores, and the users subscribed to all the alerts of each store through the API channel.
+
+    :return: The locations of the created stores.
+    """
+    locations = [f"bench-store-{i}" for i in range(stores)]
+    Store.objects.bulk_create([Store(location=location, name=location) for location in locations])
+    users = User.objects.bulk_create(
+        [
+            User(email=f"bench-user-{i}@example.com", api_uid=f"bench-user-{i}")
+            for i in range(stores * subscribers_per_store)
+        ]
+    )
+    UserAlertSubscripion.objects.bulk_create(
+        [
+            UserAlertSubscripion(
+                user=user, store_id=locations[i // subscribers_per_store],
+                alert_preference="both", notification_channel="api",
+            )
+            for i, user in enumerate(users)
+        ]
+    )
+    # Bulk creations do not send the signals refreshing the routing index
+    routing_index.invalidate()
+    CacheVersion.bump(ROUTING_CACHE_NAME)
+    return locations
+
+
+def seed_rules(locations: list[str], rules_per_store: int) -> None:
+    """
+    Create classification rules for each store, half of them all day and half of them for a time of day.
+    """
+    labels = [label for label, _ in ALERT_LABELS]
+    ClassificationRule.objects.bulk_create(
+        [
+            ClassificationRule(
+                store_id=location,
+                label=labels[i % len(labels)] if i < len(labels) else f"bench-label-{i}",
+                severity="critical" if i % 2 else "standard",
+                start_time=time_of_day(i % 24) if i % 2 else None,
+                end_time=time_of_day((i + 8) % 24) if i % 2 else None,
+            )
+            for location in locations
+            for i in range(rules_per_store)
+        ]
+    )
+    # Bulk creations do not send the signals recompiling the classification rules
+    classification_index.invalidate()
+    CacheVersion.bump(CLASSIFICATION_CACHE_NAME)
+
+
+def run_classification(locations: list[str], lookups: int) -> dict:
+    """
+    Classify alerts spread over the stores, labels and time of day, with the compiled classification rules.
+
+    :return: The number of rules, and the duration of a classification.
+    """
+    labels = [label for label, _ in ALERT_LABELS]
+    now = time.time()
+    # Compile the rules before measuring
+    get_alert_classification(labels[0], locations[0], now)
+    start = time.perf_counter()
+    for i in range(lookups):
+        get_alert_classification(labels[i % len(labels)], locations[i % len(locations)], now + i * 37)
+    duration = time.perf_counter() - start
+    return {
+        "rules": ClassificationRule.objects.count(),
+        "lookups": lookups,
+        "mean_us": duration / lookups * 1e6 if lookups else 0.0,
+    }
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """
+    Percentile of the values with the nearest-rank method, 0 when there are none.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(rank / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    """
+    Summary of latencies in seconds, in milliseconds.
+    """
+    return {
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def post_alert(client: Client, url: str, alert_data: dict) -> tuple[int, float, int]:
+    """
+    Post an alert to the webhook.
+
+    :return: The status code of the response, its latency in seconds, and the number of queries made.
+    """
+    with CaptureQueriesContext(connections["default"]) as queries:
+        start = time.perf_counter()
+        response = client.post(url, alert_data, content_type="application/json")
+        latency = time.perf_counter() - start
+    return response.status_code, latency, len(queries)
+
+
+def run_webhook_load(locations: list[str], alerts: int, concurrency: int) -> dict:
+    """
+    Post alerts to the webhook from concurrent clients, spread over the stores and labels.
+
+    :return: The throughput, latency distribution, status codes and queries per alert of the webhook.
+    """
+    url = reverse("alert-webhook")
+    labels = [label for label, _ in ALERT_LABELS]
+    alerts_data = [
+        {
+            "url": f"http://example.com/alerts/{i}",
+            "location": locations[i % len(locations)],
+            "alert_uuid": str(uuid.uuid4()),
+            "label": labels[i % len(labels)],
+            "time_spotted": time.time(),
+        }
+        for i in range(alerts)
+    ]
+
+    def post_alerts(chunk: list[dict]) -> list[tuple[int, float, int]]:
+        client = Client()
+        try:
+            return [post_alert(client, url, alert_data) for alert_data in chunk]
+        finally:
+            if concurrency > 1:
+                connections.close_all()
+
+    chunks = [alerts_data[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = [outcome for chunk in executor.map(post_alerts, chunks) for outcome in chunk]
+    else:
+        # No thread, so that the alerts are posted in the current connection and transaction
+        outcomes = post_alerts(alerts_data)
+    duration = time.perf_counter() - start
+
+    status_codes = {}
+    for status_code, _, _ in outcomes:
+        status_codes[str(status_code)] = status_codes.get(str(status_code), 0) + 1
+    queries = [query_count for _, _, query_count in outcomes]
+    return {
+        "alerts": alerts,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "throughput_per_s": alerts / duration if duration else 0.0,
+        "latency": summarize_latencies([latency for _, latency, _ in outcomes]),
+        "status_codes": status_codes,
+        "queries_per_alert": statistics.fmean(queries) if queries else 0.0,
+        "max_queries_per_alert": max(queries, default=0),
+    }
+
+
+def run_dispatch() -> dict:
+    """
+    Drain the outbox filled by the webhook, sending the notifications to the current API root.
+
+    :return: The throughput and the number of outbound requests per alert of the dispatch.
+    """
+    with CaptureQueriesContext(connections["default"]) as queries:
+        start = time.perf_counter()
+        sent = dispatch_pending()
+        duration = time.perf_counter() - start
+    return {
+        "sent": sent,
+        "duration_s": duration,
+        "throughput_per_s": sent / duration if duration else 0.0,
+        "queries": len(queries),
+    }
+
+
+def run_benchmark(
+    stores: int,
+    subscribers_per_store: int,
+    alerts: int,
+    concurrency: int,
+    batch: bool = False,
+    profile: FaultProfile | None = None,
+    rules_per_store: int = 0,
+) -> dict:
+    """
+    Seed the database, post alerts to the webhook concurrently, then dispatch the notifications to a local receiver.
+
+    :param profile: The faults injected by the receiver, none by default.
+    :param rules_per_store: Number of classification rules created for each store.
+
+    :return: The results of the run, as a JSON serializable dict.
+    """
+    locations = seed(stores, subscribers_per_store)
+    seed_rules(locations, rules_per_store)
+    classification = run_classification(locations, 100000)
+    receiver = NotificationReceiver(profile=profile)
+    receiver.start()
+    try:
+        with api_channel_targeting(receiver.url, batch=batch):
+            webhook = run_webhook_load(locations, alerts, concurrency)
+            dispatch = run_dispatch()
+    finally:
+        receiver.stop()
+
+    receiver_stats = receiver.stats()
+    notification_requests = sum(receiver_stats["requests"].values())
+    dispatch["outbound_requests"] = receiver_stats["requests"]
+    dispatch["receiver_outcomes"] = receiver_stats["outcomes"]
+    dispatch["outbound_requests_per_alert"] = notification_requests / alerts if alerts else 0.0
+    return {
+        "config": {
+            "stores": stores,
+            "subscribers_per_store": subscribers_per_store,
+            "alerts": alerts,
+            "concurrency": concurrency,
+            "batch": batch,
+            "rules_per_store": rules_per_store,
+        },
+        "classification": classification,
+        "webhook": webhook,
+        "dispatch": dispatch,
+    }
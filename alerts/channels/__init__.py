@@ -1,8 +1,10 @@
 from .api_channel import APIChannel
+from .email_channel import EmailChannel
 
 
 NOTIFICATION_CHANNELS = {
     "api": APIChannel(),
+    "email": EmailChannel(),
 }
 
 NOTIFICATION_CHANNEL_CHOICES = [
@@ -1,10 +1,19 @@
+import asyncio
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
+from django.conf import settings
 from dotenv import load_dotenv
-from urllib3 import PoolManager, Retry
-from urllib3.exceptions import MaxRetryError
+from urllib3 import HTTPResponse, PoolManager, Retry
+from urllib3.exceptions import HTTPError
 
 from alerts.channels.base_channel import BaseChannel, ChannelResult
+from alerts.channels.circuit_breaker import CircuitBreaker, CircuitOpenError
+from alerts.channels.rate_limiter import RateLimitedError, TokenBucketRateLimiter
 from alerts.models.user import User
 from alerts.models.alert import Alert
 
@@ -21,9 +30,41 @@ class APIChannel(BaseChannel):
         """
         Initialize the APIChannel.
         """
-        self.retries = Retry(total=5, backoff_factor=1)
-        self.http = PoolManager(retries=self.retries)
-        self.api_hook_url = f"{os.getenv('ALERT_API_ROOT', 'http://localhost:8001/')}/webhook/notifications"
+        # Maximum number of connections kept open to the API, which is also the number of concurrent async sends: at
+        # least ALERTS_ASYNC_CONCURRENCY, so that all the notifications sent at the same time by the async webhook are
+        self.max_connections = max(int(os.getenv("ALERT_API_MAX_CONNECTIONS", 10)), settings.ALERTS_ASYNC_CONCURRENCY)
+        # A failed call is not retried with a backoff in the worker, which would block it during an outage before the
+        # circuit opens: it is retried by the outbox retries. Only a connection which could not be established, such
+        # as a pooled connection closed by the API, is retried once right away. The API quota is handled by the rate
+        # limiter, a 429 is not retried either.
+        self.retries = Retry(
+            total=1, connect=1, read=False, status=0, other=0, backoff_factor=0, respect_retry_after_header=False
+        )
+        self.http = PoolManager(retries=self.retries, maxsize=self.max_connections)
+        api_root = os.getenv('ALERT_API_ROOT', 'http://localhost:8001/')
+        self.api_hook_url = f"{api_root}/webhook/notifications"
+        self.api_batch_hook_url = f"{api_root}/webhook/notifications/batch"
+        self.api_capabilities_url = f"{api_root}/webhook/capabilities"
+        # Send one request per alert for all the users, when the API advertises it supports it
+        self.batch_enabled = os.getenv("ALERT_API_BATCH", "false").lower() in ("1", "true", "yes")
+        # Seconds during which the capabilities advertised by the API are cached
+        self.capabilities_ttl = int(os.getenv("ALERT_API_CAPABILITIES_TTL", 300))
+        self._batch_supported = None
+        self._capabilities_checked_at = 0.0
+        self._executor = None
+        # One circuit breaker per endpoint, so that a dead API fails fast instead of blocking in retries
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        # Quota of calls per second to the API, shared by the processes using the same state file, disabled when 0
+        rate_limit = float(os.getenv("ALERT_API_RATE_LIMIT", 0))
+        self.rate_limiter = None
+        if rate_limit > 0:
+            self.rate_limiter = TokenBucketRateLimiter(
+                rate=rate_limit,
+                burst=float(os.getenv("ALERT_API_RATE_BURST", rate_limit)),
+                max_wait=float(os.getenv("ALERT_API_RATE_MAX_WAIT", 1)),
+                path=os.getenv("ALERT_API_RATE_LIMIT_PATH") or None,
+            )
 
     def send_alert(self, user: User, alert: Alert) -> ChannelResult:
         """
@@ -33,7 +74,77 @@ class APIChannel(BaseChannel):
         :param alert: The parameters to send the alert.
         :return: ChannelResult indicating success or failure of the operation.
         """
+        invalid_result = self._validate(user, alert)
+        if invalid_result:
+            return invalid_result
+
+        return self._post(user, alert)
+
+    def send_alert_batch(self, users: list[User], alert: Alert) -> list[ChannelResult]:
+        """
+        Send an alert to several users via API.
+
+        When the batch mode is enabled and the API supports it, a single request is sent with the list of target users,
+        and the API returns the result for each of them. Otherwise, the alert is sent to each user separately.
+
+        :param users: The users to whom the alert is being sent.
+        :param alert: The parameters to send the alert.
+        :return: One ChannelResult per user, in the same order as users.
+        """
+        if len(users) < 2 or not self.batch_enabled or not self._supports_batch():
+            return super().send_alert_batch(users, alert)
+
+        results = [self._validate(user, alert) for user in users]
+        targets = [user for user, result in zip(users, results) if result is None]
+        if not targets:
+            return results
+
+        batch_results = iter(self._post_batch(targets, alert))
+        return [result or next(batch_results) for result in results]
 
+    def send_digest(self, user: User, alerts: list[Alert]) -> ChannelResult:
+        """
+        Send several alerts to a user via API in one request.
+        The payload is the one of the first alert, with all the alerts listed in its "alerts" field.
+
+        :param user: The user to whom the alerts are being sent.
+        :param alerts: The alerts to send, the oldest first.
+        :return: ChannelResult indicating success or failure of the operation.
+        """
+        invalid_result = self._validate(user, alerts[0] if alerts else None)
+        if invalid_result:
+            return invalid_result
+
+        return self._post(user, alerts[0], digest=alerts)
+
+    async def asend_alert(self, user: User, alert: Alert) -> ChannelResult:
+        """
+        Send an alert with the given message via API, without blocking the event loop.
+
+        The HTTP request itself is made by urllib3 in the channel thread pool, sized as the connection pool,
+        so that concurrent sends reuse the kept-alive connections.
+
+        :param user: The user to whom the alert is being sent.
+        :param alert: The parameters to send the alert.
+        :return: ChannelResult indicating success or failure of the operation.
+        """
+        invalid_result = self._validate(user, alert)
+        if invalid_result:
+            return invalid_result
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_connections, thread_name_prefix="api-channel"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._post, user, alert)
+
+    def _validate(self, user: User, alert: Alert) -> ChannelResult | None:
+        """
+        Validate the user and alert parameters.
+
+        :return: A failed ChannelResult if the parameters are invalid, None otherwise.
+        """
         # Validate user parameters
         if not user or not isinstance(user, User):
             return ChannelResult(success=False, info="Invalid user")
@@ -45,29 +156,198 @@ class APIChannel(BaseChannel):
         if not alert or not isinstance(alert, Alert):
             return ChannelResult(success=False, info="Invalid parameters for alert")
 
-        # Prepare the API hook URL
+        return None
+
+    def _supports_batch(self) -> bool:
+        """
+        Check whether the API advertises the batch notifications endpoint.
+        """
+        now = time.monotonic()
+        if self._batch_supported is not None and now - self._capabilities_checked_at < self.capabilities_ttl:
+            return self._batch_supported
+
+        try:
+            response = self.http.request(
+                "GET", self.api_capabilities_url, timeout=int(os.getenv("ALERT_API_TIMEOUT", 5)), retries=False
+            )
+            capabilities = json.loads(response.data) if response.status == 200 else {}
+            self._batch_supported = isinstance(capabilities, dict) and bool(capabilities.get("batch"))
+        except (HTTPError, ValueError):
+            self._batch_supported = False
+        self._capabilities_checked_at = now
+        return self._batch_supported
+
+    def _get_breaker(self, url: str) -> CircuitBreaker:
+        """
+        Get the circuit breaker of an endpoint.
+        """
+        with self._breakers_lock:
+            if url not in self._breakers:
+                self._breakers[url] = CircuitBreaker(
+                    failure_rate_threshold=float(os.getenv("ALERT_API_BREAKER_FAILURE_RATE", 0.5)),
+                    slow_call_rate_threshold=float(os.getenv("ALERT_API_BREAKER_SLOW_CALL_RATE", 0.5)),
+                    slow_call_duration=float(os.getenv("ALERT_API_BREAKER_SLOW_CALL_DURATION", 5)),
+                    window_size=int(os.getenv("ALERT_API_BREAKER_WINDOW_SIZE", 20)),
+                    minimum_calls=int(os.getenv("ALERT_API_BREAKER_MINIMUM_CALLS", 5)),
+                    open_duration=float(os.getenv("ALERT_API_BREAKER_OPEN_DURATION", 30)),
+                )
+            return self._breakers[url]
+
+    def _request(self, url: str, payload: dict) -> HTTPResponse:
+        """
+        Post a payload to the API through the circuit breaker of the endpoint and the rate limiter of the API.
+
+        :raises CircuitOpenError: If the circuit of the endpoint is open.
+        :raises RateLimitedError: If the API quota does not allow the call within the maximum wait.
+        :raises HTTPError: If the API did not respond.
+        """
+        breaker = self._get_breaker(url)
+        if breaker.state == CircuitBreaker.OPEN:
+            raise CircuitOpenError(f"Circuit open for {url}")
+        # The quota is checked before reserving a half-open probe, which must then be made
+        if self.rate_limiter:
+            self.rate_limiter.acquire(urlsplit(url).netloc)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {url}")
+
+        request_kwargs = {"json": payload, "timeout": int(os.getenv("ALERT_API_TIMEOUT", 5))}
+        if breaker.state != CircuitBreaker.CLOSED:
+            # While half-open, the probe is not retried at all so that it fails fast
+            request_kwargs["retries"] = False
+
+        start = time.monotonic()
+        try:
+            response = self.http.request("POST", url, **request_kwargs)
+        except HTTPError:
+            breaker.record_failure(time.monotonic() - start)
+            raise
+
+        if response.status >= 500:
+            breaker.record_failure(time.monotonic() - start)
+        else:
+            # An API over quota (429) still works, the notification is deferred and the rate limiter slowed down
+            breaker.record_success(time.monotonic() - start)
+        if response.status == 429 and self.rate_limiter:
+            self.rate_limiter.block(urlsplit(url).netloc, self._get_retry_after(response))
+        return response
+
+    def _get_retry_after(self, response: HTTPResponse) -> float:
+        """
+        Get the seconds to wait before calling the API again from the Retry-After header of a 429 response.
+        """
+        try:
+            return max(1.0, float(response.headers.get("Retry-After", 1)))
+        except (TypeError, ValueError):
+            return 1.0
 
+    def _deferred_result(self, alert: Alert, error: Exception) -> ChannelResult:
+        """
+        Result of a notification which was not sent, and is sent again later.
+        """
+        return ChannelResult(
+            success=False,
+            info=f"Alert {alert.alert_uuid} deferred: {str(error)}",
+            deferred=True,
+            retry_after=getattr(error, "retry_after", None),
+        )
+
+    def _post_batch(self, users: list[User], alert: Alert) -> list[ChannelResult]:
+        """
+        Post the alert once for all the users to the API batch hook URL.
+
+        The API answers with the result of each target user: {"results": {"<api_uid>": {"success": bool, "info": str}}}
+        """
         payload = {
             "url": alert.url,
             "alert_uuid": alert.alert_uuid,
-            "location": alert.location.location,
+            "location": alert.location_id,
             "label": alert.label,
-            "target_user_id": user.api_uid,
+            "target_user_ids": [user.api_uid for user in users],
         }
 
-        api_timeout = int(os.getenv("ALERT_API_TIMEOUT", 5))
+        try:
+            response = self._request(self.api_batch_hook_url, payload)
+        except (CircuitOpenError, RateLimitedError) as e:
+            return [self._deferred_result(alert, e) for _ in users]
+        except HTTPError as e:
+            info = f"Failed to send alert {alert.alert_uuid}. No response from API: {self.api_batch_hook_url}. Error: {str(e)}"
+            return [ChannelResult(success=False, info=info) for _ in users]
+
+        if response.status == 429:
+            error = RateLimitedError(self.api_batch_hook_url, self._get_retry_after(response))
+            return [self._deferred_result(alert, error) for _ in users]
+
+        if response.status == 404:
+            # The API does not support batches anymore, send the alert to each user separately
+            self._batch_supported = False
+            return [self._post(user, alert) for user in users]
+
+        try:
+            user_results = json.loads(response.data)["results"] if response.status == 200 else None
+        except (ValueError, KeyError, TypeError):
+            user_results = None
+
+        if not isinstance(user_results, dict):
+            info = f"Failed to send alert {alert.alert_uuid}. Status: {response.status} - {response}"
+            return [ChannelResult(success=False, info=info) for _ in users]
+
+        results = []
+        for user in users:
+            user_result = user_results.get(user.api_uid)
+            if not isinstance(user_result, dict):
+                results.append(
+                    ChannelResult(success=False, info=f"No result for alert {alert.alert_uuid} from API for {user.email}")
+                )
+            elif user_result.get("success"):
+                results.append(ChannelResult(success=True, info=f"Alert sent to {user.email}: {alert.alert_uuid}"))
+            else:
+                results.append(
+                    ChannelResult(
+                        success=False,
+                        info=f"Failed to send alert {alert.alert_uuid} to {user.email}: {user_result.get('info', '')}",
+                    )
+                )
+        return results
+
+    def _post(self, user: User, alert: Alert, digest: list[Alert] | None = None) -> ChannelResult:
+        """
+        Post the alert to the API hook URL.
+
+        :param digest: The alerts sent together with the alert as a digest, listed in the "alerts" field of the payload.
+        """
+        # The store location is the primary key of the store, no need to fetch the store
+        payload = {
+            "url": alert.url,
+            "alert_uuid": alert.alert_uuid,
+            "location": alert.location_id,
+            "label": alert.label,
+            "target_user_id": user.api_uid,
+        }
+        if digest:
+            payload["alerts"] = [
+                {
+                    "url": digest_alert.url,
+                    "alert_uuid": digest_alert.alert_uuid,
+                    "label": digest_alert.label,
+                    "time_spotted": digest_alert.time_spotted,
+                }
+                for digest_alert in digest
+            ]
 
         # Send the alert via API
         try:
-            response = self.http.request(
-                "POST", self.api_hook_url, json=payload, timeout=api_timeout
-            )
-        except MaxRetryError as e:
+            response = self._request(self.api_hook_url, payload)
+        except (CircuitOpenError, RateLimitedError) as e:
+            return self._deferred_result(alert, e)
+        except HTTPError as e:
             return ChannelResult(
                 success=False,
                 info=f"Failed to send alert {alert.alert_uuid}. No response from API: {self.api_hook_url}. Error: {str(e)}",
             )
-        
+
+        if response.status == 429:
+            return self._deferred_result(alert, RateLimitedError(self.api_hook_url, self._get_retry_after(response)))
+
         if response.status != 200:
             return ChannelResult(
                 success=False,
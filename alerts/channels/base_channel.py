@@ -1,4 +1,7 @@
 from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+
 from alerts.models.user import User
 from alerts.models.alert import Alert
 
@@ -6,13 +9,20 @@ from alerts.models.alert import Alert
 class ChannelResult:
     """
     Represents the result of an alert channel operation.
+    A deferred result means the alert was not sent, but can be sent again later (e.g. the downstream service is down),
+    after retry_after seconds when the channel knows it.
     """
-    def __init__(self, success: bool, info: str = ""):
+    def __init__(self, success: bool, info: str = "", deferred: bool = False, retry_after: float | None = None):
         self.success = success
         self.info = info
+        self.deferred = deferred
+        self.retry_after = retry_after
 
     def __repr__(self):
-        return f"ChannelResult(success={self.success}, info='{self.info}')"
+        return (
+            f"ChannelResult(success={self.success}, info='{self.info}', deferred={self.deferred}, "
+            f"retry_after={self.retry_after})"
+        )
 
 
 class BaseChannel(ABC):
@@ -32,3 +42,38 @@ class BaseChannel(ABC):
 
         """
         raise NotImplementedError("Subclasses must implement this method.")
+
+    def send_alert_batch(self, users: list[User], alert: Alert) -> list[ChannelResult]:
+        """
+        Send an alert to several users.
+        By default the alert is sent to each user separately, channels can override it to send the alert once for all the users.
+
+        :param users: The users to whom the alert is being sent.
+        :param alert: The parameters to send the alert.
+        :return: One ChannelResult per user, in the same order as users.
+        """
+        return [self.send_alert(user, alert) for user in users]
+
+    def send_digest(self, user: User, alerts: list[Alert]) -> ChannelResult:
+        """
+        Send several alerts to a user as one notification.
+        By default each alert is sent separately and the first failure is returned, channels should override it
+        to send a single message listing all the alerts.
+
+        :param user: The user to whom the alerts are being sent.
+        :param alerts: The alerts to send, the oldest first.
+        :return: ChannelResult indicating success or failure of the operation.
+        """
+        results = [self.send_alert(user, alert) for alert in alerts]
+        return next((result for result in results if not result.success), results[0])
+
+    async def asend_alert(self, user: User, alert: Alert) -> ChannelResult:
+        """
+        Asynchronous version of send_alert, used to send the alert to many users concurrently.
+        By default the synchronous send_alert is run in a thread, channels can override it with a native implementation.
+
+        :param user: The user to whom the alert is being sent.
+        :param alert: The parameters to send the alert.
+        :return: ChannelResult indicating success or failure of the operation.
+        """
+        return await sync_to_async(self.send_alert, thread_sensitive=False)(user, alert)
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is refused because the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker protecting the calls to a downstream endpoint.
+
+    The outcome of the last calls is kept in a sliding window. When the rate of failed calls, or of calls slower than
+    slow_call_duration, reaches its threshold, the circuit opens and calls are refused without reaching the endpoint.
+    After open_duration seconds the circuit is half-open: a few probe calls are let through, and their outcome
+    decides whether the circuit closes again or stays open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        slow_call_rate_threshold: float = 0.5,
+        slow_call_duration: float = 5.0,
+        window_size: int = 20,
+        minimum_calls: int = 5,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock=time.monotonic,
+    ):
+        """
+        Initialize the CircuitBreaker.
+
+        :param failure_rate_threshold: Rate of failed calls in the window opening the circuit.
+        :param slow_call_rate_threshold: Rate of slow calls in the window opening the circuit.
+        :param slow_call_duration: Duration in seconds from which a call is considered slow.
+        :param window_size: Number of calls kept in the sliding window.
+        :param minimum_calls: Number of calls in the window required before the rates are evaluated.
+        :param open_duration: Seconds during which the circuit stays open before letting probe calls through.
+        :param half_open_max_calls: Number of probe calls allowed at the same time while half-open.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.minimum_calls = minimum_calls
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self._calls = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call can be made, reserving a probe call when the circuit is half-open.
+        """
+        with self._lock:
+            self._update_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self, duration: float = 0.0) -> None:
+        """
+        Record a call that succeeded, which is still counted as slow if it lasted more than slow_call_duration.
+        """
+        self._record(failed=False, duration=duration)
+
+    def record_failure(self, duration: float = 0.0) -> None:
+        """
+        Record a call that failed.
+        """
+        self._record(failed=True, duration=duration)
+
+    def _record(self, failed: bool, duration: float) -> None:
+        slow = duration >= self.slow_call_duration
+        with self._lock:
+            self._update_state()
+            if self._state == self.HALF_OPEN:
+                # The probe decides the state of the circuit
+                if failed or slow:
+                    self._open()
+                else:
+                    self._close()
+                return
+
+            self._calls.append((failed, slow))
+            if self._state == self.CLOSED and len(self._calls) >= self.minimum_calls:
+                failure_rate = sum(call[0] for call in self._calls) / len(self._calls)
+                slow_call_rate = sum(call[1] for call in self._calls) / len(self._calls)
+                if failure_rate >= self.failure_rate_threshold or slow_call_rate >= self.slow_call_rate_threshold:
+                    self._open()
+
+    def _update_state(self) -> None:
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = self.clock()
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._calls.clear()
+
+    def __repr__(self):
+        return f"CircuitBreaker(state='{self.state}')"
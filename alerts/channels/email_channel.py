@@ -0,0 +1,304 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime, timezone
+from email.message import EmailMessage
+
+from django.template.loader import render_to_string
+from dotenv import load_dotenv
+
+from alerts.alerts import get_alert_severity
+from alerts.channels.base_channel import BaseChannel, ChannelResult
+from alerts.models.user import User
+from alerts.models.alert import Alert
+
+
+load_dotenv()
+
+
+class SMTPConnectionPool:
+    """
+    Pool of authenticated SMTP connections, kept open to send several messages each.
+
+    At most max_size connections are open at the same time. A connection is closed once it sent max_messages messages
+    or stayed idle more than max_idle seconds, since servers usually limit both.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = False,
+        timeout: float = 10,
+        max_size: int = 4,
+        max_messages: int = 100,
+        max_idle: float = 60,
+    ):
+        """
+        Initialize the SMTPConnectionPool, the connections are opened when first needed.
+
+        :param host: The SMTP server host.
+        :param port: The SMTP server port.
+        :param username: The user to log in with, no login when empty.
+        :param password: The password to log in with.
+        :param use_tls: Whether to upgrade the connections with STARTTLS.
+        :param timeout: Seconds after which a connection or a command to the server times out.
+        :param max_size: Maximum number of connections open at the same time.
+        :param max_messages: Number of messages sent on a connection before it is renewed.
+        :param max_idle: Seconds after which an idle connection is renewed.
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        # Idle connections, the most recently used first, as [connection, messages sent, last used at]
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+        except BaseException:
+            self._close(connection)
+            raise
+        return connection
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def acquire(self) -> list:
+        """
+        Take a connection from the pool, opening one if none is idle, and waiting if max_size are in use.
+
+        :return: The pooled connection, as [connection, messages sent, last used at].
+        :raises TimeoutError: If no connection was released within the timeout.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No SMTP connection available")
+        try:
+            while True:
+                try:
+                    pooled = self._idle.get_nowait()
+                except queue.Empty:
+                    return [self._connect(), 0, time.monotonic()]
+                if time.monotonic() - pooled[2] < self.max_idle:
+                    return pooled
+                self._close(pooled[0])
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, pooled: list, broken: bool = False) -> None:
+        """
+        Give a connection back to the pool, closing it if it is broken or sent max_messages messages.
+        """
+        try:
+            if broken or pooled[1] >= self.max_messages:
+                self._close(pooled[0])
+            else:
+                pooled[2] = time.monotonic()
+                self._idle.put(pooled)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        while True:
+            try:
+                self._close(self._idle.get_nowait()[0])
+            except queue.Empty:
+                return
+
+
+class EmailChannel(BaseChannel):
+    """
+    Channel for sending alerts by email.
+
+    The message of an alert is rendered once and sent in one SMTP transaction to all its recipients, which are not
+    disclosed to each other, through a pool of SMTP connections kept open.
+    """
+
+    def __init__(self):
+        """
+        Initialize the EmailChannel.
+        """
+        self.from_address = os.getenv("ALERT_EMAIL_FROM", "alerts@localhost")
+        # Maximum number of recipients of a message, servers usually refuse more than 100
+        self.max_recipients = int(os.getenv("ALERT_EMAIL_MAX_RECIPIENTS", 50))
+        self.pool = SMTPConnectionPool(
+            host=os.getenv("ALERT_EMAIL_HOST", "localhost"),
+            port=int(os.getenv("ALERT_EMAIL_PORT", 1025)),
+            username=os.getenv("ALERT_EMAIL_USER", ""),
+            password=os.getenv("ALERT_EMAIL_PASSWORD", ""),
+            use_tls=os.getenv("ALERT_EMAIL_USE_TLS", "false").lower() in ("1", "true", "yes"),
+            timeout=float(os.getenv("ALERT_EMAIL_TIMEOUT", 10)),
+            max_size=int(os.getenv("ALERT_EMAIL_POOL_SIZE", 4)),
+            max_messages=int(os.getenv("ALERT_EMAIL_MAX_MESSAGES_PER_CONNECTION", 100)),
+            max_idle=float(os.getenv("ALERT_EMAIL_MAX_IDLE", 60)),
+        )
+
+    def send_alert(self, user: User, alert: Alert) -> ChannelResult:
+        """
+        Send an alert by email.
+
+        :param user: The user to whom the alert is being sent.
+        :param alert: The parameters to send the alert.
+        :return: ChannelResult indicating success or failure of the operation.
+        """
+        return self.send_alert_batch([user], alert)[0]
+
+    def send_alert_batch(self, users: list[User], alert: Alert) -> list[ChannelResult]:
+        """
+        Send an alert by email to several users, rendering the message once.
+
+        :param users: The users to whom the alert is being sent.
+        :param alert: The parameters to send the alert.
+        :return: One ChannelResult per user, in the same order as users.
+        """
+        if not alert or not isinstance(alert, Alert):
+            return [ChannelResult(success=False, info="Invalid parameters for alert") for _ in users]
+
+        results = [self._validate(user) for user in users]
+        targets = [user for user, result in zip(users, results) if result is None]
+        if not targets:
+            return results
+
+        message = self._render(alert)
+        target_results = {}
+        for i in range(0, len(targets), self.max_recipients):
+            recipients = targets[i:i + self.max_recipients]
+            target_results.update(zip((user.email for user in recipients), self._send(message, recipients, alert)))
+        return [result or target_results[user.email] for user, result in zip(users, results)]
+
+    def send_digest(self, user: User, alerts: list[Alert]) -> ChannelResult:
+        """
+        Send several alerts of a store to a user in one email.
+
+        :param user: The user to whom the alerts are being sent.
+        :param alerts: The alerts to send, the oldest first.
+        :return: ChannelResult indicating success or failure of the operation.
+        """
+        if not alerts or not all(isinstance(alert, Alert) for alert in alerts):
+            return ChannelResult(success=False, info="Invalid parameters for alert")
+        invalid_result = self._validate(user)
+        if invalid_result:
+            return invalid_result
+
+        return self._send(self._render_digest(alerts), [user], alerts[0])[0]
+
+    def _validate(self, user: User) -> ChannelResult | None:
+        """
+        Validate the user parameters.
+
+        :return: A failed ChannelResult if the parameters are invalid, None otherwise.
+        """
+        if not user or not isinstance(user, User):
+            return ChannelResult(success=False, info="Invalid user")
+        if not user.email:
+            return ChannelResult(success=False, info="User does not have an email address")
+        return None
+
+    def _render(self, alert: Alert) -> EmailMessage:
+        """
+        Render the message of an alert, without recipients.
+        """
+        context = {
+            "alert": alert,
+            "store": alert.location,
+            "severity": get_alert_severity(alert),
+            "spotted_at": datetime.fromtimestamp(alert.time_spotted, tz=timezone.utc),
+        }
+        message = EmailMessage()
+        message["Subject"] = render_to_string("alerts/email/alert_subject.txt", context).strip()
+        message["From"] = self.from_address
+        message["To"] = "undisclosed-recipients:;"
+        message.set_content(render_to_string("alerts/email/alert_body.txt", context))
+        return message
+
+    def _render_digest(self, alerts: list[Alert]) -> EmailMessage:
+        """
+        Render the message listing several alerts of a store, without recipients.
+        """
+        context = {
+            "alerts": [
+                {"alert": alert, "spotted_at": datetime.fromtimestamp(alert.time_spotted, tz=timezone.utc)}
+                for alert in alerts
+            ],
+            "store": alerts[0].location,
+            "severity": get_alert_severity(alerts[0]),
+        }
+        message = EmailMessage()
+        message["Subject"] = render_to_string("alerts/email/digest_subject.txt", context).strip()
+        message["From"] = self.from_address
+        message["To"] = "undisclosed-recipients:;"
+        message.set_content(render_to_string("alerts/email/digest_body.txt", context))
+        return message
+
+    def _send(self, message: EmailMessage, users: list[User], alert: Alert) -> list[ChannelResult]:
+        """
+        Send the message to the users in one SMTP transaction.
+        A pooled connection closed by the server in the meantime is replaced, and the message sent again once.
+        """
+        recipients = [user.email for user in users]
+        for attempt in range(2):
+            try:
+                pooled = self.pool.acquire()
+            except (smtplib.SMTPException, OSError) as e:
+                info = f"Failed to send alert {alert.alert_uuid}. No connection to the SMTP server. Error: {str(e)}"
+                return [ChannelResult(success=False, info=info) for _ in users]
+
+            try:
+                refused = pooled[0].send_message(message, to_addrs=recipients)
+            except smtplib.SMTPServerDisconnected as e:
+                self.pool.release(pooled, broken=True)
+                if attempt:
+                    info = f"Failed to send alert {alert.alert_uuid}. SMTP server disconnected: {str(e)}"
+                    return [ChannelResult(success=False, info=info) for _ in users]
+                continue
+            except smtplib.SMTPRecipientsRefused as e:
+                self.pool.release(pooled)
+                refused = e.recipients
+            except smtplib.SMTPResponseException as e:
+                self.pool.release(pooled, broken=e.smtp_code == 421)
+                return [self._error_result(alert, e.smtp_code, e.smtp_error) for _ in users]
+            except (smtplib.SMTPException, OSError) as e:
+                self.pool.release(pooled, broken=True)
+                info = f"Failed to send alert {alert.alert_uuid} by email. Error: {str(e)}"
+                return [ChannelResult(success=False, info=info) for _ in users]
+            else:
+                pooled[1] += 1
+                self.pool.release(pooled)
+
+            return [
+                self._error_result(alert, *refused[user.email]) if user.email in refused
+                else ChannelResult(success=True, info=f"Alert sent to {user.email}: {alert.alert_uuid}")
+                for user in users
+            ]
+
+    @staticmethod
+    def _error_result(alert: Alert, code: int, error) -> ChannelResult:
+        """
+        Result of a message refused by the server, deferred when the error is temporary (4xx).
+        """
+        if isinstance(error, bytes):
+            error = error.decode(errors="replace")
+        info = f"Failed to send alert {alert.alert_uuid} by email. SMTP error {code}: {error}"
+        return ChannelResult(success=False, info=info, deferred=400 <= code < 500)
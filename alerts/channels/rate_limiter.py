@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import time
+
+
+class RateLimitedError(Exception):
+    """
+    Raised when a call is refused because the quota of its destination would not allow it within the maximum wait.
+    """
+
+    def __init__(self, destination: str, retry_after: float):
+        super().__init__(f"Rate limit of {destination} exceeded, retry in {retry_after:.1f}s")
+        self.destination = destination
+        self.retry_after = retry_after
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket rate limiter, with one bucket per destination.
+
+    Each bucket holds up to `burst` tokens and is refilled at `rate` tokens per second, a call taking one token.
+    A call arriving on an empty bucket reserves its token in advance and waits for it, so that concurrent calls are
+    spaced out at the rate instead of failing, unless the wait would exceed `max_wait`.
+
+    The buckets are stored in a SQLite database. With a file path, the buckets are shared by all the processes
+    using the same file, such as the dispatch workers. Without, they are kept in the memory of the process.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        max_wait: float = 1.0,
+        path: str | None = None,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        """
+        Initialize the TokenBucketRateLimiter.
+
+        :param rate: Number of calls allowed per second to each destination.
+        :param burst: Maximum number of calls made at once after an idle period, rate by default.
+        :param max_wait: Maximum number of seconds a call waits for its token.
+        :param path: Path of the SQLite file storing the buckets, in memory by default.
+        :param clock: Function returning the current time in seconds, the same in all the processes.
+        :param sleep: Function waiting for the given number of seconds.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self._connection = sqlite3.connect(
+            path or ":memory:", timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets "
+            "(destination TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def _update(self, destination: str, reserve):
+        """
+        Refill the bucket of a destination and update its tokens in a single write transaction.
+
+        :param reserve: Function of the refilled tokens returning the new tokens and the result to return.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = self.clock()
+                row = self._connection.execute(
+                    "SELECT tokens, updated_at FROM token_buckets WHERE destination = ?", (destination,)
+                ).fetchone()
+                tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+                tokens, result = reserve(tokens)
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO token_buckets (destination, tokens, updated_at) VALUES (?, ?, ?)",
+                    (destination, tokens, now),
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return result
+
+    def acquire(self, destination: str) -> None:
+        """
+        Take a token for a call to the destination, waiting for it if needed.
+
+        :raises RateLimitedError: If the token would not be available within max_wait seconds, no token is taken then.
+        """
+        def reserve(tokens: float) -> tuple[float, float]:
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if wait > self.max_wait:
+                return tokens, -wait
+            # The token is taken in advance, the bucket goes negative while the reserved calls wait
+            return tokens - 1, wait
+
+        wait = self._update(destination, reserve)
+        if wait < 0:
+            raise RateLimitedError(destination, -wait)
+        if wait > 0:
+            self.sleep(wait)
+
+    def block(self, destination: str, seconds: float) -> None:
+        """
+        Empty the bucket of a destination for the given duration, e.g. when the destination answers it is over quota.
+        """
+        self._update(destination, lambda tokens: (min(tokens, -seconds * self.rate), None))
@@ -0,0 +1,166 @@
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from alerts.models.cache_version import CacheVersion
+from alerts.models.classification_rule import ClassificationRule
+
+
+CLASSIFICATION_CACHE_NAME = "classification-rules"
+
+MINUTES_PER_DAY = 24 * 60
+
+# Severity of the labels without any rule
+DEFAULT_SEVERITY = "standard"
+
+
+class CompiledRules:
+    """
+    Decision tables compiled from the classification rules.
+
+    Each table maps a label to its severity, or to a tuple of the severity of each minute of the day for the labels
+    with time of day rules. The table of a store with rules already includes the rules for all the stores.
+    """
+
+    def __init__(self, default: dict, stores: dict, labels: frozenset):
+        self.default = default
+        self.stores = stores
+        self.labels = labels
+
+
+def get_rule_minutes(rule: ClassificationRule) -> range | list[int]:
+    """
+    Minutes of the day during which a time of day rule applies.
+    """
+    start = rule.start_time.hour * 60 + rule.start_time.minute if rule.start_time else 0
+    end = rule.end_time.hour * 60 + rule.end_time.minute if rule.end_time else MINUTES_PER_DAY
+    if start < end:
+        return range(start, end)
+    return [*range(start, MINUTES_PER_DAY), *range(0, end)]
+
+
+def compile_table(base: dict, rules: list[ClassificationRule]) -> dict:
+    """
+    Compile rules over a base table, the all day rules first, then the time of day rules, in the order of their ids.
+    """
+    table = dict(base)
+    for rule in sorted(rules, key=lambda rule: (rule.start_time is not None or rule.end_time is not None, rule.id)):
+        label = rule.label.lower()
+        if rule.start_time is None and rule.end_time is None:
+            table[label] = rule.severity
+            continue
+        entry = table.get(label, DEFAULT_SEVERITY)
+        minutes = list(entry) if isinstance(entry, tuple) else [entry] * MINUTES_PER_DAY
+        for minute in get_rule_minutes(rule):
+            minutes[minute] = rule.severity
+        table[label] = tuple(minutes)
+    return table
+
+
+class ClassificationIndex:
+    """
+    Process-local index of the classification rules, compiled into decision tables.
+
+    Classifying an alert is two dict lookups, and an index in the minutes of the day for the labels with time of day
+    rules, so it does not depend on the number of rules and makes no query.
+    A change of the rules of a store in this process only recompiles the table of this store. The tables are all
+    compiled again when the shared CacheVersion was changed by another process, which is checked at most every
+    ALERTS_CLASSIFICATION_REFRESH_INTERVAL seconds, like the subscription routing index.
+    """
+
+    def __init__(self, default: dict):
+        """
+        :param default: The severity of each label when no rule applies.
+        """
+        self.default = {label.lower(): severity for label, severity in default.items()}
+        self._compiled = None
+        self._version = None
+        self._checked_at = 0.0
+        # Stores whose rules changed in this process, and the number of versions bumped by these changes
+        self._stale_stores = set()
+        self._local_changes = 0
+        self._lock = threading.Lock()
+        self._time_zone = None
+
+    def classify(self, label: str, location: str | None = None, time_spotted: float | None = None) -> str:
+        """
+        Return the severity of an alert.
+
+        :param label: The label of the alert.
+        :param location: The location of the store of the alert, only the rules for all the stores apply without it.
+        :param time_spotted: The timestamp of the alert, now by default.
+        """
+        compiled = self._get_compiled()
+        entry = compiled.stores.get(location, compiled.default).get(label.lower(), DEFAULT_SEVERITY)
+        if isinstance(entry, str):
+            return entry
+        spotted_at = datetime.fromtimestamp(time.time() if time_spotted is None else time_spotted, self._time_zone)
+        return entry[spotted_at.hour * 60 + spotted_at.minute]
+
+    def get_labels(self) -> frozenset:
+        """
+        Return the labels known by default or by a rule, in lower case.
+        """
+        return self._get_compiled().labels
+
+    def invalidate(self, *locations: str | None) -> None:
+        """
+        Recompile the tables of the given stores on the next lookup, or all the tables without a store or when one is
+        None, the rules for all the stores being part of every table.
+        The CacheVersion is expected to be bumped once after this call.
+        """
+        with self._lock:
+            if not locations or None in locations:
+                self._compiled = None
+            else:
+                self._stale_stores.update(locations)
+            self._local_changes += 1
+            self._checked_at = 0.0
+
+    def _get_compiled(self) -> CompiledRules:
+        compiled = self._compiled
+        if (
+            compiled is not None
+            and time.monotonic() - self._checked_at < settings.ALERTS_CLASSIFICATION_REFRESH_INTERVAL
+        ):
+            return compiled
+
+        with self._lock:
+            version = CacheVersion.current(CLASSIFICATION_CACHE_NAME)
+            if self._compiled is None or version != self._version + self._local_changes:
+                self._compiled = self._compile()
+            elif self._stale_stores:
+                self._compiled = self._compile_stores(self._compiled, self._stale_stores)
+            self._version = version
+            self._stale_stores = set()
+            self._local_changes = 0
+            self._checked_at = time.monotonic()
+            return self._compiled
+
+    def _compile(self) -> CompiledRules:
+        self._time_zone = ZoneInfo(settings.ALERTS_CLASSIFICATION_TIME_ZONE)
+        rules = list(ClassificationRule.objects.order_by("id"))
+        default = compile_table(self.default, [rule for rule in rules if rule.store_id is None])
+        store_rules = {}
+        for rule in rules:
+            if rule.store_id is not None:
+                store_rules.setdefault(rule.store_id, []).append(rule)
+        stores = {location: compile_table(default, rules) for location, rules in store_rules.items()}
+        return CompiledRules(default, stores, self._get_labels(default, stores))
+
+    def _compile_stores(self, compiled: CompiledRules, locations: set[str]) -> CompiledRules:
+        stores = dict(compiled.stores)
+        for location in locations:
+            rules = list(ClassificationRule.objects.filter(store_id=location).order_by("id"))
+            if rules:
+                stores[location] = compile_table(compiled.default, rules)
+            else:
+                stores.pop(location, None)
+        return CompiledRules(compiled.default, stores, self._get_labels(compiled.default, stores))
+
+    @staticmethod
+    def _get_labels(default: dict, stores: dict) -> frozenset:
+        return frozenset(default).union(*stores.values())
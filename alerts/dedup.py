@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class DuplicateAlertError(Exception):
+    """
+    Raised when an alert with the same uuid was already received.
+    """
+
+    def __init__(self, alert_uuid: str):
+        super().__init__(f"Alert {alert_uuid} was already received")
+        self.alert_uuid = alert_uuid
+
+
+class RecentAlertCache:
+    """
+    Bounded LRU cache of the uuids of the recently received alerts, each kept at most ttl seconds.
+
+    Edge devices resend an alert when they time out, so the duplicates are usually recent:
+    checking this cache rejects them before any database work.
+    The cache is process-local, the unique constraint on Alert.alert_uuid remains the source of truth.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._uuids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, alert_uuid: str) -> bool:
+        with self._lock:
+            added_at = self._uuids.get(alert_uuid)
+            if added_at is None:
+                return False
+            if self.clock() - added_at > self.ttl:
+                del self._uuids[alert_uuid]
+                return False
+            self._uuids.move_to_end(alert_uuid)
+            return True
+
+    def add(self, alert_uuid: str) -> None:
+        with self._lock:
+            self._uuids[alert_uuid] = self.clock()
+            self._uuids.move_to_end(alert_uuid)
+            while len(self._uuids) > self.max_size:
+                self._uuids.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._uuids.clear()
+
+
+recent_alerts = RecentAlertCache(
+    max_size=settings.ALERTS_DEDUP_CACHE_SIZE, ttl=settings.ALERTS_DEDUP_CACHE_TTL
+)
@@ -0,0 +1,738 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from alerts.alerts import get_alert_classification, get_alert_severity
+from alerts.channels import NOTIFICATION_CHANNELS
+from alerts.channels.base_channel import ChannelResult
+from alerts.dedup import DuplicateAlertError, recent_alerts
+from alerts.metrics import (
+    ALERTS_RECEIVED,
+    CHANNEL_LATENCY,
+    DELIVERY_LATENCY,
+    DISPATCH_QUEUE_LATENCY,
+    NOTIFICATIONS,
+    STAGE_LATENCY,
+)
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import NOTIFICATION_LANES, SentNotification
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.routing import routing_index
+
+
+logger = logging.getLogger(__name__)
+
+# Fields of a notification updated once it has been sent, or once sending it failed
+OUTCOME_FIELDS = ["sent", "status", "last_error", "attempts", "next_attempt_at"]
+
+
+def get_alert_subscriptions(alert: Alert) -> list[UserAlertSubscripion]:
+    """
+    Get all the subscriptions for the store and alert preference based on the alert label.
+    The subscriptions come from the in-memory routing index, no subscription query is made.
+    """
+    severity = get_alert_severity(alert)
+    return routing_index.get_subscriptions(alert.location_id, severity)
+
+
+class DigestScheduler:
+    """
+    Hold the notifications of the subscriptions with an aggregation window, so that they are sent as digests.
+
+    The alerts of the same store and severity notified to a user through a channel within the aggregation window of
+    the subscription are held until the end of the window, opened by the first one, and then sent together.
+    The first critical alert since the last window is not held, so that it is notified right away.
+    The open windows are loaded once per store and severity, and kept for the alerts queued in the same transaction.
+    A window is only joined before its end, the dispatch workers claiming its notifications once it is over.
+    """
+
+    def __init__(self, now):
+        self.now = now
+        # Open window end and time of the last notification, by (user, channel, store, severity)
+        self._windows = {}
+        self._loaded = set()
+
+    def schedule(
+        self, sent_notification: SentNotification, subscription: UserAlertSubscripion, severity: str
+    ) -> None:
+        """
+        Hold the notification until the end of the aggregation window of its subscription, if it has one.
+        """
+        window_size = timedelta(seconds=subscription.aggregation_window)
+        if not window_size:
+            return
+
+        location = sent_notification.alert.location_id
+        self._load(location, severity, window_size)
+        key = (subscription.user_id, subscription.notification_channel, location, severity)
+        until, last_at = self._windows.get(key, (None, None))
+        if until is None or until <= self.now:
+            if severity == "critical" and (last_at is None or last_at < self.now - window_size):
+                self._windows[key] = (None, self.now)
+                return
+            until = self.now + window_size
+
+        sent_notification.status = "held"
+        sent_notification.claim_token = None
+        sent_notification.claimed_at = None
+        sent_notification.digest_until = until
+        sent_notification.next_attempt_at = until
+        self._windows[key] = (until, self.now)
+
+    def _load(self, location: str, severity: str, window_size: timedelta) -> None:
+        """
+        Load the recent notifications of a store, the subscriptions of a store and severity having the same windows.
+        """
+        if (location, severity) in self._loaded:
+            return
+        self._loaded.add((location, severity))
+
+        longest = max(
+            (subscription.aggregation_window for subscription in routing_index.get_subscriptions(location, severity)),
+            default=0,
+        )
+        recent_notifications = SentNotification.objects.filter(
+            alert__location_id=location,
+            sent_at__gte=self.now - max(timedelta(seconds=longest), window_size),
+        ).values_list(
+            "user_id", "method", "alert__label", "alert__time_spotted", "status", "digest_until", "sent_at"
+        )
+        for user_id, method, label, time_spotted, status, digest_until, sent_at in recent_notifications:
+            if get_alert_classification(label, location, time_spotted) != severity:
+                continue
+            key = (user_id, method, location, severity)
+            until, last_at = self._windows.get(key, (None, None))
+            if status == "held" and digest_until > self.now:
+                until = max(until or digest_until, digest_until)
+            self._windows[key] = (until, max(last_at or sent_at, sent_at))
+
+
+def get_shard_key(location: str) -> int:
+    """
+    Stable hash of a store location, the same in all the processes, used to dispatch the notifications by store.
+    """
+    return zlib.crc32(location.encode())
+
+
+def get_lane_priority(severity: str) -> int:
+    """
+    Priority of the dispatch lane of a severity, the lower the sooner its notifications are claimed.
+    The severities without a lane of their own are sent in the last lane.
+    """
+    try:
+        return NOTIFICATION_LANES.index(severity)
+    except ValueError:
+        return len(NOTIFICATION_LANES) - 1
+
+
+def build_notifications(
+    alert: Alert, user_alert_subscriptions: list[UserAlertSubscripion], digests: DigestScheduler, claimed: bool = False
+) -> list[SentNotification]:
+    """
+    Build, without saving them, the notifications of an alert for its subscriptions.
+    The notifications of the subscriptions with an aggregation window are held by the digest scheduler.
+    """
+    severity = get_alert_severity(alert)
+    shard_key = get_shard_key(alert.location_id)
+    priority = get_lane_priority(severity)
+    claim_token = uuid.uuid4().hex if claimed else None
+    sent_notifications = []
+    for subscription in user_alert_subscriptions:
+        sent_notification = SentNotification(
+            alert=alert,
+            user=subscription.user,
+            method=subscription.notification_channel,
+            sent_at=digests.now,
+            sent=False,
+            status="processing" if claimed else "pending",
+            claim_token=claim_token,
+            claimed_at=digests.now if claimed else None,
+            shard_key=shard_key,
+            priority=priority,
+        )
+        digests.schedule(sent_notification, subscription, severity)
+        sent_notifications.append(sent_notification)
+    return sent_notifications
+
+
+def enqueue_notifications(
+    alert: Alert, user_alert_subscriptions: list[UserAlertSubscripion], claimed: bool = False
+) -> list[SentNotification]:
+    """
+    Persist one pending notification per subscription in the outbox.
+    The notifications are delivered later by the `dispatch_notifications` command.
+
+    :param alert: The alert to dispatch.
+    :param user_alert_subscriptions: The subscriptions matching the alert.
+    :param claimed: Create the notifications already claimed, when the caller sends them itself.
+    The dispatch workers only pick them up if they are not sent before the claim timeout.
+    The notifications held for a digest are never claimed, their status is "held".
+    :return: The created SentNotification instances.
+    """
+    return SentNotification.objects.bulk_create(
+        build_notifications(alert, user_alert_subscriptions, DigestScheduler(timezone.now()), claimed=claimed)
+    )
+
+
+def queue_alert(
+    alert_data: dict, claimed: bool = False
+) -> tuple[Alert, list[SentNotification]]:
+    """
+    Create the alert and its pending notifications in a single transaction.
+
+    :param alert_data: The validated alert data.
+    :param claimed: Create the notifications already claimed, see enqueue_notifications.
+    :return: The created alert and the notifications queued for dispatch.
+    :raises DuplicateAlertError: If an alert with the same uuid was already received, nothing is queued then.
+    """
+    alert_uuid = alert_data["alert_uuid"]
+    try:
+        # The alert is inserted right away, duplicates being rare it is cheaper than checking first
+        with transaction.atomic():
+            with STAGE_LATENCY.time(stage="insert"):
+                alert = Alert.objects.create(
+                    alert_uuid=alert_uuid,
+                    url=alert_data["url"],
+                    location=alert_data["location"],
+                    label=alert_data["label"],
+                    time_spotted=alert_data["time_spotted"],
+                )
+            with STAGE_LATENCY.time(stage="routing"):
+                user_alert_subscriptions = get_alert_subscriptions(alert)
+            with STAGE_LATENCY.time(stage="enqueue"):
+                sent_notifications = enqueue_notifications(alert, user_alert_subscriptions, claimed=claimed)
+    except IntegrityError:
+        if not Alert.objects.filter(alert_uuid=alert_uuid).exists():
+            raise
+        transaction.on_commit(lambda: recent_alerts.add(alert_uuid))
+        raise DuplicateAlertError(alert_uuid)
+
+    transaction.on_commit(lambda: recent_alerts.add(alert_uuid))
+    ALERTS_RECEIVED.inc(severity=get_alert_severity(alert))
+    return alert, sent_notifications
+
+
+def queue_alerts(alerts_data: list[dict]) -> list[tuple[Alert, list[SentNotification]] | None]:
+    """
+    Create a batch of alerts and their pending notifications in a single transaction.
+    The alerts and notifications are inserted in bulk, and the subscriptions come from the in-memory routing index.
+
+    :param alerts_data: The validated data of each alert.
+    :return: The created alerts and the notifications queued for each of them, in the same order as alerts_data.
+    None is returned for the alerts which were already received.
+    """
+    # An alert received concurrently makes the insert fail, the batch is then inserted again without it
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing_uuids = set(
+                    Alert.objects.filter(
+                        alert_uuid__in=[alert_data["alert_uuid"] for alert_data in alerts_data]
+                    ).values_list("alert_uuid", flat=True)
+                )
+                with STAGE_LATENCY.time(stage="insert"):
+                    alerts = Alert.objects.bulk_create(
+                        [
+                            Alert(
+                                alert_uuid=alert_data["alert_uuid"],
+                                url=alert_data["url"],
+                                location=alert_data["location"],
+                                label=alert_data["label"],
+                                time_spotted=alert_data["time_spotted"],
+                            )
+                            for alert_data in alerts_data
+                            if alert_data["alert_uuid"] not in existing_uuids
+                        ]
+                    )
+
+                digests = DigestScheduler(timezone.now())
+                queued = {}
+                with STAGE_LATENCY.time(stage="routing"):
+                    for alert in alerts:
+                        queued[alert.alert_uuid] = (
+                            alert,
+                            build_notifications(alert, get_alert_subscriptions(alert), digests),
+                        )
+
+                with STAGE_LATENCY.time(stage="enqueue"):
+                    SentNotification.objects.bulk_create(
+                        [
+                            sent_notification
+                            for _, sent_notifications in queued.values()
+                            for sent_notification in sent_notifications
+                        ]
+                    )
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    def remember_received_alerts():
+        for alert_data in alerts_data:
+            recent_alerts.add(alert_data["alert_uuid"])
+
+    transaction.on_commit(remember_received_alerts)
+    for alert, _ in queued.values():
+        ALERTS_RECEIVED.inc(severity=get_alert_severity(alert))
+    return [queued.get(alert_data["alert_uuid"]) for alert_data in alerts_data]
+
+
+class Claim(list):
+    """
+    The ids of notifications claimed at once, in the order to send them, with the token they were claimed with.
+    The worker sends and saves them only while they still hold this token, so that a notification reclaimed by
+    another worker after the claim timeout is not sent twice nor has its outcome overwritten.
+    """
+
+    def __init__(self, notification_ids=(), claim_token: str | None = None):
+        super().__init__(notification_ids)
+        self.claim_token = claim_token
+
+
+def _claim_notifications(
+    claimable: Q, batch_size: int, shard: int | None = None, shards: int = 1, lane: str | None = None
+) -> Claim:
+    """
+    Claim a batch of notifications matching the claimable filter for the current worker.
+
+    Notifications are claimed by setting a random claim token with a conditional update,
+    so a notification can only be claimed by one worker even when several are running.
+    The notifications of the first lanes are claimed first (strict priority), each lane in the order it was queued.
+    With a shard, only the notifications of the stores whose shard key modulo shards is this shard are claimed,
+    and with a lane only the notifications of this lane.
+    The held notifications are claimed by whole aggregation windows, even beyond batch_size, so that each window is
+    sent as one digest.
+    """
+    candidates = SentNotification.objects.filter(claimable)
+    if shard is not None:
+        candidates = candidates.annotate(shard=F("shard_key") % shards).filter(shard=shard)
+    if lane is not None:
+        candidates = candidates.filter(priority=get_lane_priority(lane))
+    rows = list(
+        candidates.order_by("priority", "id").values_list("id", "status", "user_id", "method", "digest_until")[
+            :batch_size
+        ]
+    )
+    if not rows:
+        return Claim()
+
+    candidate_ids = [row[0] for row in rows]
+    windows = {(user_id, method, digest_until) for _, status, user_id, method, digest_until in rows if status == "held"}
+    if windows:
+        same_windows = Q()
+        for user_id, method, digest_until in windows:
+            same_windows |= Q(user_id=user_id, method=method, digest_until=digest_until)
+        candidate_ids = set(candidate_ids)
+        candidate_ids.update(candidates.filter(same_windows, status="held").values_list("id", flat=True))
+
+    token = uuid.uuid4().hex
+    SentNotification.objects.filter(claimable, id__in=candidate_ids).update(
+        status="processing", claim_token=token, claimed_at=timezone.now()
+    )
+    return Claim(
+        SentNotification.objects.filter(claim_token=token)
+        .order_by("priority", "id")
+        .values_list("id", flat=True),
+        token,
+    )
+
+
+def claim_pending_notifications(
+    batch_size: int, shard: int | None = None, shards: int = 1, lane: str | None = None
+) -> Claim:
+    """
+    Claim a batch of pending notifications, and of held ones whose aggregation window is over, for the current worker.
+    Notifications left in processing by a dead worker are reclaimed after ALERTS_DISPATCH_CLAIM_TIMEOUT seconds.
+
+    :param batch_size: Maximum number of notifications to claim.
+    :param shard: The shard of the worker, between 0 and shards - 1, all the notifications are claimable without it.
+    :param shards: The number of shards the stores are split into.
+    :param lane: Only claim the notifications of this lane, those of all the lanes are claimable without it,
+    the critical ones first.
+    :return: The ids of the claimed notifications, with their claim token.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.ALERTS_DISPATCH_CLAIM_TIMEOUT)
+    claimable = (
+        Q(status="pending")
+        | Q(status="held", next_attempt_at__lte=now)
+        | Q(status="processing", claimed_at__lt=stale_before)
+    )
+    return _claim_notifications(claimable, batch_size, shard=shard, shards=shards, lane=lane)
+
+
+def claim_due_retries(batch_size: int) -> Claim:
+    """
+    Claim a batch of failed or deferred notifications whose next attempt is due.
+
+    :param batch_size: Maximum number of notifications to claim.
+    :return: The ids of the claimed notifications, with their claim token.
+    """
+    claimable = Q(status__in=["failed", "deferred"], next_attempt_at__lte=timezone.now())
+    return _claim_notifications(claimable, batch_size)
+
+
+def get_send_group(sent_notification: SentNotification) -> tuple:
+    """
+    Key keeping together the notifications which send_notifications may send at once: those of the same user,
+    channel and aggregation window for a digest, those of the same alert and channel otherwise.
+    """
+    if sent_notification.digest_until:
+        return ("digest", sent_notification.user_id, sent_notification.method, sent_notification.digest_until)
+    return ("alert", sent_notification.alert_id, sent_notification.method)
+
+
+def split_notification_ids(notification_ids: list[int], chunks: int) -> list[list[int]]:
+    """
+    Split claimed notifications in chunks of about len(notification_ids) / chunks notifications, for the pool workers.
+    The notifications of the same group (see get_send_group) are kept in the same chunk, so that an alert is sent
+    once per channel and an aggregation window as one digest.
+
+    :param notification_ids: The ids of the claimed notifications, in the order to send them.
+    :param chunks: The number of chunks wanted, one per worker.
+    :return: The chunks of notification ids, keeping their order within each group.
+    """
+    sent_notifications = SentNotification.objects.only("id", "alert_id", "user_id", "method", "digest_until").in_bulk(
+        notification_ids
+    )
+    groups = {}
+    for notification_id in notification_ids:
+        sent_notification = sent_notifications.get(notification_id)
+        key = get_send_group(sent_notification) if sent_notification else ("missing", notification_id)
+        groups.setdefault(key, []).append(notification_id)
+
+    chunk_size = -(-len(notification_ids) // max(1, chunks))
+    split = [[]]
+    for group in groups.values():
+        if split[-1] and len(split[-1]) + len(group) > chunk_size:
+            split.append([])
+        split[-1].extend(group)
+    return split
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """
+    Delay before the next attempt, after the given number of attempts.
+    The delay grows exponentially from ALERTS_RETRY_BASE_DELAY up to ALERTS_RETRY_MAX_DELAY,
+    and half of it is random so that the notifications failed during an outage are not all retried at the same time.
+    """
+    delay = min(
+        settings.ALERTS_RETRY_MAX_DELAY,
+        settings.ALERTS_RETRY_BASE_DELAY * 2 ** (max(attempts, 1) - 1),
+    )
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+async def asend_notification(sent_notification: SentNotification) -> ChannelResult:
+    """
+    Send a notification through its channel, without blocking the event loop.
+    """
+    channel = NOTIFICATION_CHANNELS.get(sent_notification.method)
+    if not channel:
+        return ChannelResult(
+            success=False, info=f"Notification channel {sent_notification.method} not found."
+        )
+    return await channel.asend_alert(sent_notification.user, sent_notification.alert)
+
+
+def record_result(sent_notification: SentNotification, result: ChannelResult, attempts: int) -> None:
+    """
+    Record the outcome of a failed or deferred notification attempt on the notification, without saving it.
+
+    :param attempts: The number of attempts made before this one.
+    """
+    sent_notification.last_error = result.info
+    if result.deferred:
+        # The channel did not try to send the notification, it does not count as an attempt
+        sent_notification.status = "deferred"
+        sent_notification.attempts = attempts
+        retry_delay = timedelta(seconds=result.retry_after) if result.retry_after else get_retry_delay(1)
+        sent_notification.next_attempt_at = timezone.now() + retry_delay
+        return
+
+    sent_notification.attempts = attempts + 1
+    if sent_notification.attempts >= settings.ALERTS_RETRY_MAX_ATTEMPTS:
+        sent_notification.status = "dead"
+        sent_notification.next_attempt_at = None
+    else:
+        sent_notification.status = "failed"
+        sent_notification.next_attempt_at = timezone.now() + get_retry_delay(sent_notification.attempts)
+
+
+def log_results(sent_notifications: list[SentNotification], results: list[ChannelResult]) -> None:
+    """
+    Log the results of notification attempts with one line per alert and channel counting the outcomes.
+    The successes are only logged individually at the debug level, and the failures up to
+    ALERTS_LOG_FAILURES_PER_ALERT per alert and channel, so that an alert storm does not flood the logs.
+    """
+    groups = {}
+    for sent_notification, result in zip(sent_notifications, results):
+        counts = groups.setdefault(
+            (sent_notification.alert_id, sent_notification.method),
+            {"alert": sent_notification.alert, "sent": 0, "failed": 0, "deferred": 0},
+        )
+        if result.success:
+            counts["sent"] += 1
+            logger.debug(
+                "Alert sent successfully to %s via %s.", sent_notification.user.email, sent_notification.method
+            )
+            continue
+
+        counts["deferred" if result.deferred else "failed"] += 1
+        if counts["failed"] + counts["deferred"] > settings.ALERTS_LOG_FAILURES_PER_ALERT:
+            continue
+        if result.deferred:
+            logger.warning(
+                "Alert to %s via %s deferred: %s",
+                sent_notification.user.email, sent_notification.method, result.info,
+            )
+        else:
+            logger.error(
+                "Failed to send alert to %s via %s: %s",
+                sent_notification.user.email, sent_notification.method, result.info,
+            )
+
+    for (_, method), counts in groups.items():
+        logger.log(
+            logging.INFO if not counts["failed"] and not counts["deferred"] else logging.WARNING,
+            "Alert %s via %s: %d sent, %d failed, %d deferred.",
+            counts["alert"].alert_uuid, method, counts["sent"], counts["failed"], counts["deferred"],
+            extra={
+                "alert_uuid": counts["alert"].alert_uuid,
+                "channel": method,
+                "sent": counts["sent"],
+                "failed": counts["failed"],
+                "deferred": counts["deferred"],
+            },
+        )
+
+
+def observe_result(sent_notification: SentNotification, result: ChannelResult) -> None:
+    """
+    Count a notification attempt by outcome, and observe the time from detection to delivery when it was sent.
+    The time spent in the outbox is observed by lane on the first attempt, from the end of the aggregation window
+    for the notifications held for a digest.
+    """
+    severity = get_alert_severity(sent_notification.alert)
+    if not sent_notification.attempts and sent_notification.sent_at:
+        queued_at = sent_notification.digest_until or sent_notification.sent_at
+        DISPATCH_QUEUE_LATENCY.observe(
+            max(0.0, (timezone.now() - queued_at).total_seconds()),
+            lane=NOTIFICATION_LANES[sent_notification.priority],
+        )
+    if result.success:
+        outcome = "sent"
+        DELIVERY_LATENCY.observe(
+            max(0.0, time.time() - sent_notification.alert.time_spotted),
+            channel=sent_notification.method,
+            severity=severity,
+        )
+    else:
+        outcome = "deferred" if result.deferred else "failed"
+    NOTIFICATIONS.inc(channel=sent_notification.method, outcome=outcome, severity=severity)
+
+
+def get_outcome(sent_notification: SentNotification, result: ChannelResult) -> SentNotification:
+    """
+    Record the outcome of a notification attempt on a new notification with the same id, without saving it.
+    Only the fields to write are set, computed from the claimed notification already loaded.
+
+    :param sent_notification: The notification sent, as claimed.
+    :param result: The result of the attempt.
+    """
+    outcome = SentNotification(id=sent_notification.id, last_error=sent_notification.last_error)
+    if result.success:
+        outcome.sent = True
+        outcome.status = "sent"
+        outcome.attempts = sent_notification.attempts + 1
+        outcome.next_attempt_at = None
+    else:
+        record_result(outcome, result, sent_notification.attempts)
+    return outcome
+
+
+def save_results(outcomes: list[SentNotification], claim_token: str) -> int:
+    """
+    Write the outcomes of sent notifications with one bulk update.
+    Failed notifications are scheduled for a retry, or dead-lettered after ALERTS_RETRY_MAX_ATTEMPTS attempts.
+    Only the notifications still holding the claim token are written, not those reclaimed by another worker meanwhile.
+
+    :param outcomes: The outcome of each notification, see get_outcome.
+    :param claim_token: The token the notifications were claimed with.
+    :return: The number of notifications successfully sent.
+    """
+    if outcomes:
+        SentNotification.objects.filter(claim_token=claim_token).bulk_update(outcomes, OUTCOME_FIELDS)
+    return sum(outcome.status == "sent" for outcome in outcomes)
+
+
+def replay_deferred_notifications() -> int:
+    """
+    Put the deferred notifications back in the outbox, so that they are sent by the dispatch workers.
+
+    :return: The number of notifications replayed.
+    """
+    return SentNotification.objects.filter(status="deferred").update(
+        status="pending", claim_token=None, claimed_at=None, next_attempt_at=None
+    )
+
+
+def send_notifications(sent_notifications: list[SentNotification]) -> list[ChannelResult]:
+    """
+    Send notifications through their channels.
+    The notifications of the same alert and channel are sent together, so channels supporting it can send them at once.
+    The notifications held in the same aggregation window are sent as one digest, with the same result.
+
+    :param sent_notifications: The notifications to send, with their alert and user loaded.
+    :return: One ChannelResult per notification, in the same order as sent_notifications.
+    """
+    groups = defaultdict(list)
+    digests = defaultdict(list)
+    for position, sent_notification in enumerate(sent_notifications):
+        if sent_notification.digest_until:
+            alert = sent_notification.alert
+            digests[
+                (
+                    sent_notification.user_id,
+                    sent_notification.method,
+                    alert.location_id,
+                    get_alert_severity(alert),
+                    sent_notification.digest_until,
+                )
+            ].append(position)
+        else:
+            groups[(sent_notification.alert_id, sent_notification.method)].append(position)
+
+    # A window holding a single alert is sent as a regular notification
+    digest_groups = []
+    for positions in digests.values():
+        if len(positions) > 1:
+            digest_groups.append(positions)
+        else:
+            sent_notification = sent_notifications[positions[0]]
+            groups[(sent_notification.alert_id, sent_notification.method)].append(positions[0])
+
+    results = [None] * len(sent_notifications)
+    for (_, method), positions in groups.items():
+        channel = NOTIFICATION_CHANNELS.get(method)
+        if not channel:
+            for position in positions:
+                results[position] = ChannelResult(
+                    success=False, info=f"Notification channel {method} not found."
+                )
+            continue
+
+        alert = sent_notifications[positions[0]].alert
+        users = [sent_notifications[position].user for position in positions]
+        with CHANNEL_LATENCY.time(channel=method):
+            channel_results = channel.send_alert_batch(users, alert)
+        for position, result in zip(positions, channel_results):
+            results[position] = result
+
+    for positions in digest_groups:
+        first = sent_notifications[positions[0]]
+        channel = NOTIFICATION_CHANNELS.get(first.method)
+        if not channel:
+            result = ChannelResult(success=False, info=f"Notification channel {first.method} not found.")
+        else:
+            alerts = sorted(
+                (sent_notifications[position].alert for position in positions), key=lambda alert: alert.time_spotted
+            )
+            with CHANNEL_LATENCY.time(channel=first.method):
+                result = channel.send_digest(first.user, alerts)
+        for position in positions:
+            results[position] = result
+
+    log_results(sent_notifications, results)
+    for sent_notification, result in zip(sent_notifications, results):
+        observe_result(sent_notification, result)
+    return results
+
+
+async def adeliver_notifications(
+    sent_notifications: list[SentNotification], concurrency: int | None = None
+) -> int:
+    """
+    Send the notifications concurrently and record their outcomes.
+
+    :param sent_notifications: The notifications to deliver, with their alert and user loaded.
+    :param concurrency: Maximum number of notifications being sent at the same time.
+    :return: The number of notifications successfully sent.
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.ALERTS_ASYNC_CONCURRENCY)
+
+    async def deliver(sent_notification: SentNotification) -> ChannelResult:
+        async with semaphore:
+            with CHANNEL_LATENCY.time(channel=sent_notification.method):
+                return await asend_notification(sent_notification)
+
+    results = await asyncio.gather(
+        *(deliver(sent_notification) for sent_notification in sent_notifications)
+    )
+
+    return await sync_to_async(record_results)(sent_notifications, results)
+
+
+def record_results(sent_notifications: list[SentNotification], results: list[ChannelResult]) -> int:
+    """
+    Log, observe and save the outcomes of notifications sent from the event loop.
+    The severity of their alerts may have to be classified again with a query, so this runs outside the event loop.
+
+    :return: The number of notifications successfully sent.
+    """
+    log_results(sent_notifications, results)
+    outcomes = defaultdict(list)
+    for sent_notification, result in zip(sent_notifications, results):
+        observe_result(sent_notification, result)
+        outcomes[sent_notification.claim_token].append(get_outcome(sent_notification, result))
+    return sum(save_results(claimed_outcomes, claim_token) for claim_token, claimed_outcomes in outcomes.items())
+
+
+def send_notification_ids(notification_ids: list[int], claim_token: str) -> list[SentNotification]:
+    """
+    Send the given claimed notifications in the order they were claimed, without saving the outcomes.
+    This is the unit of work of the dispatch workers, the outcomes being saved for the whole batch at once.
+    The notifications reclaimed by another worker since are not sent.
+
+    :param notification_ids: The ids of notifications claimed by the worker.
+    :param claim_token: The token the notifications were claimed with.
+    :return: The outcome of each notification, see get_outcome.
+    """
+    sent_notifications = list(
+        SentNotification.objects.filter(id__in=notification_ids, status="processing", claim_token=claim_token)
+        .select_related("user", "alert__location")
+        .order_by("priority", "id")
+    )
+    results = send_notifications(sent_notifications)
+    return [
+        get_outcome(sent_notification, result)
+        for sent_notification, result in zip(sent_notifications, results)
+    ]
+
+
+def dispatch_pending(batch_size: int | None = None, shard: int | None = None, shards: int = 1) -> int:
+    """
+    Drain the outbox in the current thread, until no pending notification is left.
+    The notifications are sent lane by lane, each in the order it was queued, one batch after the other.
+
+    :param batch_size: Number of notifications claimed at once.
+    :param shard: Only drain the notifications of the stores of this shard, see claim_pending_notifications.
+    :param shards: The number of shards the stores are split into.
+    :return: The number of notifications successfully sent.
+    """
+    batch_size = batch_size or settings.ALERTS_DISPATCH_BATCH_SIZE
+    sent = 0
+    while claim := claim_pending_notifications(batch_size, shard=shard, shards=shards):
+        sent += save_results(send_notification_ids(claim, claim.claim_token), claim.claim_token)
+    return sent
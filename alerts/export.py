@@ -0,0 +1,69 @@
+import zlib
+from collections.abc import Iterable, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+
+from alerts.filters import filter_alerts, filter_notifications
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+
+
+# Exported columns, foreign keys are exported as the primary key of the related row
+ALERT_EXPORT_FIELDS = ["id", "alert_uuid", "url", "location", "label", "time_spotted", "received_at"]
+
+NOTIFICATION_EXPORT_FIELDS = [
+    "id", "alert", "user", "method", "sent", "sent_at", "status", "last_error", "attempts",
+]
+
+# Size in bytes from which the exported lines are yielded, so that the response is not written line by line
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def get_export_queryset(model: str, params) -> tuple[QuerySet, list[str]]:
+    """
+    Get the filtered queryset and the exported fields of the alerts or notifications history.
+
+    :param model: "alerts" or "notifications".
+    :param params: Filters, the same as the alert and notification lists.
+    :raises ValidationError: If a filter is invalid.
+    """
+    if model == "alerts":
+        return filter_alerts(Alert.objects.all(), params), ALERT_EXPORT_FIELDS
+    return filter_notifications(SentNotification.objects.all(), params), NOTIFICATION_EXPORT_FIELDS
+
+
+def iter_ndjson(queryset: QuerySet, fields: list[str], chunk_size: int | None = None) -> Iterator[bytes]:
+    """
+    Iterate over the rows of a queryset as NDJSON, one JSON object per line.
+
+    The rows are fetched from the database by chunks of chunk_size as plain dicts, without instantiating the models,
+    so the memory used does not depend on the number of rows exported.
+    """
+    chunk_size = chunk_size or settings.ALERTS_EXPORT_CHUNK_SIZE
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    buffer = []
+    buffer_size = 0
+    for row in queryset.order_by("id").values(*fields).iterator(chunk_size=chunk_size):
+        line = (encoder.encode(row) + "\n").encode()
+        buffer.append(line)
+        buffer_size += len(line)
+        if buffer_size >= WRITE_BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            buffer_size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compress a stream of bytes in the gzip format, chunk by chunk.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,81 @@
+from django.db.models import QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def parse_datetime_param(params, name: str):
+    """
+    Parse an ISO 8601 datetime query parameter.
+
+    :raises ValidationError: If the parameter is not a valid datetime.
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Enter a valid ISO 8601 datetime."]})
+    return parsed
+
+
+def parse_boolean_param(params, name: str):
+    """
+    Parse a boolean query parameter (true/false, 1/0).
+
+    :raises ValidationError: If the parameter is not a valid boolean.
+    """
+    value = params.get(name)
+    if value is None or value == "":
+        return None
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValidationError({name: ["Enter true or false."]})
+
+
+def filter_alerts(queryset: QuerySet, params) -> QuerySet:
+    """
+    Filter the alerts with the query parameters: store, label, and since/until on received_at.
+    """
+    if params.get("store"):
+        queryset = queryset.filter(location_id=params["store"])
+    if params.get("label"):
+        queryset = queryset.filter(label=params["label"])
+    since = parse_datetime_param(params, "since")
+    if since:
+        queryset = queryset.filter(received_at__gte=since)
+    until = parse_datetime_param(params, "until")
+    if until:
+        queryset = queryset.filter(received_at__lt=until)
+    return queryset
+
+
+def filter_notifications(queryset: QuerySet, params) -> QuerySet:
+    """
+    Filter the notifications with the query parameters: store, label, user, channel, sent, status,
+    and since/until on sent_at.
+    """
+    if params.get("store"):
+        queryset = queryset.filter(alert__location_id=params["store"])
+    if params.get("label"):
+        queryset = queryset.filter(alert__label=params["label"])
+    if params.get("user"):
+        queryset = queryset.filter(user_id=params["user"])
+    if params.get("channel"):
+        queryset = queryset.filter(method=params["channel"])
+    if params.get("status"):
+        queryset = queryset.filter(status=params["status"])
+    sent = parse_boolean_param(params, "sent")
+    if sent is not None:
+        queryset = queryset.filter(sent=sent)
+    since = parse_datetime_param(params, "since")
+    if since:
+        queryset = queryset.filter(sent_at__gte=since)
+    until = parse_datetime_param(params, "until")
+    if until:
+        queryset = queryset.filter(sent_at__lt=until)
+    return queryset
@@ -0,0 +1,145 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections
+
+from alerts.dedup import DuplicateAlertError
+from alerts.dispatch import queue_alerts
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitTimeoutError(Exception):
+    """
+    Raised when the writer did not take an alert within the timeout: the alert is withdrawn, it is not committed.
+    """
+
+    def __init__(self, alert_uuid: str):
+        super().__init__(f"Alert {alert_uuid} was not committed in time")
+        self.alert_uuid = alert_uuid
+
+
+class GroupCommitWriter:
+    """
+    Insert the alerts received concurrently by the webhook together, from a single writer thread.
+
+    SQLite allows one writer at a time, and each alert inserted on its own takes the write lock and syncs its commit.
+    Instead, the requests hand their alert to the writer thread and wait for it: the writer takes the alerts received
+    during a short window and inserts them, with their notifications, in one transaction with queue_alerts.
+    """
+
+    def __init__(self, window: float, max_size: int, timeout: float):
+        """
+        Initialize the GroupCommitWriter, its thread is started with the first alert.
+
+        :param window: Seconds during which the alerts are gathered before being inserted.
+        :param max_size: Maximum number of alerts inserted in one transaction.
+        :param timeout: Maximum number of seconds a request waits for its alert to be inserted.
+        """
+        self.window = window
+        self.max_size = max_size
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def queue_alert(self, alert_data: dict) -> tuple[Alert, list[SentNotification]]:
+        """
+        Create the alert and its pending notifications, committed with the alerts received at the same time.
+
+        :param alert_data: The validated alert data.
+        :return: The created alert and the notifications queued for dispatch.
+        :raises DuplicateAlertError: If an alert with the same uuid was already received, nothing is queued then.
+        :raises GroupCommitTimeoutError: If the writer did not take the alert within the timeout, nothing is queued.
+        """
+        self.start()
+        future = Future()
+        self._queue.put((alert_data, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The alert is withdrawn while the writer has not taken it, so that it is known not to be committed.
+            # Once taken, its transaction is running and its outcome is waited for instead.
+            if future.cancel():
+                raise GroupCommitTimeoutError(alert_data["alert_uuid"])
+            return future.result()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the writer thread once the alerts already handed to it are inserted.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            group = [item]
+            deadline = time.monotonic() + self.window
+            while len(group) < self.max_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            self._write(group)
+        connections.close_all()
+
+    def _write(self, group: list[tuple[dict, Future]]) -> None:
+        # The same alert resent while the first one is not committed yet is a duplicate
+        seen_uuids = set()
+        writes = []
+        for alert_data, future in group:
+            if not future.set_running_or_notify_cancel():
+                # Withdrawn by its request after the timeout
+                continue
+            if alert_data["alert_uuid"] in seen_uuids:
+                future.set_exception(DuplicateAlertError(alert_data["alert_uuid"]))
+            else:
+                seen_uuids.add(alert_data["alert_uuid"])
+                writes.append((alert_data, future))
+
+        try:
+            queued = queue_alerts([alert_data for alert_data, _ in writes])
+        except Exception as e:
+            logger.error("Group commit of %d alerts failed: %s", len(writes), e, exc_info=e)
+            # The connection may be broken, a new one is opened for the next group
+            connections.close_all()
+            for _, future in writes:
+                future.set_exception(e)
+            return
+
+        for (alert_data, future), queued_alert in zip(writes, queued):
+            if queued_alert is None:
+                future.set_exception(DuplicateAlertError(alert_data["alert_uuid"]))
+            else:
+                future.set_result(queued_alert)
+
+
+group_writer = GroupCommitWriter(
+    window=settings.ALERTS_GROUP_COMMIT_WINDOW,
+    max_size=settings.ALERTS_GROUP_COMMIT_MAX_SIZE,
+    timeout=settings.ALERTS_GROUP_COMMIT_TIMEOUT,
+)
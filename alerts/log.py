@@ -0,0 +1,83 @@
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Attributes of every log record, the other ones are the extra fields given by the caller
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format the log records as JSON objects, one per line, with the extra fields of the record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith("_"):
+                data[name] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Log handler putting the records in a bounded queue, written to a stream by a background listener thread.
+
+    The records are neither formatted nor written in the thread logging them, so logging does not slow down requests.
+    When the queue is full, as during an alert storm with a slow stream, the records are dropped instead of blocking
+    the caller, and counted in `dropped`. The arguments of a record are formatted later in the listener thread,
+    so they must not be modified after being logged.
+    """
+
+    def __init__(self, stream=None, max_size: int = 10000):
+        """
+        Initialize the QueueLogHandler, and start its listener.
+
+        :param stream: The stream the records are written to, stderr by default.
+        :param max_size: Maximum number of records waiting in the queue.
+        """
+        super().__init__(queue.Queue(maxsize=max_size))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt: logging.Formatter) -> None:
+        # The records are formatted by the listener
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in the process, the record does not need to be formatted and made picklable
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """
+        Wait for the records in the queue to be written.
+        """
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.target.flush()
+            self.listener.start()
+
+    def close(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
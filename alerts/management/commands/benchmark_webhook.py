@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from alerts.benchmark import run_benchmark
+from alerts.receiver import FaultProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the alert webhook and the dispatch of its notifications to a local stub receiver, "
+        "on a temporary database seeded with the given number of stores and subscribers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stores", type=int, default=10, help="Number of stores seeded.")
+        parser.add_argument(
+            "--subscribers", type=int, default=10, help="Number of users subscribed to the alerts of each store."
+        )
+        parser.add_argument("--alerts", type=int, default=1000, help="Number of alerts posted to the webhook.")
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Number of clients posting alerts at the same time."
+        )
+        parser.add_argument(
+            "--batch", action="store_true", help="Send an alert once for all its recipients through the API channel."
+        )
+        parser.add_argument(
+            "--rules", type=int, default=0, help="Number of classification rules created for each store."
+        )
+        parser.add_argument(
+            "--receiver-latency",
+            default="0",
+            help="Latency distribution of the local receiver, as accepted by run_notification_receiver --latency.",
+        )
+        parser.add_argument(
+            "--receiver-error-rate", type=float, default=0.0, help="Rate of notifications refused by the local receiver."
+        )
+        parser.add_argument("--output", help="JSON file where the results are written, to compare the runs.")
+
+    def handle(self, *args, **options):
+        try:
+            profile = FaultProfile(latency=options["receiver_latency"], error_rate=options["receiver_error_rate"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        connection = connections["default"]
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == "sqlite":
+                # A database file instead of the in-memory test database, so that the clients can write concurrently
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+            setup_test_environment(debug=False)
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = run_benchmark(
+                    stores=options["stores"],
+                    subscribers_per_store=options["subscribers"],
+                    alerts=options["alerts"],
+                    concurrency=max(1, options["concurrency"]),
+                    batch=options["batch"],
+                    profile=profile,
+                    rules_per_store=options["rules"],
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+
+        webhook, dispatch = results["webhook"], results["dispatch"]
+        classification = results["classification"]
+        self.stdout.write(
+            f"Classification: {classification['mean_us']:.2f} us/alert with {classification['rules']} rules"
+        )
+        self.stdout.write(
+            f"Webhook: {webhook['throughput_per_s']:.1f} alerts/s, "
+            f"p50 {webhook['latency']['p50_ms']:.1f} ms, p95 {webhook['latency']['p95_ms']:.1f} ms, "
+            f"p99 {webhook['latency']['p99_ms']:.1f} ms, {webhook['queries_per_alert']:.1f} queries/alert, "
+            f"status codes {webhook['status_codes']}"
+        )
+        self.stdout.write(
+            f"Dispatch: {dispatch['throughput_per_s']:.1f} notifications/s, {dispatch['sent']} sent, "
+            f"{dispatch['outbound_requests_per_alert']:.1f} outbound requests/alert"
+        )
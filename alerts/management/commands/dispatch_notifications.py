@@ -0,0 +1,186 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from alerts.dispatch import (
+    claim_pending_notifications,
+    replay_deferred_notifications,
+    save_results,
+    split_notification_ids,
+)
+from alerts.metrics import serve_metrics
+from alerts.models.sent_notification import NOTIFICATION_LANES
+from alerts.workers import init_process_worker, send_chunk
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the notification outbox, delivering pending notifications with a pool of workers per lane, "
+        "so that a storm of standard alerts does not delay the critical ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.ALERTS_DISPATCH_WORKERS,
+            help=(
+                "Number of worker threads or processes sending the notifications of the lanes without workers of "
+                "their own, critical first."
+            ),
+        )
+        parser.add_argument(
+            "--critical-workers",
+            type=int,
+            default=settings.ALERTS_DISPATCH_CRITICAL_WORKERS,
+            help="Number of workers only sending the critical notifications, 0 to send them with the shared workers.",
+        )
+        parser.add_argument(
+            "--standard-workers",
+            type=int,
+            default=settings.ALERTS_DISPATCH_STANDARD_WORKERS,
+            help="Number of workers only sending the standard notifications, 0 to send them with the shared workers.",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=["thread", "process"],
+            default="thread",
+            help="Kind of worker pool. Sending is I/O bound, so threads are usually enough.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.ALERTS_DISPATCH_BATCH_SIZE,
+            help="Number of notifications claimed from the outbox at once.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.ALERTS_DISPATCH_POLL_INTERVAL,
+            help="Seconds to wait before polling again when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--replay-deferred",
+            action="store_true",
+            help="Put the deferred notifications back in the outbox each time it is empty.",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Expose the metrics of this process in the Prometheus text format on this port.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the outbox is drained instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            # With the process pool, the channel metrics are recorded in the worker processes and not exposed
+            serve_metrics(options["metrics_port"])
+
+        if options["replay_deferred"]:
+            replay_deferred_notifications()
+
+        # Each lane is drained by its own pool of workers, so that a storm of standard alerts can neither delay the
+        # critical notifications nor take all the workers. The lanes without workers of their own are drained by the
+        # shared pool, the critical notifications first.
+        lane_workers = {"critical": options["critical_workers"], "standard": options["standard_workers"]}
+        drains = [(lane, workers) for lane, workers in lane_workers.items() if workers > 0]
+        shared_lanes = [lane for lane in NOTIFICATION_LANES if lane_workers[lane] <= 0]
+        if shared_lanes:
+            # Without a lane, the notifications of all the lanes are claimed
+            shared_lane = shared_lanes[0] if len(shared_lanes) == 1 else None
+            drains.append((shared_lane, max(1, options["workers"])))
+
+        stop = threading.Event()
+        sent = {}
+        # The deferred notifications of all the lanes are replayed by a single drain, the last one
+        threads = [
+            threading.Thread(
+                target=self.drain,
+                args=(lane, workers, options, stop, sent),
+                kwargs={"replay_deferred": options["replay_deferred"] and position == len(drains) - 1},
+                name=f"dispatch-{lane or 'shared'}",
+            )
+            for position, (lane, workers) in enumerate(drains)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted, stopping dispatch.")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(f"{sum(sent.values())} notification(s) sent.")
+
+    def drain(
+        self,
+        lane: str | None,
+        workers: int,
+        options: dict,
+        stop: threading.Event,
+        sent: dict,
+        replay_deferred: bool = False,
+    ) -> None:
+        """
+        Claim the notifications of a lane, or of all the lanes without one, and send them with a pool of workers,
+        until the stop event is set, or until the outbox is drained with --once.
+        This runs in a thread of its own per lane, and the number of notifications sent is stored in sent, by lane.
+
+        :param replay_deferred: Put the deferred notifications back in the outbox each time the lane is empty.
+        """
+        if options["pool"] == "process":
+            # Spawn instead of fork so that no database connection is shared with the children
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_process_worker,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+        sent[lane] = 0
+        try:
+            with executor:
+                while not stop.is_set():
+                    notification_ids = claim_pending_notifications(options["batch_size"], lane=lane)
+                    if not notification_ids:
+                        if options["once"]:
+                            break
+                        stop.wait(options["poll_interval"])
+                        if replay_deferred:
+                            replay_deferred_notifications()
+                        continue
+
+                    # Split the claimed batch in one chunk per worker, keeping the notifications of an alert and
+                    # of an aggregation window together
+                    chunks = split_notification_ids(notification_ids, workers)
+                    futures = [executor.submit(send_chunk, chunk, notification_ids.claim_token) for chunk in chunks]
+                    done, _ = wait(futures)
+
+                    # The outcomes of the whole batch are written at once by this thread, the workers only send
+                    outcomes = []
+                    for future in done:
+                        if future.exception():
+                            # The notifications stay claimed, and are sent again after the claim timeout
+                            logger.error("Dispatch worker failed: %s", future.exception(), exc_info=future.exception())
+                        else:
+                            outcomes.extend(future.result())
+                    sent[lane] += save_results(outcomes, notification_ids.claim_token)
+        finally:
+            # The lane thread has its own database connection
+            connections.close_all()
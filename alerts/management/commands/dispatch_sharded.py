@@ -0,0 +1,111 @@
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from alerts.metrics import serve_metrics, watch_dispatch_shards
+from alerts.workers import init_process_worker, run_shard
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the notification outbox with one worker per shard of stores, the stores being assigned to the shards "
+        "by a hash of their location, so that the notifications of a store are sent in order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=settings.ALERTS_DISPATCH_SHARDS,
+            help="Number of shards, and of worker processes. The stores are split again when it changes.",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=["process", "thread"],
+            default="process",
+            help="Kind of workers. Processes use all the cores, threads are mostly meant for testing.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.ALERTS_DISPATCH_BATCH_SIZE,
+            help="Number of notifications claimed from the outbox at once by each worker.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.ALERTS_DISPATCH_POLL_INTERVAL,
+            help="Seconds a worker waits before polling again when its shard is empty.",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Expose the pending notifications and the lag of each shard in the Prometheus text format on this port.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the outbox is drained instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        shards = max(1, options["shards"])
+        if options["metrics_port"]:
+            watch_dispatch_shards(shards)
+            serve_metrics(options["metrics_port"])
+
+        if options["pool"] == "process":
+            # Spawn instead of fork so that no database connection is shared with the children
+            context = multiprocessing.get_context("spawn")
+            stop = context.Event()
+            executor = ProcessPoolExecutor(
+                max_workers=shards, mp_context=context, initializer=init_process_worker, initargs=(stop,)
+            )
+            worker_stop = None
+        else:
+            stop = worker_stop = threading.Event()
+            executor = ThreadPoolExecutor(max_workers=shards)
+
+        # Stop gracefully on SIGTERM as on Ctrl+C: the workers finish their current batch, so that no notification
+        # is left claimed and the shards can be split differently on restart
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        sent = 0
+        try:
+            with executor:
+                futures = [
+                    executor.submit(
+                        run_shard,
+                        shard,
+                        shards,
+                        options["batch_size"],
+                        options["poll_interval"],
+                        options["once"],
+                        worker_stop,
+                    )
+                    for shard in range(shards)
+                ]
+                try:
+                    wait(futures)
+                except KeyboardInterrupt:
+                    self.stdout.write("Interrupted, stopping the shards once their current batch is sent.")
+                    stop.set()
+                    wait(futures)
+                for shard, future in enumerate(futures):
+                    if future.exception():
+                        logger.error(
+                            "Dispatch shard %d failed: %s", shard, future.exception(), exc_info=future.exception()
+                        )
+                    else:
+                        sent += future.result()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        self.stdout.write(f"{sent} notification(s) sent by {shards} shard(s).")
@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from alerts.export import get_export_queryset, iter_gzip, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = "Export the alert or notification history as NDJSON, reading and writing the rows by chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=["alerts", "notifications"], help="History to export.")
+        parser.add_argument("--output", help="File to write the export to, the standard output by default.")
+        parser.add_argument("--gzip", action="store_true", help="Compress the export in the gzip format.")
+        parser.add_argument("--chunk-size", type=int, help="Number of rows fetched at once from the database.")
+        parser.add_argument("--since", help="Export the rows from this ISO 8601 datetime.")
+        parser.add_argument("--until", help="Export the rows before this ISO 8601 datetime.")
+        parser.add_argument("--store", help="Export the rows of this store location.")
+        parser.add_argument("--label", help="Export the rows of this alert label.")
+
+    def handle(self, *args, **options):
+        params = {name: options[name] for name in ("since", "until", "store", "label") if options[name]}
+        try:
+            queryset, fields = get_export_queryset(options["model"], params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        content = iter_ndjson(queryset, fields, options["chunk_size"])
+        if options["gzip"]:
+            content = iter_gzip(content)
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in content:
+                    output.write(chunk)
+        elif options["gzip"]:
+            for chunk in content:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            for chunk in content:
+                self.stdout.write(chunk.decode(), ending="")
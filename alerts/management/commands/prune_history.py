@@ -0,0 +1,142 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+
+
+# Notifications still waiting to be sent are never pruned
+UNFINISHED_STATUSES = ["pending", "held", "processing"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete, and optionally archive to compressed JSONL files, the alerts and notifications older than "
+        "their retention period. Rows are deleted in small primary key ranges, each in its own short transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--alerts-days",
+            type=int,
+            default=settings.ALERTS_RETENTION_ALERTS_DAYS,
+            help="Number of days the alerts are kept (their notifications are deleted with them).",
+        )
+        parser.add_argument(
+            "--notifications-days",
+            type=int,
+            default=settings.ALERTS_RETENTION_NOTIFICATIONS_DAYS,
+            help="Number of days the notifications are kept.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.ALERTS_RETENTION_CHUNK_SIZE,
+            help="Maximum number of rows deleted per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=settings.ALERTS_RETENTION_PAUSE,
+            help="Seconds to wait between two chunks, to let the webhook write in between.",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            help="Directory where the deleted rows are archived, as gzip compressed JSONL files.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows which would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        self.options = options
+        self.archive_dir = Path(options["archive_dir"]) if options["archive_dir"] else None
+        if self.archive_dir:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.archive_suffix = now.strftime("%Y%m%dT%H%M%S")
+
+        notifications = SentNotification.objects.filter(
+            sent_at__lt=now - timedelta(days=options["notifications_days"])
+        ).exclude(status__in=UNFINISHED_STATUSES)
+        deleted_notifications = self.prune(notifications, "notifications")
+
+        alerts = Alert.objects.filter(
+            received_at__lt=now - timedelta(days=options["alerts_days"])
+        ).exclude(sentnotification__status__in=UNFINISHED_STATUSES)
+        deleted_alerts = self.prune(alerts, "alerts", related_notifications=True)
+
+        verb = "would be deleted" if options["dry_run"] else "deleted"
+        self.stdout.write(f"{deleted_alerts} alert(s) and {deleted_notifications} notification(s) {verb}.")
+
+    def prune(self, queryset, name: str, related_notifications: bool = False) -> int:
+        """
+        Delete the rows of the queryset in chunks of consecutive primary keys, archiving them if requested.
+        A chunk is archived once its deletion is committed, so that the archive only holds deleted rows.
+        """
+        if self.options["dry_run"]:
+            return queryset.count()
+
+        archive = None
+        if self.archive_dir:
+            archive = gzip.open(self.archive_dir / f"{name}-{self.archive_suffix}.jsonl.gz", "at", encoding="utf-8")
+
+        deleted = 0
+        start = 0
+        try:
+            while start is not None:
+                ids = queryset.filter(id__gte=start).order_by("id").values_list("id", flat=True)
+                first_id = ids.first()
+                if first_id is None:
+                    break
+                # The chunk is the range of primary keys up to the first row of the next chunk, if any
+                end = next(iter(ids[self.options["chunk_size"]:]), None)
+                chunk = queryset.filter(id__gte=first_id)
+                if end is not None:
+                    chunk = chunk.filter(id__lt=end)
+                start = end
+
+                rows = related_rows = []
+                with transaction.atomic():
+                    if archive:
+                        rows = list(chunk.values())
+                    if related_notifications:
+                        # The notifications of the alerts are deleted with them, they are archived as well
+                        notifications = SentNotification.objects.filter(alert__in=chunk.values("id"))
+                        if archive:
+                            related_rows = list(notifications.values())
+                        notifications.delete()
+                        # Without notifications left, the alerts are deleted by range with a single statement,
+                        # instead of being loaded to cascade the deletion
+                        deleted += chunk._raw_delete(chunk.db)
+                    else:
+                        deleted += chunk.delete()[0]
+
+                if archive:
+                    self.write_archive(archive, rows)
+                    if related_rows:
+                        path = self.archive_dir / f"notifications-{self.archive_suffix}.jsonl.gz"
+                        with gzip.open(path, "at", encoding="utf-8") as related_archive:
+                            self.write_archive(related_archive, related_rows)
+
+                if self.options["pause"]:
+                    time.sleep(self.options["pause"])
+        finally:
+            if archive:
+                archive.close()
+        return deleted
+
+    def write_archive(self, archive, rows: list[dict]) -> None:
+        for row in rows:
+            archive.write(json.dumps(row, default=str) + "\n")
+        archive.flush()
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from alerts.dispatch import claim_due_retries, save_results, send_notification_ids
+from alerts.metrics import serve_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Retry the failed and deferred notifications whose next attempt is due, "
+        "with exponential backoff, until they are sent or dead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.ALERTS_RETRY_BATCH_SIZE,
+            help="Number of notifications claimed at once.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=settings.ALERTS_RETRY_RATE,
+            help="Maximum number of notifications retried per second.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.ALERTS_DISPATCH_POLL_INTERVAL,
+            help="Seconds to wait before polling again when no retry is due.",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Expose the metrics of this process in the Prometheus text format on this port.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no retry is due instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            serve_metrics(options["metrics_port"])
+        retried = sent = 0
+        try:
+            while True:
+                notification_ids = claim_due_retries(options["batch_size"])
+                if not notification_ids:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                start = time.monotonic()
+                sent += save_results(
+                    send_notification_ids(notification_ids, notification_ids.claim_token), notification_ids.claim_token
+                )
+                retried += len(notification_ids)
+
+                # Throttle the retries, to not overload the downstream services recovering from an outage
+                if options["rate"] > 0:
+                    remaining = len(notification_ids) / options["rate"] - (time.monotonic() - start)
+                    if remaining > 0:
+                        time.sleep(remaining)
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted, stopping retries.")
+
+        self.stdout.write(f"{retried} notification(s) retried, {sent} sent.")
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from alerts.receiver import FaultProfile, NotificationReceiver
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the notification API targeted by the API channel (ALERT_API_ROOT), "
+        "injecting latency, errors, timeouts and connection resets, and recording the notifications received."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Host to listen on.")
+        parser.add_argument("--port", type=int, default=8001, help="Port to listen on.")
+        parser.add_argument(
+            "--latency",
+            default="0",
+            help=(
+                "Latency added before responding, in seconds: a number, or one of fixed:<s>, uniform:<min>,<max>, "
+                "normal:<mean>,<stddev>, lognormal:<median>,<sigma>, exponential:<mean>."
+            ),
+        )
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Rate of requests answered with an error.")
+        parser.add_argument("--error-status", type=int, default=500, help="HTTP status of the injected errors.")
+        parser.add_argument(
+            "--timeout-rate", type=float, default=0.0, help="Rate of requests left without response."
+        )
+        parser.add_argument(
+            "--timeout-duration",
+            type=float,
+            default=30.0,
+            help="Seconds after which a request left without response is closed.",
+        )
+        parser.add_argument("--reset-rate", type=float, default=0.0, help="Rate of connections reset.")
+        parser.add_argument(
+            "--no-batch", action="store_true", help="Do not advertise nor serve the batch notifications endpoint."
+        )
+        parser.add_argument("--seed", type=int, help="Seed of the random draws, to replay the same faults.")
+        parser.add_argument("--record", help="File where every received request is written as a JSON line.")
+        parser.add_argument(
+            "--stats-interval", type=float, default=10.0, help="Seconds between two outputs of the counts."
+        )
+
+    def handle(self, *args, **options):
+        rates = [options["error_rate"], options["timeout_rate"], options["reset_rate"]]
+        if any(rate < 0 for rate in rates) or sum(rates) > 1:
+            raise CommandError("The error, timeout and reset rates must be positive and add up to at most 1.")
+        try:
+            profile = FaultProfile(
+                latency=options["latency"],
+                error_rate=options["error_rate"],
+                error_status=options["error_status"],
+                timeout_rate=options["timeout_rate"],
+                timeout_duration=options["timeout_duration"],
+                reset_rate=options["reset_rate"],
+                batch=not options["no_batch"],
+                seed=options["seed"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        record_file = open(options["record"], "a", buffering=1) if options["record"] else None
+        receiver = NotificationReceiver(options["host"], options["port"], profile=profile, record_file=record_file)
+        receiver.start()
+        self.stdout.write(f"Receiving notifications on {receiver.url}/webhook/notifications")
+        try:
+            while True:
+                time.sleep(options["stats_interval"])
+                self.stdout.write(str(receiver.stats()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            receiver.stop()
+            if record_file:
+                record_file.close()
+            self.stdout.write(f"Stopped. {receiver.stats()}")
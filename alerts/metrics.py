@@ -0,0 +1,403 @@
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connections
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from alerts.models.sent_notification import NOTIFICATION_LANES, SentNotification
+
+
+# Buckets in seconds of the latencies inside the service, and of the end-to-end latency from detection to delivery
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DELIVERY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class of the metrics, holding a value per combination of label values.
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        """
+        The samples of the metric, as (name, labels, value).
+        """
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """
+    Gauge set directly, or computed when the metrics are collected by a function returning {label values: value}.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        if self.function is not None:
+            values = self.function()
+            with self._lock:
+                self._values = {tuple(str(value) for value in key): value for key, value in values.items()}
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+            return sum(counts)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Set of metrics rendered together in the Prometheus text format.
+
+    The metrics are process-local: the web server and each dispatch command expose their own.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def clear(self) -> None:
+        """
+        Reset the values of all the metrics.
+        """
+        with self._lock:
+            for metric in self._metrics.values():
+                metric.clear()
+
+
+def get_outbox_depth() -> dict:
+    """
+    Number of notifications in the outbox by status, the sent ones excepted.
+    """
+    rows = SentNotification.objects.exclude(status="sent").values_list("status").annotate(count=Count("id"))
+    return {(status,): count for status, count in rows}
+
+
+def get_shard_backlog(shards: int) -> dict:
+    """
+    Number of pending notifications, and age in seconds of the oldest one, of each dispatch shard.
+    """
+    backlog = {shard: (0, 0.0) for shard in range(shards)}
+    rows = (
+        SentNotification.objects.filter(status="pending")
+        .annotate(shard=F("shard_key") % shards)
+        .values_list("shard")
+        .annotate(count=Count("id"), oldest=Min("sent_at"))
+    )
+    now = timezone.now()
+    for shard, count, oldest in rows:
+        backlog[shard] = (count, max(0.0, (now - oldest).total_seconds()))
+    return backlog
+
+
+def get_lane_backlog() -> dict:
+    """
+    Number of pending notifications, and age in seconds of the oldest one, of each dispatch lane.
+    """
+    backlog = {lane: (0, 0.0) for lane in NOTIFICATION_LANES}
+    rows = (
+        SentNotification.objects.filter(status="pending")
+        .values_list("priority")
+        .annotate(count=Count("id"), oldest=Min("sent_at"))
+    )
+    now = timezone.now()
+    for priority, count, oldest in rows:
+        backlog[NOTIFICATION_LANES[priority]] = (count, max(0.0, (now - oldest).total_seconds()))
+    return backlog
+
+
+REGISTRY = Registry()
+
+WEBHOOK_REQUESTS = REGISTRY.register(
+    Counter("alerts_webhook_requests_total", "Requests to the alert webhooks, by endpoint and status.", ("endpoint", "status"))
+)
+WEBHOOK_LATENCY = REGISTRY.register(
+    Histogram("alerts_webhook_duration_seconds", "Duration of the alert webhook requests.", ("endpoint",))
+)
+STAGE_LATENCY = REGISTRY.register(
+    Histogram(
+        "alerts_stage_duration_seconds",
+        "Duration of each stage of the alert processing: validation, insert, routing, enqueue.",
+        ("stage",),
+    )
+)
+ALERTS_RECEIVED = REGISTRY.register(
+    Counter("alerts_received_total", "Alerts queued for dispatch, by severity.", ("severity",))
+)
+ALERTS_SHED = REGISTRY.register(
+    Counter(
+        "alerts_shed_total",
+        "Alerts rejected by the admission control of the webhooks, by overload reason (in_flight, outbox_depth) "
+        "and severity.",
+        ("reason", "severity"),
+    )
+)
+WEBHOOK_IN_FLIGHT = REGISTRY.register(
+    Gauge("alerts_webhook_in_flight", "Alert webhook requests being processed by the process.")
+)
+CHANNEL_LATENCY = REGISTRY.register(
+    Histogram(
+        "alerts_channel_send_duration_seconds",
+        "Duration of the channel sends, one send covering all the recipients of an alert when batched.",
+        ("channel",),
+    )
+)
+NOTIFICATIONS = REGISTRY.register(
+    Counter(
+        "alerts_notifications_total",
+        "Notification attempts, by channel, outcome (sent, failed, deferred) and severity.",
+        ("channel", "outcome", "severity"),
+    )
+)
+DELIVERY_LATENCY = REGISTRY.register(
+    Histogram(
+        "alerts_delivery_latency_seconds",
+        "Time from the detection of the alert (time_spotted) to the delivery of its notification.",
+        ("channel", "severity"),
+        buckets=DELIVERY_BUCKETS,
+    )
+)
+OUTBOX_DEPTH = REGISTRY.register(
+    Gauge(
+        "alerts_outbox_notifications",
+        "Notifications in the outbox not sent yet, by status.",
+        ("status",),
+        function=get_outbox_depth,
+    )
+)
+DISPATCH_QUEUE_LATENCY = REGISTRY.register(
+    Histogram(
+        "alerts_dispatch_queue_seconds",
+        "Time a notification waited in the outbox before its first attempt, by dispatch lane.",
+        ("lane",),
+        buckets=DELIVERY_BUCKETS,
+    )
+)
+DISPATCH_LANE_PENDING = REGISTRY.register(
+    Gauge(
+        "alerts_dispatch_lane_pending",
+        "Pending notifications of each dispatch lane.",
+        ("lane",),
+        function=lambda: {(lane,): count for lane, (count, _) in get_lane_backlog().items()},
+    )
+)
+DISPATCH_LANE_LAG = REGISTRY.register(
+    Gauge(
+        "alerts_dispatch_lane_lag_seconds",
+        "Age of the oldest pending notification of each dispatch lane, 0 when none is pending.",
+        ("lane",),
+        function=lambda: {(lane,): lag for lane, (_, lag) in get_lane_backlog().items()},
+    )
+)
+
+DISPATCH_SHARD_PENDING = REGISTRY.register(
+    Gauge("alerts_dispatch_shard_pending", "Pending notifications of each dispatch shard.", ("shard",))
+)
+DISPATCH_SHARD_LAG = REGISTRY.register(
+    Gauge(
+        "alerts_dispatch_shard_lag_seconds",
+        "Age of the oldest pending notification of each dispatch shard, 0 when none is pending.",
+        ("shard",),
+    )
+)
+
+
+def watch_dispatch_shards(shards: int) -> None:
+    """
+    Report the backlog of each of the given number of dispatch shards when the metrics are collected.
+    """
+    DISPATCH_SHARD_PENDING.function = lambda: {
+        (shard,): count for shard, (count, _) in get_shard_backlog(shards).items()
+    }
+    DISPATCH_SHARD_LAG.function = lambda: {(shard,): lag for shard, (_, lag) in get_shard_backlog(shards).items()}
+
+
+def instrument_webhook(endpoint: str):
+    """
+    Decorate the post method of a webhook view, sync or async, to count its responses by status and time them.
+    """
+
+    def observe(start: float, status) -> None:
+        WEBHOOK_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        WEBHOOK_REQUESTS.inc(endpoint=endpoint, status=status)
+
+    def decorator(post):
+        if inspect.iscoroutinefunction(post):
+            @functools.wraps(post)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    response = await post(*args, **kwargs)
+                except Exception as e:
+                    observe(start, getattr(e, "status_code", 500))
+                    raise
+                observe(start, response.status_code)
+                return response
+
+            return async_wrapper
+
+        @functools.wraps(post)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = post(*args, **kwargs)
+            except Exception as e:
+                observe(start, getattr(e, "status_code", 500))
+                raise
+            observe(start, response.status_code)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            body = REGISTRY.render().encode()
+        finally:
+            # Each request is served by a new thread, with its own database connection
+            connections.close_all()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Expose the metrics of a process not serving the web application, such as the dispatch commands,
+    from a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+def set_status_of_existing_notifications(apps, schema_editor):
+    # Notifications created before the outbox were already attempted, they must not be sent again
+    SentNotification = apps.get_model("alerts", "SentNotification")
+    SentNotification.objects.filter(sent=True).update(status="sent")
+    SentNotification.objects.filter(sent=False).update(status="failed")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentnotification',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='sentnotification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sentnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('sent', 'Sent'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.RunPython(set_status_of_existing_notifications, migrations.RunPython.noop),
+    ]
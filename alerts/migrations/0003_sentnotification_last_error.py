@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0002_sentnotification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentnotification',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0004_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sentnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('sent', 'Sent'), ('failed', 'Failed'), ('deferred', 'Deferred')], db_index=True, default='pending', max_length=20),
+        ),
+    ]
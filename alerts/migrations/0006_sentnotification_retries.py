@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+def set_attempts_of_existing_notifications(apps, schema_editor):
+    # Notifications sent or failed before the retries were attempted once
+    SentNotification = apps.get_model("alerts", "SentNotification")
+    SentNotification.objects.filter(status__in=["sent", "failed"]).update(attempts=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0005_sentnotification_deferred_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentnotification',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sentnotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sentnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('sent', 'Sent'), ('failed', 'Failed'), ('deferred', 'Deferred'), ('dead', 'Dead')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.RunPython(set_attempts_of_existing_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0006_sentnotification_retries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['received_at', 'id'], name='alert_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['location', 'received_at', 'id'], name='alert_location_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['label', 'received_at', 'id'], name='alert_label_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentnotification',
+            index=models.Index(fields=['sent_at', 'id'], name='notification_sent_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentnotification',
+            index=models.Index(fields=['user', 'sent_at', 'id'], name='notification_user_sent_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentnotification',
+            index=models.Index(fields=['method', 'sent', 'sent_at', 'id'], name='notification_method_sent_idx'),
+        ),
+    ]
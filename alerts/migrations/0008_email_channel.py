@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0007_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useralertsubscripion',
+            name='notification_channel',
+            field=models.CharField(choices=[('api', 'Api'), ('email', 'Email')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0008_email_channel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentnotification',
+            name='digest_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='useralertsubscripion',
+            name='aggregation_window',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='sentnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('held', 'Held'), ('processing', 'Processing'), ('sent', 'Sent'), ('failed', 'Failed'), ('deferred', 'Deferred'), ('dead', 'Dead')], db_index=True, default='pending', max_length=20),
+        ),
+    ]
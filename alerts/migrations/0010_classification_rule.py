@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0009_aggregation_window'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassificationRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=20)),
+                ('severity', models.CharField(choices=[('standard', 'Standard'), ('critical', 'Critical')], max_length=20)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('store', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='alerts.store')),
+            ],
+        ),
+    ]
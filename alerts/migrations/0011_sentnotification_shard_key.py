@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:42
+
+import zlib
+
+from django.db import migrations, models
+
+
+def set_shard_key_of_existing_notifications(apps, schema_editor):
+    # Same hash of the store location as the one given to the new notifications
+    SentNotification = apps.get_model("alerts", "SentNotification")
+    locations = SentNotification.objects.values_list("alert__location_id", flat=True).distinct()
+    for location in locations:
+        SentNotification.objects.filter(alert__location_id=location).update(
+            shard_key=zlib.crc32(location.encode())
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0010_classification_rule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentnotification',
+            name='shard_key',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(set_shard_key_of_existing_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+def set_priority_of_unsent_notifications(apps, schema_editor):
+    # Only the notifications still to send need a lane, given by the default severity of their label
+    # (theft is critical), without the classification rules
+    SentNotification = apps.get_model("alerts", "SentNotification")
+    SentNotification.objects.filter(alert__label="theft").exclude(status__in=["sent", "dead"]).update(priority=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0011_sentnotification_shard_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sentnotification',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='sentnotification',
+            index=models.Index(fields=['status', 'priority', 'id'], name='notification_lane_idx'),
+        ),
+        migrations.RunPython(set_priority_of_unsent_notifications, migrations.RunPython.noop),
+    ]
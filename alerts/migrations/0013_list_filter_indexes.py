@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0012_sentnotification_priority'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['location', 'label', 'id'], name='alert_location_label_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentnotification',
+            index=models.Index(fields=['alert', 'sent_at', 'id'], name='notification_alert_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sentnotification',
+            index=models.Index(fields=['status', 'sent_at', 'id'], name='notification_status_sent_idx'),
+        ),
+    ]
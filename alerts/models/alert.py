@@ -18,5 +18,15 @@ class Alert(models.Model):
     time_spotted = models.FloatField()
     received_at = models.DateTimeField(auto_now_add=True)
 
+    # Indexes matching the keyset pagination on (received_at, id) of the alert list and its filters,
+    # and the store and label filters of the notification list, through their alert
+    class Meta:
+        indexes = [
+            models.Index(fields=["received_at", "id"], name="alert_received_idx"),
+            models.Index(fields=["location", "received_at", "id"], name="alert_location_received_idx"),
+            models.Index(fields=["label", "received_at", "id"], name="alert_label_received_idx"),
+            models.Index(fields=["location", "label", "id"], name="alert_location_label_idx"),
+        ]
+
     def __str__(self):
         return f"Alert for {self.label} at {self.location} ({self.alert_uuid})"
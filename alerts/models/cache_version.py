@@ -0,0 +1,37 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+
+
+class CacheVersion(models.Model):
+    """
+    Version of a process-local cache, shared by all the processes through the database.
+    Bumping the version tells the other processes that their copy of the cache is outdated.
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls, name: str) -> int:
+        """
+        Return the current version of the cache with the given name.
+        """
+        version = cls.objects.filter(name=name).values_list("version", flat=True).first()
+        return version or 0
+
+    @classmethod
+    def bump(cls, name: str) -> None:
+        """
+        Increment the version of the cache with the given name.
+        """
+        if cls.objects.filter(name=name).update(version=F("version") + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, version=1)
+        except IntegrityError:
+            # Created by another process in the meantime
+            cls.objects.filter(name=name).update(version=F("version") + 1)
+
+    def __str__(self):
+        return f"{self.name} (v{self.version})"
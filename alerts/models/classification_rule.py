@@ -0,0 +1,28 @@
+from django.db import models
+
+from alerts.models.store import Store
+
+
+ALERT_SEVERITIES = (
+    ("standard", "Standard"),
+    ("critical", "Critical"),
+)
+
+
+class ClassificationRule(models.Model):
+    """
+    Severity of an alert label in a store, or in all the stores when no store is set, overriding the default one.
+    A store rule takes precedence over a rule for all the stores, and a time of day rule over an all day rule.
+    """
+
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, blank=True, null=True)
+    label = models.CharField(max_length=20)
+    severity = models.CharField(max_length=20, choices=ALERT_SEVERITIES)
+    # Time of day during which the rule applies, in ALERTS_CLASSIFICATION_TIME_ZONE, all day when not set.
+    # The period wraps around midnight when it ends before it starts, e.g. from 21:00 to 07:00 after closing hours
+    start_time = models.TimeField(blank=True, null=True)
+    end_time = models.TimeField(blank=True, null=True)
+
+    def __str__(self):
+        period = f" from {self.start_time} to {self.end_time}" if self.start_time or self.end_time else ""
+        return f"{self.label} is {self.severity} at {self.store or 'all stores'}{period}"
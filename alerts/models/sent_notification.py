@@ -4,12 +4,63 @@ from alerts.models.user import User
 from alerts.models.alert import Alert
 
 
+# Lifecycle of a notification in the outbox:
+# pending -> processing (claimed by a dispatch worker) -> sent | failed | deferred
+# Deferred notifications were not sent because the channel refused to try (e.g. circuit breaker open), and can be replayed
+# Failed and deferred notifications are claimed again by the retry scheduler once next_attempt_at is reached,
+# and failed notifications become dead after ALERTS_RETRY_MAX_ATTEMPTS attempts
+# Held notifications wait for the end of the aggregation window of their subscription, until digest_until,
+# and are then claimed as pending ones and sent together as one digest
+NOTIFICATION_STATUSES = (
+    ("pending", "Pending"),
+    ("held", "Held"),
+    ("processing", "Processing"),
+    ("sent", "Sent"),
+    ("failed", "Failed"),
+    ("deferred", "Deferred"),
+    ("dead", "Dead"),
+)
+
+# Dispatch lanes, by severity: the notifications of a lane are claimed before the ones of the next lanes,
+# and the critical lane has its own dispatch workers, so that critical alerts overtake the others
+NOTIFICATION_LANES = ("critical", "standard")
+
+
 class SentNotification(models.Model):
     alert = models.ForeignKey(Alert, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     method = models.CharField(max_length=50)
     sent = models.BooleanField(default=False)
     sent_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(
+        max_length=20, choices=NOTIFICATION_STATUSES, default="pending", db_index=True
+    )
+    # Set when a dispatch worker claims the notification, so several workers can drain the outbox safely
+    claim_token = models.CharField(max_length=32, blank=True, null=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    # Details given by the channel when the last attempt failed
+    last_error = models.TextField(blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    # End of the aggregation window of the notification, the notifications of the same user, channel, store, severity
+    # and window are sent as one digest
+    digest_until = models.DateTimeField(blank=True, null=True)
+    # Hash of the store location, the notifications of a store are all sent by the dispatch shard shard_key % shards
+    shard_key = models.PositiveBigIntegerField(default=0)
+    # Position in NOTIFICATION_LANES of the lane of the notification, given by the severity of its alert
+    priority = models.PositiveSmallIntegerField(default=NOTIFICATION_LANES.index("standard"))
+
+    # Indexes matching the keyset pagination on (sent_at, id) of the notification list and its filters,
+    # and the claim of the outbox by lane
+    class Meta:
+        indexes = [
+            models.Index(fields=["sent_at", "id"], name="notification_sent_at_idx"),
+            models.Index(fields=["user", "sent_at", "id"], name="notification_user_sent_at_idx"),
+            models.Index(fields=["method", "sent", "sent_at", "id"], name="notification_method_sent_idx"),
+            models.Index(fields=["alert", "sent_at", "id"], name="notification_alert_sent_idx"),
+            models.Index(fields=["status", "sent_at", "id"], name="notification_status_sent_idx"),
+            models.Index(fields=["status", "priority", "id"], name="notification_lane_idx"),
+        ]
 
     def __str__(self):
-        return f"Notification for {self.user} - {self.alert} by {self.method} at {self.sent_at} - Susccess: {self.sent}"
\ No newline at end of file
+        return f"Notification for {self.user} - {self.alert} by {self.method} at {self.sent_at} - Susccess: {self.sent}"
@@ -18,6 +18,9 @@ class UserAlertSubscripion(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     alert_preference = models.CharField(max_length=20, choices=USER_ALERT_PREFERENCES)
     notification_channel = models.CharField(max_length=50, choices=NOTIFICATION_CHANNEL_CHOICES)
+    # Seconds during which the alerts of the same store and severity are merged into one digest notification,
+    # 0 to send each alert separately. The first critical alert of a window is still sent right away
+    aggregation_window = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.email} - {self.store.name} ({self.alert_preference}) - {self.notification_channel}"
\ No newline at end of file
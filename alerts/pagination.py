@@ -0,0 +1,86 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (keyset_field, id), from the most recent to the oldest row.
+
+    The cursor holds the position of the last row of the page, and the next page is fetched with a range filter
+    on this position instead of an offset, so every page costs the same whatever the size of the table.
+    The view sets the datetime field to paginate on with its `keyset_field` attribute.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset_field = view.keyset_field
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f"-{self.keyset_field}", "-id")
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            # The redundant lte bound lets the database walk the (keyset_field, id) index as a range
+            queryset = queryset.filter(**{f"{self.keyset_field}__lte": value}).filter(
+                Q(**{f"{self.keyset_field}__lt": value}) | Q(**{self.keyset_field: value, "id__lt": pk})
+            )
+
+        # Fetch one more row to know if there is a next page
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, settings.ALERTS_PAGE_SIZE))
+        except ValueError:
+            page_size = settings.ALERTS_PAGE_SIZE
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request) -> tuple[datetime, int] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return datetime.fromisoformat(value), int(pk)
+        except (binascii.Error, ValueError, TypeError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, row) -> str:
+        position = [getattr(row, self.keyset_field).isoformat(), row.pk]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
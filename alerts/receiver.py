@@ -0,0 +1,227 @@
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_latency(spec: str):
+    """
+    Parse a latency distribution, in seconds.
+
+    Supported distributions: "fixed:<seconds>", "uniform:<min>,<max>", "normal:<mean>,<stddev>",
+    "lognormal:<median>,<sigma>" and "exponential:<mean>". A bare number is a fixed latency.
+
+    :return: A function drawing a latency from a random.Random instance.
+    :raises ValueError: If the distribution is not valid.
+    """
+    name, _, args = spec.partition(":")
+    if not args:
+        name, args = "fixed", spec
+    try:
+        params = [float(arg) for arg in args.split(",")]
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters: {spec}")
+
+    distributions = {
+        "fixed": (1, lambda rng, value: value),
+        "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+        "normal": (2, lambda rng, mean, stddev: rng.gauss(mean, stddev)),
+        "lognormal": (2, lambda rng, median, sigma: median * rng.lognormvariate(0, sigma)),
+        "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean) if mean else 0.0),
+    }
+    if name not in distributions:
+        raise ValueError(f"Unknown latency distribution: {name}")
+    arity, draw = distributions[name]
+    if len(params) != arity:
+        raise ValueError(f"The {name} latency distribution takes {arity} parameter(s): {spec}")
+    return lambda rng: max(0.0, draw(rng, *params))
+
+
+class FaultProfile:
+    """
+    Faults injected by the notification receiver in its responses.
+    """
+
+    def __init__(
+        self,
+        latency: str = "0",
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        timeout_rate: float = 0.0,
+        timeout_duration: float = 30.0,
+        reset_rate: float = 0.0,
+        batch: bool = True,
+        seed: int | None = None,
+    ):
+        """
+        Initialize the FaultProfile.
+
+        :param latency: Distribution of the latency added before responding, see parse_latency.
+        :param error_rate: Rate of requests answered with error_status.
+        :param error_status: HTTP status of the injected errors.
+        :param timeout_rate: Rate of requests left without response for timeout_duration seconds.
+        :param timeout_duration: Seconds after which a request left without response is closed.
+        :param reset_rate: Rate of connections reset without response.
+        :param batch: Whether the batch notifications endpoint is advertised and served.
+        :param seed: Seed of the random draws, to replay the same faults.
+        """
+        self.draw_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.timeout_duration = timeout_duration
+        self.reset_rate = reset_rate
+        self.batch = batch
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> tuple[str, float]:
+        """
+        Draw the outcome of a request, "reset", "timeout", "error" or "ok", and the latency added before it.
+        """
+        with self._lock:
+            latency = self.draw_latency(self._random)
+            draw = self._random.random()
+        for outcome, rate in (("reset", self.reset_rate), ("timeout", self.timeout_rate), ("error", self.error_rate)):
+            if draw < rate:
+                return outcome, latency
+            draw -= rate
+        return "ok", latency
+
+
+class NotificationReceiverHandler(BaseHTTPRequestHandler):
+    """
+    Serve the endpoints of the notification API called by the API channel, applying the faults of the server.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are written separately, without it each response of a kept-alive connection is delayed
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path != "/webhook/capabilities":
+            self._respond(404, {"error": "Not found"})
+            return
+        self._respond(200, {"batch": self.server.profile.batch})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = None
+
+        batch = self.path == "/webhook/notifications/batch"
+        if not isinstance(payload, dict) or self.path != "/webhook/notifications" and not (
+            batch and self.server.profile.batch
+        ):
+            self.server.record(self.path, payload, "rejected")
+            self._respond(404 if isinstance(payload, dict) else 400, {"error": "Invalid request"})
+            return
+
+        outcome, latency = self.server.profile.draw()
+        self.server.record(self.path, payload, outcome)
+        time.sleep(latency)
+
+        if outcome == "reset":
+            # Close the connection with a RST instead of a FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+            self.close_connection = True
+        elif outcome == "timeout":
+            time.sleep(self.server.profile.timeout_duration)
+            self.close_connection = True
+        elif outcome == "error":
+            self._respond(self.server.profile.error_status, {"error": "Injected error"})
+        elif batch:
+            user_ids = payload.get("target_user_ids") or []
+            self._respond(200, {"results": {user_id: {"success": True} for user_id in user_ids}})
+        else:
+            self._respond(200, {"status": "ok"})
+
+    def _respond(self, status: int, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NotificationReceiver(ThreadingHTTPServer):
+    """
+    Local stand-in for the notification API, with fault injection.
+
+    It accepts the notifications sent by the API channel, single or batched, and records what it received:
+    the count of requests per path and outcome, the last received payloads, and optionally all of them in a file.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        profile: FaultProfile | None = None,
+        record_limit: int = 1000,
+        record_file=None,
+    ):
+        """
+        Initialize the NotificationReceiver.
+
+        :param host: The host to listen on.
+        :param port: The port to listen on, a free port is picked when 0.
+        :param profile: The faults to inject, none by default.
+        :param record_limit: Number of the last received requests kept in memory.
+        :param record_file: Text file where every received request is written as a JSON line.
+        """
+        super().__init__((host, port), NotificationReceiverHandler)
+        self.profile = profile or FaultProfile()
+        self.record_file = record_file
+        self.received = deque(maxlen=record_limit)
+        self.requests = {}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path: str, payload, outcome: str) -> None:
+        """
+        Record a received request and the outcome drawn for it.
+        """
+        entry = {"received_at": time.time(), "path": path, "outcome": outcome, "payload": payload}
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.received.append(entry)
+            if self.record_file:
+                self.record_file.write(json.dumps(entry) + "\n")
+
+    def stats(self) -> dict:
+        """
+        Count of the received requests, per path and per outcome.
+        """
+        with self._lock:
+            return {"requests": dict(self.requests), "outcomes": dict(self.outcomes)}
+
+    def start(self) -> None:
+        """
+        Serve from a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="notification-receiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from alerts.models.cache_version import CacheVersion
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+
+
+ROUTING_CACHE_NAME = "subscription-routing"
+
+
+class SubscriptionRoutingIndex:
+    """
+    Process-local index of the subscriptions, keyed by (store location, alert severity).
+
+    The index is built with one query and kept in memory, so that routing an alert does not query the subscriptions.
+    It is invalidated locally by the model signals, and rebuilt when the shared CacheVersion changes,
+    which is checked at most every ALERTS_ROUTING_REFRESH_INTERVAL seconds, so that all the workers stay consistent.
+    """
+
+    def __init__(self):
+        self._routes = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_subscriptions(self, location: str, severity: str) -> list[UserAlertSubscripion]:
+        """
+        Return the subscriptions, with their user loaded, matching an alert of the given severity in the given store.
+
+        :param location: The location of the store.
+        :param severity: The classification of the alert.
+        """
+        return self._get_routes().get((location, severity), [])
+
+    def invalidate(self) -> None:
+        """
+        Drop the index, it is rebuilt on the next lookup.
+        """
+        self._routes = None
+
+    def _get_routes(self) -> dict:
+        routes = self._routes
+        if routes is not None and time.monotonic() - self._checked_at < settings.ALERTS_ROUTING_REFRESH_INTERVAL:
+            return routes
+
+        with self._lock:
+            # Read the version before the subscriptions, a concurrent change is then picked up by the next check
+            version = CacheVersion.current(ROUTING_CACHE_NAME)
+            if self._routes is None or version != self._version:
+                self._routes = self._build()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._routes
+
+    @staticmethod
+    def _build() -> dict:
+        routes = defaultdict(list)
+        for subscription in UserAlertSubscripion.objects.select_related("user").order_by("id"):
+            if subscription.alert_preference == "both":
+                severities = ["standard", "critical"]
+            else:
+                severities = [subscription.alert_preference]
+            for severity in severities:
+                routes[(subscription.store_id, severity)].append(subscription)
+        return dict(routes)
+
+
+routing_index = SubscriptionRoutingIndex()
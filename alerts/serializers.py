@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from alerts.alerts import classification_index
 from alerts.models.alert import Alert
 from alerts.models.sent_notification import SentNotification
 from alerts.models.store import Store
@@ -11,6 +12,16 @@ class AlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = Alert
         fields = ['url', 'location', 'alert_uuid', 'label', 'time_spotted']
+        # Duplicates are rejected when the alert is inserted, to not query the uuid on every alert
+        extra_kwargs = {'alert_uuid': {'validators': []}}
+
+    # The labels are the default ones and the ones of the classification rules, not only the model choices
+    label = serializers.CharField(max_length=20)
+
+    def validate_label(self, value):
+        if value not in classification_index.get_labels():
+            raise serializers.ValidationError(f'"{value}" is not a valid choice.')
+        return value
 
 
 # The serializers below are used to facilitate the filling of the tables using the browser versionof the api.
@@ -28,10 +39,10 @@ class StoreSerializer(serializers.ModelSerializer):
 class UserAlertSubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserAlertSubscripion
-        fields = ['user', 'store', 'alert_preference', 'notification_channel']
+        fields = ['user', 'store', 'alert_preference', 'notification_channel', 'aggregation_window']
 
 class SentNotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = SentNotification
-        fields = ['alert', 'user', 'method', 'sent', 'sent_at']
+        fields = ['alert', 'user', 'method', 'sent', 'sent_at', 'status', 'last_error']
 
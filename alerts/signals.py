@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from alerts.alerts import classification_index
+from alerts.classification import CLASSIFICATION_CACHE_NAME
+from alerts.models.cache_version import CacheVersion
+from alerts.models.classification_rule import ClassificationRule
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.routing import ROUTING_CACHE_NAME, routing_index
+from alerts.validation import STORE_LOCATIONS_CACHE_NAME, store_locations
+
+
+@receiver(post_save, sender=UserAlertSubscripion)
+@receiver(post_delete, sender=UserAlertSubscripion)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_routing_index(sender, **kwargs):
+    """
+    Invalidate the subscription routing index of this process, and tell the other processes to rebuild theirs.
+    """
+    routing_index.invalidate()
+    CacheVersion.bump(ROUTING_CACHE_NAME)
+
+
+@receiver(pre_save, sender=ClassificationRule)
+def remember_classification_rule_store(sender, instance, **kwargs):
+    """
+    Remember the store of a rule before it is updated, its table has to be recompiled without the rule.
+    """
+    if not instance._state.adding:
+        instance._previous_store_id = (
+            ClassificationRule.objects.filter(pk=instance.pk).values_list("store_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ClassificationRule)
+@receiver(post_delete, sender=ClassificationRule)
+def invalidate_classification_index(sender, instance, signal, created=False, **kwargs):
+    """
+    Recompile the classification tables of the stores of the rule in this process, and tell the other processes.
+    """
+    locations = {instance.store_id}
+    if not created and signal is post_save:
+        # The store of an updated rule may have changed, the table of its previous store is recompiled as well
+        locations.add(getattr(instance, "_previous_store_id", None))
+    classification_index.invalidate(*locations)
+    CacheVersion.bump(CLASSIFICATION_CACHE_NAME)
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_store_locations(sender, **kwargs):
+    """
+    Reload the store locations of this process, and tell the other processes to reload theirs.
+    """
+    store_locations.invalidate()
+    CacheVersion.bump(STORE_LOCATIONS_CACHE_NAME)
@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from alerts.admission import AdmissionController, webhook_admission
+from alerts.dedup import recent_alerts
+from alerts.dispatch import queue_alert
+from alerts.metrics import ALERTS_SHED, REGISTRY
+from alerts.models.alert import Alert
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+
+
+class AdmissionControllerTestCase(TestCase):
+    def setUp(self):
+        REGISTRY.clear()
+        self.addCleanup(REGISTRY.clear)
+        self.now = 0.0
+        self.admission = AdmissionController(
+            max_in_flight=2, max_outbox_depth=1, refresh_interval=1, retry_after=5, clock=lambda: self.now
+        )
+        store = Store.objects.create(location="test-store", name="Test Store")
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=user, store=store, alert_preference="both", notification_channel="api"
+        )
+        self.store = store
+
+    def queue_alerts(self, count):
+        for i in range(count):
+            queue_alert(
+                {
+                    "url": "http://example.com/alert",
+                    "location": self.store,
+                    "alert_uuid": f"alert-{Alert.objects.count()}",
+                    "label": "normal",
+                    "time_spotted": 1234567890.0 + i,
+                }
+            )
+
+    def test_admitted_without_overload(self):
+        self.queue_alerts(1)
+        self.assertIsNone(self.admission.get_overload())
+        self.assertTrue(self.admission.admit("standard"))
+
+    def test_outbox_depth_is_counted_once_per_interval(self):
+        self.assertEqual(self.admission.get_outbox_depth(), 0)
+        self.queue_alerts(2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.admission.get_outbox_depth(), 0)
+        self.now = 1.0
+        self.assertEqual(self.admission.get_outbox_depth(), 2)
+
+    def test_standard_alerts_are_shed_on_outbox_depth(self):
+        self.queue_alerts(2)
+        self.assertEqual(self.admission.get_overload(), "outbox_depth")
+        self.assertFalse(self.admission.admit("standard"))
+        self.assertTrue(self.admission.admit("critical"))
+        self.assertEqual(ALERTS_SHED.get(reason="outbox_depth", severity="standard"), 1)
+
+    def test_standard_alerts_are_shed_on_in_flight(self):
+        @self.admission.track
+        def post():
+            return self.admission.admit("standard"), self.admission.admit("critical")
+
+        self.admission._add_in_flight(2)
+        self.assertEqual(post(), (False, True))
+        self.admission._add_in_flight(-2)
+        self.assertEqual(self.admission.in_flight, 0)
+        self.assertEqual(ALERTS_SHED.get(reason="in_flight", severity="standard"), 1)
+
+    def test_disabled_thresholds(self):
+        self.admission.max_in_flight = 0
+        self.admission.max_outbox_depth = 0
+        self.queue_alerts(2)
+        self.admission._add_in_flight(10)
+        self.addCleanup(self.admission._add_in_flight, -10)
+        self.assertTrue(self.admission.admit("standard"))
+
+
+class AdmissionWebhookTestCase(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=user, store=self.store, alert_preference="both", notification_channel="api"
+        )
+        # The outbox is over its maximum depth
+        patcher = mock.patch.object(webhook_admission, "max_outbox_depth", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(webhook_admission.clear)
+        self.addCleanup(recent_alerts.clear)
+        for i in range(2):
+            queue_alert(self.alert_data(f"queued-{i}", "normal"))
+        webhook_admission.clear()
+
+    def alert_data(self, alert_uuid, label):
+        return {
+            "url": "http://example.com/alert",
+            "location": self.store,
+            "alert_uuid": alert_uuid,
+            "label": label,
+            "time_spotted": 1234567890.0,
+        }
+
+    def post_data(self, alert_uuid, label):
+        return {**self.alert_data(alert_uuid, label), "location": "test-store"}
+
+    def test_standard_alert_is_rejected(self):
+        response = self.client.post(
+            reverse("alert-webhook"), self.post_data("normal-alert", "normal"), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], str(webhook_admission.retry_after))
+        self.assertFalse(Alert.objects.filter(alert_uuid="normal-alert").exists())
+
+    def test_critical_alert_is_accepted(self):
+        response = self.client.post(
+            reverse("alert-webhook"), self.post_data("theft-alert", "theft"), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_batch_sheds_standard_alerts(self):
+        data = [self.post_data("normal-alert", "normal"), self.post_data("theft-alert", "theft")]
+        response = self.client.post(reverse("alert-webhook-batch"), data, content_type="application/json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn("Retry-After", response)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["status"], "shed")
+        self.assertEqual(results[1]["status"], "queued")
+        self.assertFalse(Alert.objects.filter(alert_uuid="normal-alert").exists())
+
+    def test_batch_all_shed(self):
+        data = [self.post_data("normal-alert", "normal")]
+        response = self.client.post(reverse("alert-webhook-batch"), data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -1,12 +1,22 @@
-from django.test import TestCase
+import asyncio
+import json
+import socket
+import time
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
 from unittest.mock import MagicMock
 
+from urllib3.exceptions import MaxRetryError
+
 from alerts.models.alert import Alert
 from alerts.models.store import Store
 from alerts.models.user import User
 
 from alerts.channels.api_channel import APIChannel
 from alerts.channels.base_channel import ChannelResult
+from alerts.channels.circuit_breaker import CircuitBreaker
+from alerts.channels.rate_limiter import TokenBucketRateLimiter
 
 
 class UserModelTestCase(TestCase):
@@ -49,6 +59,35 @@ class UserModelTestCase(TestCase):
         self.assertIsInstance(response, ChannelResult)
         self.assertTrue(response.success)
 
+    def test_send_digest(self):
+        self.api_channel.http.request.return_value = MagicMock(status=200, data=b'{"success": true}')
+        other_alert = Alert.objects.create(
+            url="http://example.com/alert",
+            location=self.store,
+            alert_uuid="other-alert-uuid",
+            label="Test Alert",
+            time_spotted=2222.22,
+        )
+
+        response = self.api_channel.send_digest(self.user, [self.alert, other_alert])
+        self.assertTrue(response.success)
+        self.api_channel.http.request.assert_called_once()
+        payload = self.api_channel.http.request.call_args.kwargs["json"]
+        self.assertEqual(payload["alert_uuid"], "test-alert-uuid")
+        self.assertEqual(payload["target_user_id"], "test_api_uid")
+        self.assertEqual(
+            payload["alerts"],
+            [
+                {"url": "", "alert_uuid": "test-alert-uuid", "label": "Test Alert", "time_spotted": 1111.11},
+                {
+                    "url": "http://example.com/alert",
+                    "alert_uuid": "other-alert-uuid",
+                    "label": "Test Alert",
+                    "time_spotted": 2222.22,
+                },
+            ],
+        )
+
     def test_send_notification_none_user(self):
         invalid_user = None
         response = self.api_channel.send_alert(invalid_user, self.alert)
@@ -85,3 +124,169 @@ class UserModelTestCase(TestCase):
         self.assertIsInstance(response, ChannelResult)
         self.assertFalse(response.success)
         self.assertEqual(response.info, "Invalid parameters for alert")
+
+    def test_async_send_notification_success(self):
+        self.api_channel.http.request.return_value = MagicMock(
+            status=200, data=b'{"success": true}'
+        )
+
+        response = async_to_sync(self.api_channel.asend_alert)(self.user, self.alert)
+        self.api_channel.http.request.assert_called_once()
+        self.assertIsInstance(response, ChannelResult)
+        self.assertTrue(response.success)
+
+    @override_settings(ALERTS_ASYNC_CONCURRENCY=20)
+    def test_async_sends_are_concurrent_up_to_the_async_concurrency(self):
+        api_channel = APIChannel()
+        self.assertEqual(api_channel.max_connections, 20)
+
+        def slow_request(*args, **kwargs):
+            time.sleep(0.2)
+            return MagicMock(status=200, data=b'{"success": true}')
+
+        api_channel.http = MagicMock()
+        api_channel.http.request.side_effect = slow_request
+        users = [User(email=f"user{i}@test.com", api_uid=f"uid{i}") for i in range(20)]
+
+        async def send_all():
+            return await asyncio.gather(*(api_channel.asend_alert(user, self.alert) for user in users))
+
+        # All the subscribers are notified in about one round trip to the API
+        start = time.monotonic()
+        results = async_to_sync(send_all)()
+        self.assertLess(time.monotonic() - start, 0.35)
+        self.assertTrue(all(result.success for result in results))
+
+    def test_async_send_notification_none_user(self):
+        response = async_to_sync(self.api_channel.asend_alert)(None, self.alert)
+        self.assertFalse(response.success)
+        self.assertEqual(response.info, "Invalid user")
+        self.api_channel.http.request.assert_not_called()
+
+    def test_circuit_opens_when_api_is_down(self):
+        self.api_channel.http.request.side_effect = MaxRetryError(None, self.api_channel.api_hook_url)
+        breaker = self.api_channel._get_breaker(self.api_channel.api_hook_url)
+
+        for _ in range(breaker.minimum_calls):
+            response = self.api_channel.send_alert(self.user, self.alert)
+            self.assertFalse(response.success)
+            self.assertFalse(response.deferred)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # While the circuit is open, the API is not called anymore and the alert is deferred
+        self.api_channel.http.request.reset_mock()
+        response = self.api_channel.send_alert(self.user, self.alert)
+        self.assertFalse(response.success)
+        self.assertTrue(response.deferred)
+        self.api_channel.http.request.assert_not_called()
+
+    def test_unreachable_api_fails_fast(self):
+        # A port nobody listens on, the calls are not retried with a backoff in the worker
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            port = unused.getsockname()[1]
+        api_channel = APIChannel()
+        api_channel.api_hook_url = f"http://127.0.0.1:{port}/webhook/notifications"
+
+        start = time.monotonic()
+        response = api_channel.send_alert(self.user, self.alert)
+        self.assertFalse(response.success)
+        self.assertLess(time.monotonic() - start, 1)
+        # Neither are the errors of the API
+        self.assertFalse(api_channel.retries.is_retry("POST", 503))
+
+    def test_over_quota_is_deferred(self):
+        self.api_channel.http.request.return_value = MagicMock(
+            status=429, data=b"", headers={"Retry-After": "30"}
+        )
+        response = self.api_channel.send_alert(self.user, self.alert)
+        self.assertFalse(response.success)
+        self.assertTrue(response.deferred)
+        self.assertEqual(response.retry_after, 30)
+        # Being over quota does not open the circuit
+        breaker = self.api_channel._get_breaker(self.api_channel.api_hook_url)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_rate_limiter_defers_without_calling_api(self):
+        self.api_channel.rate_limiter = TokenBucketRateLimiter(rate=1, burst=1, max_wait=0)
+        self.api_channel.http.request.return_value = MagicMock(status=200, data=b"{}")
+
+        self.assertTrue(self.api_channel.send_alert(self.user, self.alert).success)
+        response = self.api_channel.send_alert(self.user, self.alert)
+        self.assertTrue(response.deferred)
+        self.assertGreater(response.retry_after, 0)
+        self.api_channel.http.request.assert_called_once()
+
+
+class APIChannelBatchTestCase(TestCase):
+    def setUp(self):
+        self.api_channel = APIChannel()
+        self.api_channel.batch_enabled = True
+        self.api_channel.http = MagicMock()
+        self.store = Store.objects.create(location="test-location", name="Test Store")
+        self.alert = Alert.objects.create(
+            location=self.store,
+            alert_uuid="test-alert-uuid",
+            label="theft",
+            time_spotted=1111.11,
+        )
+        self.users = [
+            User.objects.create(email=f"user{i}@test.com", api_uid=f"uid{i}") for i in range(3)
+        ]
+
+    def mock_api(self, batch_supported=True, results=None):
+        def request(method, url, **kwargs):
+            if url == self.api_channel.api_capabilities_url:
+                if not batch_supported:
+                    return MagicMock(status=404, data=b"")
+                return MagicMock(status=200, data=b'{"batch": true}')
+            if url == self.api_channel.api_batch_hook_url:
+                return MagicMock(status=200, data=json.dumps({"results": results}).encode())
+            return MagicMock(status=200, data=b'{"success": true}')
+
+        self.api_channel.http.request.side_effect = request
+
+    def test_send_batch(self):
+        self.mock_api(
+            results={
+                "uid0": {"success": True},
+                "uid1": {"success": False, "info": "Unknown device"},
+            }
+        )
+
+        results = self.api_channel.send_alert_batch(self.users, self.alert)
+
+        self.assertEqual([result.success for result in results], [True, False, False])
+        self.assertIn("Unknown device", results[1].info)
+        self.assertIn("No result", results[2].info)
+        posts = [c for c in self.api_channel.http.request.call_args_list if c.args[0] == "POST"]
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(posts[0].args[1], self.api_channel.api_batch_hook_url)
+        self.assertEqual(posts[0].kwargs["json"]["target_user_ids"], ["uid0", "uid1", "uid2"])
+
+    def test_send_batch_skips_invalid_users(self):
+        self.mock_api(results={"uid0": {"success": True}, "uid2": {"success": True}})
+        self.users[1].api_uid = None
+
+        results = self.api_channel.send_alert_batch(self.users, self.alert)
+
+        self.assertEqual([result.success for result in results], [True, False, True])
+        self.assertEqual(results[1].info, "User does not have an API UID")
+
+    def test_fallback_when_batch_not_advertised(self):
+        self.mock_api(batch_supported=False)
+
+        results = self.api_channel.send_alert_batch(self.users, self.alert)
+
+        self.assertTrue(all(result.success for result in results))
+        posts = [c for c in self.api_channel.http.request.call_args_list if c.args[0] == "POST"]
+        self.assertEqual([c.args[1] for c in posts], [self.api_channel.api_hook_url] * 3)
+
+    def test_batch_disabled(self):
+        self.api_channel.batch_enabled = False
+        self.mock_api()
+
+        self.api_channel.send_alert_batch(self.users, self.alert)
+
+        urls = [c.args[1] for c in self.api_channel.http.request.call_args_list]
+        self.assertEqual(urls, [self.api_channel.api_hook_url] * 3)
@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase, TestCase
+
+from alerts.benchmark import percentile, run_benchmark
+from alerts.models.sent_notification import SentNotification
+from alerts.receiver import FaultProfile
+
+
+class PercentileTestCase(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class BenchmarkTestCase(TestCase):
+    def test_run_benchmark(self):
+        results = run_benchmark(stores=2, subscribers_per_store=3, alerts=4, concurrency=1)
+
+        self.assertEqual(results["webhook"]["status_codes"], {"202": 4})
+        self.assertGreater(results["webhook"]["queries_per_alert"], 0)
+        self.assertEqual(results["dispatch"]["sent"], 12)
+        self.assertEqual(results["dispatch"]["outbound_requests_per_alert"], 3)
+        self.assertEqual(SentNotification.objects.filter(status="sent").count(), 12)
+
+    def test_run_benchmark_rules(self):
+        results = run_benchmark(stores=2, subscribers_per_store=1, alerts=4, concurrency=1, rules_per_store=6)
+
+        self.assertEqual(results["classification"]["rules"], 12)
+        self.assertGreater(results["classification"]["mean_us"], 0)
+        self.assertEqual(results["webhook"]["status_codes"], {"202": 4})
+
+    def test_run_benchmark_batch(self):
+        results = run_benchmark(stores=2, subscribers_per_store=3, alerts=4, concurrency=1, batch=True)
+
+        self.assertEqual(results["dispatch"]["sent"], 12)
+        self.assertEqual(results["dispatch"]["outbound_requests_per_alert"], 1)
+
+    def test_run_benchmark_receiver_errors(self):
+        results = run_benchmark(
+            stores=1, subscribers_per_store=2, alerts=2, concurrency=1, profile=FaultProfile(error_rate=1)
+        )
+
+        self.assertEqual(results["dispatch"]["sent"], 0)
+        self.assertEqual(results["dispatch"]["receiver_outcomes"], {"error": 4})
+        self.assertEqual(SentNotification.objects.filter(status="failed").count(), 4)
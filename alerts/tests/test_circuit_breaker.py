@@ -0,0 +1,68 @@
+from django.test import SimpleTestCase
+
+from alerts.channels.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_rate_threshold=0.5,
+            slow_call_rate_threshold=0.5,
+            slow_call_duration=1.0,
+            window_size=4,
+            minimum_calls=4,
+            open_duration=10,
+            clock=self.clock,
+        )
+
+    def test_opens_on_failure_rate(self):
+        self.breaker.record_success()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_opens_on_slow_call_rate(self):
+        for _ in range(2):
+            self.breaker.record_success(duration=0.1)
+        for _ in range(2):
+            self.breaker.record_success(duration=2.0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_waits_for_minimum_calls(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_success_closes(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        # Only one probe at a time
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_half_open_probe_failure_reopens(self):
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now = 15
+        self.assertFalse(self.breaker.allow_request())
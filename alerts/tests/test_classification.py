@@ -0,0 +1,158 @@
+from datetime import datetime, time, timezone
+from unittest import mock
+
+from django.test import TestCase
+
+from alerts.alerts import ALERT_CLASSIFICATION, classification_index
+from alerts.classification import CLASSIFICATION_CACHE_NAME, ClassificationIndex
+from alerts.models.cache_version import CacheVersion
+from alerts.models.classification_rule import ClassificationRule
+from alerts.models.store import Store
+from alerts.serializers import AlertSerializer
+
+
+def timestamp(hour: int, minute: int = 0) -> float:
+    return datetime(2025, 1, 1, hour, minute, tzinfo=timezone.utc).timestamp()
+
+
+class ClassificationIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = ClassificationIndex(ALERT_CLASSIFICATION)
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        self.other_store = Store.objects.create(location="other-store", name="Other Store")
+
+    def test_default_classification(self):
+        self.assertEqual(self.index.classify("theft"), "critical")
+        self.assertEqual(self.index.classify("Suspicious", "test-store", timestamp(12)), "standard")
+        self.assertEqual(self.index.classify("unknown"), "standard")
+
+    def test_rule_for_all_stores(self):
+        ClassificationRule.objects.create(label="normal", severity="critical")
+        self.assertEqual(self.index.classify("normal"), "critical")
+        self.assertEqual(self.index.classify("normal", "test-store"), "critical")
+
+    def test_store_rule(self):
+        ClassificationRule.objects.create(label="theft", severity="critical")
+        ClassificationRule.objects.create(store=self.store, label="theft", severity="standard")
+        self.assertEqual(self.index.classify("theft", "test-store"), "standard")
+        self.assertEqual(self.index.classify("theft", "other-store"), "critical")
+
+    def test_time_of_day_rule(self):
+        # Suspicious counts as critical after closing hours, wrapping around midnight
+        ClassificationRule.objects.create(
+            store=self.store, label="suspicious", severity="critical", start_time=time(21), end_time=time(7)
+        )
+        self.assertEqual(self.index.classify("suspicious", "test-store", timestamp(20, 59)), "standard")
+        self.assertEqual(self.index.classify("suspicious", "test-store", timestamp(21)), "critical")
+        self.assertEqual(self.index.classify("suspicious", "test-store", timestamp(3)), "critical")
+        self.assertEqual(self.index.classify("suspicious", "test-store", timestamp(7)), "standard")
+        self.assertEqual(self.index.classify("suspicious", "other-store", timestamp(3)), "standard")
+
+    def test_time_of_day_rule_over_store_rule(self):
+        ClassificationRule.objects.create(
+            store=self.store, label="normal", severity="standard", start_time=time(9), end_time=time(18)
+        )
+        ClassificationRule.objects.create(store=self.store, label="normal", severity="critical")
+        self.assertEqual(self.index.classify("normal", "test-store", timestamp(12)), "standard")
+        self.assertEqual(self.index.classify("normal", "test-store", timestamp(20)), "critical")
+
+    def test_time_zone(self):
+        ClassificationRule.objects.create(label="normal", severity="critical", start_time=time(9), end_time=time(10))
+        with self.settings(ALERTS_CLASSIFICATION_TIME_ZONE="Europe/Paris"):
+            index = ClassificationIndex(ALERT_CLASSIFICATION)
+            self.assertEqual(index.classify("normal", time_spotted=timestamp(8, 30)), "critical")
+            self.assertEqual(index.classify("normal", time_spotted=timestamp(9, 30)), "standard")
+
+    def test_new_label(self):
+        self.assertNotIn("fire", self.index.get_labels())
+        ClassificationRule.objects.create(store=self.store, label="Fire", severity="critical")
+        with self.settings(ALERTS_CLASSIFICATION_REFRESH_INTERVAL=0):
+            self.assertIn("fire", self.index.get_labels())
+            self.assertEqual(self.index.classify("fire", "test-store"), "critical")
+
+    def test_lookup_does_not_query(self):
+        for hour in range(24):
+            ClassificationRule.objects.create(
+                store=self.store, label="suspicious", severity="critical", start_time=time(hour), end_time=time(hour)
+            )
+        with self.settings(ALERTS_CLASSIFICATION_REFRESH_INTERVAL=60):
+            self.index.classify("suspicious", "test-store")
+            with self.assertNumQueries(0):
+                for hour in range(24):
+                    self.index.classify("suspicious", "test-store", timestamp(hour))
+
+    def test_store_change_recompiles_the_store(self):
+        ClassificationRule.objects.create(store=self.store, label="normal", severity="critical")
+        ClassificationRule.objects.create(store=self.other_store, label="normal", severity="critical")
+        self.index.classify("normal", "test-store")
+        other_table = self.index._compiled.stores["other-store"]
+
+        # As done by the signal handlers, for the shared index
+        ClassificationRule.objects.bulk_create(
+            [ClassificationRule(store=self.store, label="theft", severity="standard")]
+        )
+        self.index.invalidate("test-store")
+        CacheVersion.bump(CLASSIFICATION_CACHE_NAME)
+
+        self.assertEqual(self.index.classify("theft", "test-store"), "standard")
+        self.assertIs(self.index._compiled.stores["other-store"], other_table)
+
+    def test_refresh_when_version_changes(self):
+        self.assertEqual(self.index.classify("normal"), "standard")
+        with self.settings(ALERTS_CLASSIFICATION_REFRESH_INTERVAL=0):
+            # Simulate a change made by another process
+            ClassificationRule.objects.bulk_create([ClassificationRule(label="normal", severity="critical")])
+            CacheVersion.bump(CLASSIFICATION_CACHE_NAME)
+            self.assertEqual(self.index.classify("normal"), "critical")
+
+
+class ClassificationSignalsTestCase(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+
+    def test_rule_changes_are_applied(self):
+        rule = ClassificationRule.objects.create(store=self.store, label="normal", severity="critical")
+        self.assertEqual(classification_index.classify("normal", "test-store"), "critical")
+
+        rule.store = None
+        rule.save()
+        self.assertEqual(classification_index.classify("normal", "test-store"), "critical")
+        self.assertEqual(classification_index.classify("normal", "other-store"), "critical")
+
+        rule.delete()
+        self.assertEqual(classification_index.classify("normal", "test-store"), "standard")
+
+    def test_rule_update_recompiles_its_stores(self):
+        other_store = Store.objects.create(location="other-store", name="Other Store")
+        rule = ClassificationRule.objects.create(store=self.store, label="theft", severity="standard")
+        ClassificationRule.objects.create(store=other_store, label="normal", severity="critical")
+        self.assertEqual(classification_index.classify("theft", "test-store"), "standard")
+
+        with mock.patch.object(classification_index, "_compile", wraps=classification_index._compile) as mock_compile:
+            rule.label = "suspicious"
+            rule.severity = "critical"
+            rule.save()
+            self.assertEqual(classification_index.classify("theft", "test-store"), "critical")
+            self.assertEqual(classification_index.classify("suspicious", "test-store"), "critical")
+
+            # The rule moved to another store does not apply to its previous store anymore
+            rule.store = other_store
+            rule.save()
+            self.assertEqual(classification_index.classify("suspicious", "other-store"), "critical")
+            self.assertEqual(classification_index.classify("suspicious", "test-store"), "standard")
+        mock_compile.assert_not_called()
+
+    def test_serializer_accepts_rule_labels(self):
+        alert_data = {
+            "url": "http://example.com/alert",
+            "location": "test-store",
+            "alert_uuid": "test-alert-uuid",
+            "label": "fire",
+            "time_spotted": 1234567890.0,
+        }
+        serializer = AlertSerializer(data=alert_data)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors["label"], ['"fire" is not a valid choice.'])
+
+        ClassificationRule.objects.create(label="fire", severity="critical")
+        self.assertTrue(AlertSerializer(data=alert_data).is_valid())
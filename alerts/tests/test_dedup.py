@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from alerts.dedup import RecentAlertCache
+
+
+class RecentAlertCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = RecentAlertCache(max_size=2, ttl=10, clock=lambda: self.now)
+
+    def test_contains(self):
+        self.cache.add("uuid-1")
+        self.assertIn("uuid-1", self.cache)
+        self.assertNotIn("uuid-2", self.cache)
+        self.assertNotIn(None, self.cache)
+
+    def test_expires_after_ttl(self):
+        self.cache.add("uuid-1")
+        self.now = 11
+        self.assertNotIn("uuid-1", self.cache)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.add("uuid-1")
+        self.cache.add("uuid-2")
+        # uuid-1 becomes the most recently used
+        self.assertIn("uuid-1", self.cache)
+        self.cache.add("uuid-3")
+        self.assertIn("uuid-1", self.cache)
+        self.assertNotIn("uuid-2", self.cache)
+        self.assertIn("uuid-3", self.cache)
@@ -0,0 +1,711 @@
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from alerts.channels.base_channel import ChannelResult
+from alerts.dedup import DuplicateAlertError, recent_alerts
+from alerts.dispatch import (
+    claim_due_retries,
+    claim_pending_notifications,
+    dispatch_pending,
+    get_lane_priority,
+    get_outcome,
+    get_retry_delay,
+    get_shard_key,
+    queue_alert,
+    queue_alerts,
+    replay_deferred_notifications,
+    save_results,
+    send_notification_ids,
+    split_notification_ids,
+)
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.workers import init_process_worker, run_shard
+
+
+class DispatchTestCase(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        self.user = User.objects.create(
+            email="test@user.com", phone="1234567890", api_uid="test_api_uid"
+        )
+        UserAlertSubscripion.objects.create(
+            user=self.user,
+            store=self.store,
+            alert_preference="both",
+            notification_channel="api",
+        )
+        self.alert_data = {
+            "url": "http://example.com/alert",
+            "location": self.store,
+            "alert_uuid": "test-alert-uuid",
+            "label": "theft",
+            "time_spotted": 1234567890.0,
+        }
+
+    def test_queue_alert_creates_pending_notifications(self):
+        alert, sent_notifications = queue_alert(self.alert_data)
+        self.assertTrue(Alert.objects.filter(pk=alert.pk).exists())
+        self.assertEqual(len(sent_notifications), 1)
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "pending")
+        self.assertFalse(notification.sent)
+
+    def test_claim_is_exclusive(self):
+        queue_alert(self.alert_data)
+        first_claim = claim_pending_notifications(10)
+        self.assertEqual(len(first_claim), 1)
+        # Already claimed notifications can not be claimed by another worker
+        self.assertEqual(claim_pending_notifications(10), [])
+        self.assertEqual(SentNotification.objects.get().status, "processing")
+
+    def test_stale_claim_is_reclaimed(self):
+        queue_alert(self.alert_data)
+        claim_pending_notifications(10)
+        SentNotification.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(len(claim_pending_notifications(10)), 1)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_reclaimed_notification_is_left_to_its_new_worker(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        queue_alert(self.alert_data)
+        stale_claim = claim_pending_notifications(10)
+        SentNotification.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        claim = claim_pending_notifications(10)
+        outcomes = send_notification_ids(claim, claim.claim_token)
+
+        # The worker whose claim went stale neither sends the notification nor overwrites its outcome
+        self.assertEqual(send_notification_ids(stale_claim, stale_claim.claim_token), [])
+        stale_outcome = get_outcome(SentNotification.objects.get(), ChannelResult(success=False, info="Timeout"))
+        save_results([stale_outcome], stale_claim.claim_token)
+        self.assertEqual(SentNotification.objects.get().status, "processing")
+
+        self.assertEqual(save_results(outcomes, claim.claim_token), 1)
+        self.assertEqual(SentNotification.objects.get().status, "sent")
+        self.assertEqual(mock_send_alert.call_count, 1)
+
+    def test_queue_duplicate_alert(self):
+        queue_alert(self.alert_data)
+        with self.assertRaises(DuplicateAlertError):
+            queue_alert(self.alert_data)
+        self.assertEqual(SentNotification.objects.count(), 1)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_pending(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        queue_alert(self.alert_data)
+        self.assertEqual(dispatch_pending(), 1)
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "sent")
+        self.assertTrue(notification.sent)
+        # Nothing is left to send
+        self.assertEqual(dispatch_pending(), 0)
+        mock_send_alert.assert_called_once()
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_pending_failure(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=False, info="API down")
+        queue_alert(self.alert_data)
+        self.assertEqual(dispatch_pending(), 0)
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "failed")
+        self.assertFalse(notification.sent)
+        self.assertEqual(notification.last_error, "API down")
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_pending_deferred(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=False, info="Circuit open", deferred=True)
+        queue_alert(self.alert_data)
+        dispatch_pending()
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "deferred")
+        self.assertEqual(notification.last_error, "Circuit open")
+
+        # Deferred notifications are sent again once replayed
+        self.assertEqual(replay_deferred_notifications(), 1)
+        mock_send_alert.return_value = ChannelResult(success=True)
+        self.assertEqual(dispatch_pending(), 1)
+        self.assertEqual(SentNotification.objects.get().status, "sent")
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_pending_writes_outcomes_in_bulk(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        for i in range(5):
+            user = User.objects.create(email=f"user{i}@user.com", api_uid=f"uid{i}")
+            UserAlertSubscripion.objects.create(
+                user=user, store=self.store, alert_preference="both", notification_channel="api"
+            )
+        queue_alert(self.alert_data)
+
+        # Claim (3 queries), load the notifications, write the outcomes, and a last empty claim
+        with self.assertNumQueries(6):
+            self.assertEqual(dispatch_pending(), 6)
+        self.assertEqual(SentNotification.objects.filter(status="sent").count(), 6)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_pending_writes_mixed_outcomes_at_once(self, mock_send_alert):
+        mock_send_alert.side_effect = [
+            ChannelResult(success=True),
+            ChannelResult(success=False, info="API down"),
+            ChannelResult(success=False, info="Circuit open", deferred=True),
+        ]
+        for i in range(2):
+            user = User.objects.create(email=f"user{i}@user.com", api_uid=f"uid{i}")
+            UserAlertSubscripion.objects.create(
+                user=user, store=self.store, alert_preference="both", notification_channel="api"
+            )
+        queue_alert(self.alert_data)
+
+        # The attempts are counted from the claimed notifications, without reading them again
+        with self.assertNumQueries(6):
+            self.assertEqual(dispatch_pending(), 1)
+        self.assertEqual(
+            sorted(SentNotification.objects.values_list("status", "attempts")),
+            [("deferred", 0), ("failed", 1), ("sent", 1)],
+        )
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert_batch")
+    def test_dispatch_pending_sends_alert_once_per_channel(self, mock_send_alert_batch):
+        mock_send_alert_batch.return_value = [
+            ChannelResult(success=False, info="Unknown device"),
+            ChannelResult(success=True),
+        ]
+        other_user = User.objects.create(email="other@user.com", api_uid="other_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=other_user, store=self.store, alert_preference="both", notification_channel="api"
+        )
+        queue_alert(self.alert_data)
+
+        self.assertEqual(dispatch_pending(), 1)
+
+        mock_send_alert_batch.assert_called_once()
+        users, alert = mock_send_alert_batch.call_args.args
+        self.assertEqual([user.email for user in users], ["test@user.com", "other@user.com"])
+        failed = SentNotification.objects.get(user=self.user)
+        self.assertEqual(failed.status, "failed")
+        self.assertEqual(failed.last_error, "Unknown device")
+        self.assertEqual(SentNotification.objects.get(user=other_user).status, "sent")
+
+
+class DigestTestCase(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        self.user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        self.subscription = UserAlertSubscripion.objects.create(
+            user=self.user,
+            store=self.store,
+            alert_preference="both",
+            notification_channel="api",
+            aggregation_window=60,
+        )
+
+    def alert_data(self, index: int, label: str = "suspicious") -> dict:
+        return {
+            "url": f"http://example.com/alert/{index}",
+            "location": self.store,
+            "alert_uuid": f"test-alert-uuid-{index}",
+            "label": label,
+            "time_spotted": 1234567890.0 + index,
+        }
+
+    def make_due(self):
+        due = timezone.now() - timedelta(seconds=1)
+        SentNotification.objects.filter(status="held").update(next_attempt_at=due, digest_until=due)
+
+    def test_alerts_are_held_in_the_same_window(self):
+        for index in range(3):
+            queue_alert(self.alert_data(index))
+
+        notifications = SentNotification.objects.all()
+        self.assertEqual({notification.status for notification in notifications}, {"held"})
+        self.assertEqual(len({notification.digest_until for notification in notifications}), 1)
+        # The window is not over yet
+        self.assertEqual(claim_pending_notifications(10), [])
+
+    def test_batch_alerts_are_held_in_the_same_window(self):
+        queue_alerts([self.alert_data(index) for index in range(3)])
+        queue_alert(self.alert_data(3))
+
+        notifications = SentNotification.objects.all()
+        self.assertEqual({notification.status for notification in notifications}, {"held"})
+        self.assertEqual(len({notification.digest_until for notification in notifications}), 1)
+
+    def test_first_critical_alert_bypasses_the_window(self):
+        queue_alert(self.alert_data(0, label="theft"))
+        queue_alert(self.alert_data(1, label="theft"))
+        queue_alert(self.alert_data(2, label="theft"))
+
+        statuses = list(SentNotification.objects.order_by("id").values_list("status", flat=True))
+        self.assertEqual(statuses, ["pending", "held", "held"])
+
+    def test_severities_are_held_separately(self):
+        queue_alert(self.alert_data(0))
+        queue_alert(self.alert_data(1, label="theft"))
+        self.assertEqual(
+            list(SentNotification.objects.order_by("id").values_list("status", flat=True)), ["held", "pending"]
+        )
+
+    def test_no_window(self):
+        self.subscription.aggregation_window = 0
+        self.subscription.save()
+        queue_alert(self.alert_data(0))
+        queue_alert(self.alert_data(1))
+        self.assertEqual(SentNotification.objects.filter(status="pending").count(), 2)
+
+    def test_closed_window_opens_a_new_one(self):
+        queue_alert(self.alert_data(0))
+        self.make_due()
+        queue_alert(self.alert_data(1))
+        self.assertEqual(len(set(SentNotification.objects.values_list("digest_until", flat=True))), 2)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_digest")
+    def test_dispatch_sends_one_digest(self, mock_send_digest):
+        mock_send_digest.return_value = ChannelResult(success=True)
+        for index in (2, 0, 1):
+            queue_alert(self.alert_data(index))
+        self.make_due()
+
+        self.assertEqual(dispatch_pending(), 3)
+        mock_send_digest.assert_called_once()
+        user, alerts = mock_send_digest.call_args.args
+        self.assertEqual(user, self.user)
+        # The alerts are listed in the order they were spotted
+        self.assertEqual([alert.alert_uuid for alert in alerts], [f"test-alert-uuid-{i}" for i in range(3)])
+        self.assertEqual(SentNotification.objects.filter(status="sent").count(), 3)
+
+    def test_windows_are_claimed_whole(self):
+        other_user = User.objects.create(email="other@user.com", api_uid="other_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=other_user, store=self.store, alert_preference="both", notification_channel="api", aggregation_window=60
+        )
+        for index in range(3):
+            queue_alert(self.alert_data(index))
+        self.make_due()
+
+        # The ids of the two windows are interleaved, the first two ids are enough to claim both windows
+        claimed = claim_pending_notifications(2)
+        self.assertEqual(len(claimed), 6)
+        chunks = split_notification_ids(claimed, 2)
+        self.assertEqual(
+            [set(SentNotification.objects.filter(id__in=chunk).values_list("user_id", flat=True)) for chunk in chunks],
+            [{self.user.pk}, {other_user.pk}],
+        )
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_single_held_alert(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        queue_alert(self.alert_data(0))
+        self.make_due()
+
+        self.assertEqual(dispatch_pending(), 1)
+        mock_send_alert.assert_called_once()
+
+
+class ShardedDispatchTestCase(TestCase):
+    def setUp(self):
+        self.locations = [f"store-{i}" for i in range(6)]
+        for location in self.locations:
+            store = Store.objects.create(location=location, name=location)
+            user = User.objects.create(email=f"{location}@user.com", api_uid=f"{location}-uid")
+            UserAlertSubscripion.objects.create(
+                user=user, store=store, alert_preference="both", notification_channel="api"
+            )
+            for i in range(2):
+                queue_alert(
+                    {
+                        "url": "http://example.com/alert",
+                        "location": store,
+                        "alert_uuid": f"{location}-alert-{i}",
+                        "label": "theft",
+                        "time_spotted": 1234567890.0 + i,
+                    }
+                )
+
+    def test_shard_key_is_the_hash_of_the_store(self):
+        for notification in SentNotification.objects.select_related("alert"):
+            self.assertEqual(notification.shard_key, get_shard_key(notification.alert.location_id))
+
+    def test_shards_split_the_stores(self):
+        claimed = {}
+        for shard in range(3):
+            for notification_id in claim_pending_notifications(100, shard=shard, shards=3):
+                claimed[notification_id] = shard
+
+        self.assertEqual(len(claimed), SentNotification.objects.count())
+        # All the notifications of a store are claimed by the shard of the store
+        for notification in SentNotification.objects.select_related("alert"):
+            self.assertEqual(claimed[notification.id], get_shard_key(notification.alert.location_id) % 3)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_shard_in_order(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        shard = get_shard_key("store-0") % 2
+        sent = dispatch_pending(batch_size=1, shard=shard, shards=2)
+
+        sent_alerts = [call.args[1] for call in mock_send_alert.call_args_list]
+        self.assertEqual(sent, len(sent_alerts))
+        self.assertTrue(all(get_shard_key(alert.location_id) % 2 == shard for alert in sent_alerts))
+        store_alerts = [alert.alert_uuid for alert in sent_alerts if alert.location_id == "store-0"]
+        self.assertEqual(store_alerts, ["store-0-alert-0", "store-0-alert-1"])
+        self.assertEqual(SentNotification.objects.filter(status="pending").count(), 12 - sent)
+
+    @mock.patch("alerts.workers._stop", None)
+    def test_worker_process_stops_on_sigterm(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        stop = threading.Event()
+        init_process_worker(stop)
+
+        # A SIGTERM sent to the worker process stops its shard once the current batch is saved
+        signal.raise_signal(signal.SIGTERM)
+        self.assertTrue(stop.is_set())
+        self.assertEqual(run_shard(0, 1, batch_size=100, poll_interval=0, once=False), 0)
+        self.assertEqual(SentNotification.objects.filter(status="pending").count(), 12)
+
+
+class PriorityLaneTestCase(TestCase):
+    def setUp(self):
+        store = Store.objects.create(location="test-store", name="Test Store")
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=user, store=store, alert_preference="both", notification_channel="api"
+        )
+        # A storm of standard alerts, followed by a critical one
+        for i, label in enumerate(["normal", "suspicious", "normal", "theft"]):
+            queue_alert(
+                {
+                    "url": "http://example.com/alert",
+                    "location": store,
+                    "alert_uuid": f"alert-{i}",
+                    "label": label,
+                    "time_spotted": 1234567890.0 + i,
+                }
+            )
+
+    def test_priority_is_the_lane_of_the_severity(self):
+        for notification in SentNotification.objects.select_related("alert"):
+            severity = "critical" if notification.alert.label == "theft" else "standard"
+            self.assertEqual(notification.priority, get_lane_priority(severity))
+        self.assertEqual(get_lane_priority("unknown"), get_lane_priority("standard"))
+
+    def test_critical_notifications_are_claimed_first(self):
+        claimed = SentNotification.objects.get(id=claim_pending_notifications(1)[0])
+        self.assertEqual(claimed.alert.alert_uuid, "alert-3")
+        claimed = SentNotification.objects.get(id=claim_pending_notifications(1)[0])
+        self.assertEqual(claimed.alert.alert_uuid, "alert-0")
+
+    def test_claim_lane(self):
+        self.assertEqual(len(claim_pending_notifications(10, lane="critical")), 1)
+        self.assertEqual(claim_pending_notifications(10, lane="critical"), [])
+        self.assertEqual(len(claim_pending_notifications(10, lane="standard")), 3)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dispatch_critical_first(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        dispatch_pending(batch_size=1)
+        sent_alerts = [call.args[1].alert_uuid for call in mock_send_alert.call_args_list]
+        self.assertEqual(sent_alerts, ["alert-3", "alert-0", "alert-1", "alert-2"])
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_claimed_batch_is_sent_in_order(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        claim = claim_pending_notifications(10)
+        send_notification_ids(claim, claim.claim_token)
+        sent_alerts = [call.args[1].alert_uuid for call in mock_send_alert.call_args_list]
+        self.assertEqual(sent_alerts, ["alert-3", "alert-0", "alert-1", "alert-2"])
+
+
+class RetryTestCase(TestCase):
+    def setUp(self):
+        store = Store.objects.create(location="test-store", name="Test Store")
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=user, store=store, alert_preference="both", notification_channel="api"
+        )
+        queue_alert(
+            {
+                "url": "http://example.com/alert",
+                "location": store,
+                "alert_uuid": "test-alert-uuid",
+                "label": "theft",
+                "time_spotted": 1234567890.0,
+            }
+        )
+
+    def make_due(self):
+        SentNotification.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_failed_notification_is_scheduled(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=False, info="API down")
+        before = timezone.now()
+        dispatch_pending()
+
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "failed")
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreaterEqual(notification.next_attempt_at, before + get_retry_delay(1) / 2 - timedelta(seconds=1))
+        # Not due yet
+        self.assertEqual(claim_due_retries(10), [])
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_retry_until_sent(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=False, info="API down")
+        dispatch_pending()
+        self.make_due()
+
+        mock_send_alert.return_value = ChannelResult(success=True)
+        out = StringIO()
+        call_command("retry_notifications", "--once", "--rate", "0", stdout=out)
+
+        self.assertIn("1 notification(s) retried, 1 sent.", out.getvalue())
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "sent")
+        self.assertEqual(notification.attempts, 2)
+        self.assertIsNone(notification.next_attempt_at)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_dead_letter_after_max_attempts(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=False, info="API down")
+        dispatch_pending()
+        with self.settings(ALERTS_RETRY_MAX_ATTEMPTS=3):
+            for _ in range(2):
+                self.make_due()
+                call_command("retry_notifications", "--once", "--rate", "0", stdout=StringIO())
+
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "dead")
+        self.assertEqual(notification.attempts, 3)
+        self.make_due()
+        self.assertEqual(claim_due_retries(10), [])
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_deferred_does_not_count_as_attempt(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=False, info="Circuit open", deferred=True)
+        dispatch_pending()
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "deferred")
+        self.assertEqual(notification.attempts, 0)
+        self.assertIsNotNone(notification.next_attempt_at)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_deferred_retry_after(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(
+            success=False, info="Rate limit exceeded", deferred=True, retry_after=120
+        )
+        before = timezone.now()
+        dispatch_pending()
+        notification = SentNotification.objects.get()
+        self.assertEqual(notification.status, "deferred")
+        self.assertGreaterEqual(notification.next_attempt_at, before + timedelta(seconds=120))
+        self.assertLess(notification.next_attempt_at, timezone.now() + timedelta(seconds=121))
+
+    def test_retry_delay_grows_exponentially(self):
+        with self.settings(ALERTS_RETRY_BASE_DELAY=10, ALERTS_RETRY_MAX_DELAY=100):
+            for attempts, delay in [(1, 10), (2, 20), (3, 40), (10, 100)]:
+                retry_delay = get_retry_delay(attempts).total_seconds()
+                self.assertGreaterEqual(retry_delay, delay / 2)
+                self.assertLessEqual(retry_delay, delay)
+
+
+class DispatchCommandTestCase(TransactionTestCase):
+    def setUp(self):
+        store = Store.objects.create(location="test-store", name="Test Store")
+        for i in range(5):
+            user = User.objects.create(email=f"user{i}@user.com", api_uid=f"uid{i}")
+            UserAlertSubscripion.objects.create(
+                user=user, store=store, alert_preference="both", notification_channel="api"
+            )
+        queue_alert(
+            {
+                "url": "http://example.com/alert",
+                "location": store,
+                "alert_uuid": "test-alert-uuid",
+                "label": "theft",
+                "time_spotted": 1234567890.0,
+            }
+        )
+
+    def tearDown(self):
+        # The alerts committed by this test case are remembered by the duplicates cache
+        recent_alerts.clear()
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_command_drains_outbox(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        out = StringIO()
+        call_command("dispatch_notifications", "--once", "--workers", "2", stdout=out)
+        self.assertIn("5 notification(s) sent.", out.getvalue())
+        self.assertEqual(SentNotification.objects.filter(status="sent").count(), 5)
+        self.assertEqual(mock_send_alert.call_count, 5)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_digest")
+    def test_command_sends_whole_digests(self, mock_send_digest):
+        mock_send_digest.return_value = ChannelResult(success=True)
+        SentNotification.objects.all().delete()
+        for subscription in UserAlertSubscripion.objects.all():
+            subscription.aggregation_window = 60
+            subscription.save()
+        store = Store.objects.get()
+        # The notifications of the windows of the users are interleaved
+        for index in range(3):
+            queue_alert(
+                {
+                    "url": "http://example.com/alert",
+                    "location": store,
+                    "alert_uuid": f"digest-alert-uuid-{index}",
+                    "label": "normal",
+                    "time_spotted": 1234567890.0 + index,
+                }
+            )
+        due = timezone.now() - timedelta(seconds=1)
+        SentNotification.objects.filter(status="held").update(next_attempt_at=due, digest_until=due)
+
+        out = StringIO()
+        call_command(
+            "dispatch_notifications", "--once", "--standard-workers", "3", "--batch-size", "4",
+            stdout=out,
+        )
+        self.assertIn("15 notification(s) sent.", out.getvalue())
+        # One digest of the 3 alerts per user
+        self.assertEqual(mock_send_digest.call_count, 5)
+        self.assertTrue(all(len(call.args[1]) == 3 for call in mock_send_digest.call_args_list))
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_command_without_critical_workers(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        out = StringIO()
+        call_command("dispatch_notifications", "--once", "--critical-workers", "0", stdout=out)
+        self.assertIn("5 notification(s) sent.", out.getvalue())
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_command_without_lane_workers(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        out = StringIO()
+        call_command(
+            "dispatch_notifications", "--once", "--critical-workers", "0", "--standard-workers", "0", stdout=out
+        )
+        self.assertIn("5 notification(s) sent.", out.getvalue())
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_standard_storm_does_not_delay_critical_lane(self, mock_send_alert):
+        store = Store.objects.get()
+        for index in range(3):
+            queue_alert(
+                {
+                    "url": "http://example.com/alert",
+                    "location": store,
+                    "alert_uuid": f"storm-alert-uuid-{index}",
+                    "label": "normal",
+                    "time_spotted": 1234567890.0 + index,
+                }
+            )
+        lock = threading.Lock()
+        sending = {"standard": 0, "max_standard": 0}
+        critical_sent_at = []
+
+        def send_alert(user, alert):
+            if alert.label != "normal":
+                critical_sent_at.append(time.monotonic())
+                return ChannelResult(success=True)
+            with lock:
+                sending["standard"] += 1
+                sending["max_standard"] = max(sending["max_standard"], sending["standard"])
+            time.sleep(0.05)
+            with lock:
+                sending["standard"] -= 1
+            return ChannelResult(success=True)
+
+        mock_send_alert.side_effect = send_alert
+        out = StringIO()
+        start = time.monotonic()
+        call_command(
+            "dispatch_notifications", "--once", "--workers", "4", "--critical-workers", "1", "--standard-workers", "1",
+            "--batch-size", "5", stdout=out,
+        )
+        self.assertIn("20 notification(s) sent.", out.getvalue())
+        # The storm is sent by its own worker only, while the critical notifications are sent right away
+        self.assertEqual(sending["max_standard"], 1)
+        self.assertEqual(len(critical_sent_at), 5)
+        self.assertLess(max(critical_sent_at) - start, 0.5)
+
+
+class DispatchProcessPoolTestCase(SimpleTestCase):
+    """
+    The workers of the process pool are spawned and set Django up themselves, so they can not see the in-memory test
+    database: the commands are run in subprocesses, on a temporary database file.
+    """
+
+    def manage(self, *args, env: dict) -> str:
+        completed = subprocess.run(
+            [sys.executable, "manage.py", *args],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        return completed.stdout
+
+    def test_command_with_process_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "process_pool_settings.py"), "w") as settings_file:
+                settings_file.write(
+                    "from notification_system.settings import *\n\n"
+                    f"DATABASES['default']['NAME'] = {os.path.join(directory, 'db.sqlite3')!r}\n"
+                )
+            env = {
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": "process_pool_settings",
+                "PYTHONPATH": os.pathsep.join([directory, str(settings.BASE_DIR)]),
+            }
+            self.manage("migrate", "--verbosity", "0", env=env)
+            # A channel which is not configured fails right away, without sending anything
+            self.manage(
+                "shell",
+                "--command",
+                "from alerts.dispatch import queue_alert\n"
+                "from alerts.models.store import Store\n"
+                "from alerts.models.user import User\n"
+                "from alerts.models.user_alert_subscription import UserAlertSubscripion\n"
+                "store = Store.objects.create(location='test-store', name='Test Store')\n"
+                "for i in range(3):\n"
+                "    user = User.objects.create(email=f'user{i}@test.com')\n"
+                "    UserAlertSubscripion.objects.create(\n"
+                "        user=user, store=store, alert_preference='both', notification_channel='sms'\n"
+                "    )\n"
+                "queue_alert({'url': 'http://example.com/alert', 'location': store, 'alert_uuid': 'test-alert-uuid',"
+                " 'label': 'theft', 'time_spotted': 1234567890.0})\n",
+                env=env,
+            )
+
+            output = self.manage(
+                "dispatch_notifications", "--pool", "process", "--critical-workers", "2", "--once", env=env
+            )
+            self.assertIn("0 notification(s) sent.", output)
+            # The workers sent the notifications, none was left claimed by a crashed worker
+            output = self.manage(
+                "shell",
+                "--command",
+                "from alerts.models.sent_notification import SentNotification\n"
+                "print(sorted(SentNotification.objects.values_list('status', flat=True)))\n",
+                env=env,
+            )
+            self.assertIn("['failed', 'failed', 'failed']", output)
@@ -0,0 +1,114 @@
+import smtplib
+from unittest import mock
+
+from django.test import TestCase
+
+from alerts.channels.email_channel import EmailChannel
+from alerts.models.alert import Alert
+from alerts.models.store import Store
+from alerts.models.user import User
+
+
+@mock.patch("alerts.channels.email_channel.smtplib.SMTP")
+class EmailChannelTestCase(TestCase):
+    def setUp(self):
+        self.email_channel = EmailChannel()
+        self.addCleanup(self.email_channel.pool.close)
+        self.store = Store.objects.create(location="test-location", name="Test Store")
+        self.alert = Alert.objects.create(
+            url="http://example.com/alert?id=1&camera=2",
+            location=self.store,
+            alert_uuid="test-alert-uuid",
+            label="theft",
+            time_spotted=1234567890.0,
+        )
+        self.users = [User.objects.create(email=f"user{i}@test.com") for i in range(3)]
+
+    def test_send_alert(self, mock_smtp):
+        mock_smtp.return_value.send_message.return_value = {}
+        result = self.email_channel.send_alert(self.users[0], self.alert)
+
+        self.assertTrue(result.success)
+        message = mock_smtp.return_value.send_message.call_args.args[0]
+        self.assertEqual(message["Subject"], "[CRITICAL] Theft alert at Test Store")
+        self.assertIn("http://example.com/alert?id=1&camera=2", message.get_content())
+        self.assertEqual(mock_smtp.return_value.send_message.call_args.kwargs["to_addrs"], ["user0@test.com"])
+
+    def test_batch_renders_and_sends_once(self, mock_smtp):
+        mock_smtp.return_value.send_message.return_value = {"user1@test.com": (550, b"No such user")}
+        with mock.patch("alerts.channels.email_channel.render_to_string", return_value="Rendered") as mock_render:
+            results = self.email_channel.send_alert_batch(self.users, self.alert)
+
+        # The subject and the body are rendered once for all the recipients
+        self.assertEqual(mock_render.call_count, 2)
+        mock_smtp.return_value.send_message.assert_called_once()
+        self.assertEqual([result.success for result in results], [True, False, True])
+        self.assertIn("No such user", results[1].info)
+        self.assertFalse(results[1].deferred)
+
+    def test_send_digest(self, mock_smtp):
+        mock_smtp.return_value.send_message.return_value = {}
+        other_alert = Alert.objects.create(
+            url="http://example.com/alert?id=2",
+            location=self.store,
+            alert_uuid="other-alert-uuid",
+            label="theft",
+            time_spotted=1234567900.0,
+        )
+        result = self.email_channel.send_digest(self.users[0], [self.alert, other_alert])
+
+        self.assertTrue(result.success)
+        mock_smtp.return_value.send_message.assert_called_once()
+        message = mock_smtp.return_value.send_message.call_args.args[0]
+        self.assertEqual(message["Subject"], "[CRITICAL] 2 alerts at Test Store")
+        self.assertIn("http://example.com/alert?id=1&camera=2", message.get_content())
+        self.assertIn("http://example.com/alert?id=2", message.get_content())
+
+    def test_connection_is_reused(self, mock_smtp):
+        mock_smtp.return_value.send_message.return_value = {}
+        for _ in range(3):
+            self.assertTrue(self.email_channel.send_alert(self.users[0], self.alert).success)
+        mock_smtp.assert_called_once()
+
+    def test_login_with_credentials(self, mock_smtp):
+        self.email_channel.pool.username = "alerts"
+        self.email_channel.pool.password = "secret"
+        self.email_channel.pool.use_tls = True
+        mock_smtp.return_value.send_message.return_value = {}
+        self.email_channel.send_alert(self.users[0], self.alert)
+        mock_smtp.return_value.starttls.assert_called_once()
+        mock_smtp.return_value.login.assert_called_once_with("alerts", "secret")
+
+    def test_connection_renewed_after_max_messages(self, mock_smtp):
+        self.email_channel.pool.max_messages = 2
+        mock_smtp.return_value.send_message.return_value = {}
+        for _ in range(3):
+            self.email_channel.send_alert(self.users[0], self.alert)
+        self.assertEqual(mock_smtp.call_count, 2)
+
+    def test_stale_connection_is_replaced(self, mock_smtp):
+        stale, fresh = mock.MagicMock(), mock.MagicMock()
+        stale.send_message.side_effect = smtplib.SMTPServerDisconnected("Connection closed")
+        fresh.send_message.return_value = {}
+        mock_smtp.side_effect = [stale, fresh]
+
+        self.assertTrue(self.email_channel.send_alert(self.users[0], self.alert).success)
+        self.assertEqual(mock_smtp.call_count, 2)
+
+    def test_temporary_error_is_deferred(self, mock_smtp):
+        mock_smtp.return_value.send_message.side_effect = smtplib.SMTPDataError(451, b"Try again later")
+        results = self.email_channel.send_alert_batch(self.users[:2], self.alert)
+        self.assertTrue(all(result.deferred for result in results))
+
+    def test_server_unreachable(self, mock_smtp):
+        mock_smtp.side_effect = ConnectionRefusedError("Connection refused")
+        result = self.email_channel.send_alert(self.users[0], self.alert)
+        self.assertFalse(result.success)
+        self.assertIn("No connection to the SMTP server", result.info)
+
+    def test_invalid_user(self, mock_smtp):
+        mock_smtp.return_value.send_message.return_value = {}
+        results = self.email_channel.send_alert_batch([None, self.users[0]], self.alert)
+        self.assertEqual(results[0].info, "Invalid user")
+        self.assertTrue(results[1].success)
+        self.assertEqual(mock_smtp.return_value.send_message.call_args.kwargs["to_addrs"], ["user0@test.com"])
@@ -0,0 +1,69 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from alerts.export import ALERT_EXPORT_FIELDS, iter_ndjson
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+from alerts.models.store import Store
+from alerts.models.user import User
+
+
+class HistoryExportTestCase(TestCase):
+    def setUp(self):
+        stores = [Store.objects.create(location=f"test-store-{i}", name=f"Test Store {i}") for i in range(2)]
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        for i in range(5):
+            alert = Alert.objects.create(
+                alert_uuid=f"test-alert-uuid-{i}",
+                url=f"http://example.com/alert/{i}",
+                location=stores[i % 2],
+                label="theft",
+                time_spotted=1234567890.0,
+            )
+            SentNotification.objects.create(alert=alert, user=user, method="api", sent=True, status="sent")
+
+    def read_lines(self, content: bytes) -> list[dict]:
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_iter_ndjson_in_chunks(self):
+        lines = self.read_lines(b"".join(iter_ndjson(Alert.objects.all(), ALERT_EXPORT_FIELDS, chunk_size=2)))
+        self.assertEqual([line["alert_uuid"] for line in lines], [f"test-alert-uuid-{i}" for i in range(5)])
+        self.assertEqual(lines[1]["location"], "test-store-1")
+
+    def test_export_alerts(self):
+        response = self.client.get(reverse("alert-export"), {"store": "test-store-0"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = self.read_lines(b"".join(response.streaming_content))
+        self.assertEqual([line["alert_uuid"] for line in lines], ["test-alert-uuid-0", "test-alert-uuid-2", "test-alert-uuid-4"])
+
+    def test_export_notifications_gzip(self):
+        response = self.client.get(reverse("notification-export"), {"compression": "gzip"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("notifications.ndjson.gz", response["Content-Disposition"])
+        lines = self.read_lines(gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0]["user"], "test@user.com")
+
+    def test_export_invalid_filter(self):
+        response = self.client.get(reverse("alert-export"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "alerts.ndjson.gz")
+            call_command("export_history", "alerts", "--gzip", "--chunk-size", "2", "--output", path)
+            with gzip.open(path, "rb") as export:
+                self.assertEqual(len(self.read_lines(export.read())), 5)
+
+        out = StringIO()
+        call_command("export_history", "notifications", "--store", "test-store-1", stdout=out)
+        self.assertEqual(len(self.read_lines(out.getvalue().encode())), 2)
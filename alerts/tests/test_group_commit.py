@@ -0,0 +1,127 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from alerts import group_commit
+from alerts.dedup import DuplicateAlertError, recent_alerts
+from alerts.group_commit import GroupCommitTimeoutError, GroupCommitWriter
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+
+
+class GroupCommitWriterTestCase(TransactionTestCase):
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=user, store=self.store, alert_preference="both", notification_channel="api"
+        )
+        self.writer = GroupCommitWriter(window=0.2, max_size=100, timeout=10)
+
+    def tearDown(self):
+        self.writer.stop()
+        # The alerts committed by this test case are remembered by the duplicates cache
+        recent_alerts.clear()
+
+    def alert_data(self, alert_uuid: str) -> dict:
+        return {
+            "url": "http://example.com/alert",
+            "location": self.store,
+            "alert_uuid": alert_uuid,
+            "label": "theft",
+            "time_spotted": 1234567890.0,
+        }
+
+    def test_concurrent_alerts_are_committed_together(self):
+        with mock.patch("alerts.group_commit.queue_alerts", wraps=group_commit.queue_alerts) as mock_queue_alerts:
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                results = list(
+                    executor.map(self.writer.queue_alert, [self.alert_data(f"uuid-{i}") for i in range(5)])
+                )
+
+        self.assertEqual([alert.alert_uuid for alert, _ in results], [f"uuid-{i}" for i in range(5)])
+        self.assertTrue(all(len(notifications) == 1 for _, notifications in results))
+        self.assertEqual(Alert.objects.count(), 5)
+        self.assertEqual(SentNotification.objects.filter(status="pending").count(), 5)
+        self.assertLess(mock_queue_alerts.call_count, 5)
+
+    def test_duplicates(self):
+        self.writer.queue_alert(self.alert_data("uuid"))
+        with self.assertRaises(DuplicateAlertError):
+            self.writer.queue_alert(self.alert_data("uuid"))
+
+        # The same alert twice in a group is inserted once
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.writer.queue_alert, self.alert_data("other-uuid")) for _ in range(2)]
+        errors = [future.exception() for future in futures]
+        self.assertEqual(sum(isinstance(error, DuplicateAlertError) for error in errors), 1)
+        self.assertEqual(Alert.objects.count(), 2)
+
+    def test_timed_out_alert_is_withdrawn(self):
+        writing = threading.Event()
+        release = threading.Event()
+        queue_alerts = group_commit.queue_alerts
+
+        def slow_queue_alerts(alerts_data):
+            writing.set()
+            release.wait(5)
+            return queue_alerts(alerts_data)
+
+        self.writer = GroupCommitWriter(window=0, max_size=100, timeout=0.1)
+        with mock.patch("alerts.group_commit.queue_alerts", side_effect=slow_queue_alerts):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # The first alert is being committed by the writer when its request times out
+                committing = executor.submit(self.writer.queue_alert, self.alert_data("committing-uuid"))
+                self.assertTrue(writing.wait(5))
+                # The second one is still waiting for the writer, it is withdrawn
+                with self.assertRaises(GroupCommitTimeoutError):
+                    self.writer.queue_alert(self.alert_data("withdrawn-uuid"))
+                release.set()
+                alert, _ = committing.result()
+            self.writer.stop()
+
+        self.assertEqual(alert.alert_uuid, "committing-uuid")
+        self.assertEqual(list(Alert.objects.values_list("alert_uuid", flat=True)), ["committing-uuid"])
+
+    @override_settings(ALERTS_GROUP_COMMIT=True)
+    def test_webhook_with_group_commit_timeout(self):
+        with mock.patch("alerts.views.group_writer") as mock_group_writer:
+            mock_group_writer.queue_alert.side_effect = GroupCommitTimeoutError("uuid")
+            response = self.client.post(
+                reverse("alert-webhook"),
+                {
+                    "url": "http://example.com/alert",
+                    "location": "test-store",
+                    "alert_uuid": "uuid",
+                    "label": "theft",
+                    "time_spotted": 1234567890.0,
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", response)
+
+    @override_settings(ALERTS_GROUP_COMMIT=True)
+    def test_webhook_with_group_commit(self):
+        with mock.patch("alerts.views.group_writer", self.writer):
+            response = self.client.post(
+                reverse("alert-webhook"),
+                {
+                    "url": "http://example.com/alert",
+                    "location": "test-store",
+                    "alert_uuid": "uuid",
+                    "label": "theft",
+                    "time_spotted": 1234567890.0,
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["notifications"], 1)
+        self.assertTrue(Alert.objects.filter(alert_uuid="uuid").exists())
@@ -0,0 +1,67 @@
+import json
+import logging
+from io import StringIO
+
+from django.test import SimpleTestCase, override_settings
+
+from alerts.channels.base_channel import ChannelResult
+from alerts.dispatch import log_results
+from alerts.log import JSONFormatter, QueueLogHandler
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+from alerts.models.user import User
+
+
+class QueueLogHandlerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.logger = logging.getLogger("alerts.tests.log")
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, "propagate", True)
+
+    def add_handler(self, **kwargs) -> QueueLogHandler:
+        handler = QueueLogHandler(stream=self.stream, **kwargs)
+        handler.setFormatter(JSONFormatter())
+        self.logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def test_json_records_written_by_listener(self):
+        handler = self.add_handler()
+        self.logger.warning("Alert %s deferred", "test-alert-uuid", extra={"channel": "api"})
+        handler.flush()
+
+        record = json.loads(self.stream.getvalue())
+        self.assertEqual(record["message"], "Alert test-alert-uuid deferred")
+        self.assertEqual(record["level"], "WARNING")
+        self.assertEqual(record["channel"], "api")
+
+    def test_records_dropped_when_queue_full(self):
+        handler = self.add_handler(max_size=1)
+        handler.listener.stop()
+        for i in range(3):
+            self.logger.warning("Record %d", i)
+        self.assertEqual(handler.dropped, 2)
+        handler.listener.start()
+        handler.flush()
+        self.assertEqual(len(self.stream.getvalue().splitlines()), 1)
+
+
+class LogResultsTestCase(SimpleTestCase):
+    @override_settings(ALERTS_LOG_FAILURES_PER_ALERT=2)
+    def test_failures_are_aggregated(self):
+        alert = Alert(id=1, alert_uuid="test-alert-uuid")
+        sent_notifications = [
+            SentNotification(alert=alert, user=User(email=f"user{i}@user.com"), method="api") for i in range(6)
+        ]
+        results = [ChannelResult(success=True)] + [ChannelResult(success=False, info="API down")] * 5
+
+        with self.assertLogs("alerts.dispatch", level="DEBUG") as logs:
+            log_results(sent_notifications, results)
+
+        levels = [record.levelname for record in logs.records]
+        self.assertEqual(levels, ["DEBUG", "ERROR", "ERROR", "WARNING"])
+        summary = logs.records[-1]
+        self.assertEqual(summary.getMessage(), "Alert test-alert-uuid via api: 1 sent, 5 failed, 0 deferred.")
+        self.assertEqual(summary.failed, 5)
@@ -0,0 +1,155 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from alerts.channels.base_channel import ChannelResult
+from alerts.dispatch import dispatch_pending, get_shard_key
+from alerts.metrics import (
+    ALERTS_RECEIVED,
+    DELIVERY_LATENCY,
+    DISPATCH_QUEUE_LATENCY,
+    NOTIFICATIONS,
+    REGISTRY,
+    STAGE_LATENCY,
+    WEBHOOK_REQUESTS,
+    Counter,
+    Histogram,
+    Registry,
+    get_lane_backlog,
+    get_shard_backlog,
+    watch_dispatch_shards,
+)
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+
+
+class MetricsFormatTestCase(SimpleTestCase):
+    def test_render(self):
+        registry = Registry()
+        counter = registry.register(Counter("test_total", "Test counter.", ("channel",)))
+        histogram = registry.register(Histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0)))
+        counter.inc(channel="api")
+        counter.inc(2, channel='"email"')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = registry.render()
+        self.assertIn("# TYPE test_total counter\n", text)
+        self.assertIn('test_total{channel="api"} 1\n', text)
+        self.assertIn('test_total{channel="\\"email\\""} 2\n', text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2\n', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("test_seconds_count 3\n", text)
+        self.assertIn("test_seconds_sum 5.55\n", text)
+
+    def test_labels_are_checked(self):
+        counter = Counter("test_total", "Test counter.", ("channel",))
+        with self.assertRaises(ValueError):
+            counter.inc(outcome="sent")
+
+
+class PipelineMetricsTestCase(TestCase):
+    def setUp(self):
+        REGISTRY.clear()
+        self.addCleanup(REGISTRY.clear)
+        store = Store.objects.create(location="test-store", name="Test Store")
+        user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=user, store=store, alert_preference="both", notification_channel="api"
+        )
+
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_webhook_and_dispatch_metrics(self, mock_send_alert):
+        mock_send_alert.return_value = ChannelResult(success=True)
+        response = self.client.post(
+            reverse("alert-webhook"),
+            {
+                "url": "http://example.com/alert",
+                "location": "test-store",
+                "alert_uuid": "test-alert-uuid",
+                "label": "theft",
+                "time_spotted": time.time() - 2,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(WEBHOOK_REQUESTS.get(endpoint="alert", status=202), 1)
+        for stage in ("validation", "insert", "routing", "enqueue"):
+            self.assertEqual(STAGE_LATENCY.get_count(stage=stage), 1)
+        self.assertEqual(ALERTS_RECEIVED.get(severity="critical"), 1)
+
+        dispatch_pending()
+        self.assertEqual(NOTIFICATIONS.get(channel="api", outcome="sent", severity="critical"), 1)
+        self.assertEqual(DELIVERY_LATENCY.get_count(channel="api", severity="critical"), 1)
+        self.assertEqual(DISPATCH_QUEUE_LATENCY.get_count(lane="critical"), 1)
+        self.assertEqual(DISPATCH_QUEUE_LATENCY.get_count(lane="standard"), 0)
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('alerts_webhook_requests_total{endpoint="alert",status="202"} 1', response.content.decode())
+        self.assertIn('alerts_delivery_latency_seconds_bucket{channel="api",severity="critical",le="5.0"} 1',
+                      response.content.decode())
+
+    def test_outbox_depth(self):
+        self.client.post(
+            reverse("alert-webhook"),
+            {
+                "url": "http://example.com/alert",
+                "location": "test-store",
+                "alert_uuid": "test-alert-uuid",
+                "label": "normal",
+                "time_spotted": time.time(),
+            },
+            content_type="application/json",
+        )
+        response = self.client.get(reverse("metrics"))
+        self.assertIn('alerts_outbox_notifications{status="pending"} 1', response.content.decode())
+
+    def test_shard_backlog(self):
+        self.client.post(
+            reverse("alert-webhook"),
+            {
+                "url": "http://example.com/alert",
+                "location": "test-store",
+                "alert_uuid": "test-alert-uuid",
+                "label": "normal",
+                "time_spotted": time.time(),
+            },
+            content_type="application/json",
+        )
+        shard = get_shard_key("test-store") % 2
+        backlog = get_shard_backlog(2)
+        self.assertEqual(backlog[shard][0], 1)
+        self.assertGreaterEqual(backlog[shard][1], 0)
+        self.assertEqual(backlog[1 - shard], (0, 0.0))
+
+        watch_dispatch_shards(2)
+        response = self.client.get(reverse("metrics"))
+        self.assertIn(f'alerts_dispatch_shard_pending{{shard="{shard}"}} 1', response.content.decode())
+        self.assertIn(f'alerts_dispatch_shard_pending{{shard="{1 - shard}"}} 0', response.content.decode())
+
+    def test_lane_backlog(self):
+        self.client.post(
+            reverse("alert-webhook"),
+            {
+                "url": "http://example.com/alert",
+                "location": "test-store",
+                "alert_uuid": "test-alert-uuid",
+                "label": "normal",
+                "time_spotted": time.time(),
+            },
+            content_type="application/json",
+        )
+        backlog = get_lane_backlog()
+        self.assertEqual(backlog["standard"][0], 1)
+        self.assertEqual(backlog["critical"], (0, 0.0))
+
+        response = self.client.get(reverse("metrics"))
+        self.assertIn('alerts_dispatch_lane_pending{lane="standard"} 1', response.content.decode())
+        self.assertIn('alerts_dispatch_lane_pending{lane="critical"} 0', response.content.decode())
@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from alerts.channels.rate_limiter import RateLimitedError, TokenBucketRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class TokenBucketRateLimiterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def make_limiter(self, **kwargs) -> TokenBucketRateLimiter:
+        return TokenBucketRateLimiter(clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_burst_then_shaped(self):
+        limiter = self.make_limiter(rate=2, burst=2, max_wait=1)
+        limiter.acquire("api")
+        limiter.acquire("api")
+        self.assertEqual(self.clock.sleeps, [])
+
+        # Over the burst, the calls wait for their token, spaced out at the rate
+        limiter.acquire("api")
+        limiter.acquire("api")
+        self.assertEqual(self.clock.sleeps, [0.5, 1.0])
+
+        # The next token would be available in 1.5 seconds, more than the maximum wait
+        with self.assertRaises(RateLimitedError) as error:
+            limiter.acquire("api")
+        self.assertEqual(error.exception.retry_after, 1.5)
+
+    def test_refill(self):
+        limiter = self.make_limiter(rate=1, burst=1, max_wait=0)
+        limiter.acquire("api")
+        with self.assertRaises(RateLimitedError):
+            limiter.acquire("api")
+        self.clock.now += 1
+        limiter.acquire("api")
+
+    def test_destinations_are_independent(self):
+        limiter = self.make_limiter(rate=1, burst=1, max_wait=0)
+        limiter.acquire("api")
+        limiter.acquire("other-api")
+
+    def test_block(self):
+        limiter = self.make_limiter(rate=10, burst=10, max_wait=1)
+        limiter.block("api", 5)
+        with self.assertRaises(RateLimitedError):
+            limiter.acquire("api")
+        self.clock.now += 5
+        limiter.acquire("api")
+
+    def test_shared_through_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "buckets.sqlite3")
+            first = self.make_limiter(rate=1, burst=1, max_wait=0, path=path)
+            second = self.make_limiter(rate=1, burst=1, max_wait=0, path=path)
+            first.acquire("api")
+            with self.assertRaises(RateLimitedError):
+                second.acquire("api")
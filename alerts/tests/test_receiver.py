@@ -0,0 +1,79 @@
+import json
+import random
+from io import StringIO
+
+from django.test import SimpleTestCase
+from urllib3 import PoolManager
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from alerts.receiver import FaultProfile, NotificationReceiver, parse_latency
+
+
+class ParseLatencyTestCase(SimpleTestCase):
+    def test_distributions(self):
+        rng = random.Random(0)
+        self.assertEqual(parse_latency("0.5")(rng), 0.5)
+        self.assertEqual(parse_latency("fixed:0.2")(rng), 0.2)
+        for _ in range(100):
+            self.assertTrue(0.1 <= parse_latency("uniform:0.1,0.3")(rng) <= 0.3)
+            self.assertGreaterEqual(parse_latency("normal:0,1")(rng), 0)
+
+    def test_invalid(self):
+        for spec in ("gamma:1", "uniform:1", "fixed:fast"):
+            with self.assertRaises(ValueError):
+                parse_latency(spec)
+
+
+class NotificationReceiverTestCase(SimpleTestCase):
+    def start_receiver(self, **profile):
+        self.record_file = StringIO()
+        receiver = NotificationReceiver(profile=FaultProfile(**profile), record_file=self.record_file)
+        receiver.start()
+        self.addCleanup(receiver.stop)
+        return receiver
+
+    def post(self, receiver, path, payload, **kwargs):
+        return PoolManager().request(
+            "POST", f"{receiver.url}{path}", json=payload, retries=False, **kwargs
+        )
+
+    def test_records_notifications(self):
+        receiver = self.start_receiver()
+        response = self.post(receiver, "/webhook/notifications", {"alert_uuid": "uuid", "target_user_id": "uid"})
+        self.assertEqual(response.status, 200)
+
+        response = self.post(
+            receiver, "/webhook/notifications/batch", {"alert_uuid": "uuid", "target_user_ids": ["uid1", "uid2"]}
+        )
+        self.assertEqual(json.loads(response.data)["results"], {"uid1": {"success": True}, "uid2": {"success": True}})
+
+        self.assertEqual(
+            receiver.stats(),
+            {"requests": {"/webhook/notifications": 1, "/webhook/notifications/batch": 1}, "outcomes": {"ok": 2}},
+        )
+        self.assertEqual(receiver.received[0]["payload"]["target_user_id"], "uid")
+        self.assertEqual(len(self.record_file.getvalue().splitlines()), 2)
+
+    def test_capabilities(self):
+        receiver = self.start_receiver(batch=False)
+        response = PoolManager().request("GET", f"{receiver.url}/webhook/capabilities")
+        self.assertEqual(json.loads(response.data), {"batch": False})
+        response = self.post(receiver, "/webhook/notifications/batch", {"target_user_ids": ["uid"]})
+        self.assertEqual(response.status, 404)
+
+    def test_injected_error(self):
+        receiver = self.start_receiver(error_rate=1, error_status=503)
+        response = self.post(receiver, "/webhook/notifications", {"target_user_id": "uid"})
+        self.assertEqual(response.status, 503)
+        self.assertEqual(receiver.stats()["outcomes"], {"error": 1})
+
+    def test_injected_timeout(self):
+        receiver = self.start_receiver(timeout_rate=1, timeout_duration=1)
+        with self.assertRaises(ReadTimeoutError):
+            self.post(receiver, "/webhook/notifications", {"target_user_id": "uid"}, timeout=0.2)
+
+    def test_injected_reset(self):
+        receiver = self.start_receiver(reset_rate=1)
+        with self.assertRaises(ProtocolError):
+            self.post(receiver, "/webhook/notifications", {"target_user_id": "uid"})
+        self.assertEqual(receiver.stats()["outcomes"], {"reset": 1})
@@ -0,0 +1,111 @@
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from alerts.models.alert import Alert
+from alerts.models.sent_notification import SentNotification
+from alerts.models.store import Store
+from alerts.models.user import User
+
+
+class PruneHistoryCommandTestCase(TestCase):
+    def setUp(self):
+        store = Store.objects.create(location="test-store", name="Test Store")
+        self.user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        self.old_alerts = []
+        for i in range(5):
+            alert = Alert.objects.create(
+                alert_uuid=f"old-alert-{i}",
+                url="http://example.com/alert",
+                location=store,
+                label="theft",
+                time_spotted=1234567890.0,
+            )
+            SentNotification.objects.create(alert=alert, user=self.user, method="api", sent=True, status="sent")
+            self.old_alerts.append(alert)
+        self.recent_alert = Alert.objects.create(
+            alert_uuid="recent-alert",
+            url="http://example.com/alert",
+            location=store,
+            label="theft",
+            time_spotted=1234567890.0,
+        )
+        SentNotification.objects.create(alert=self.recent_alert, user=self.user, method="api", sent=True, status="sent")
+
+        # auto_now_add fields can only be backdated with an update
+        old = timezone.now() - timedelta(days=100)
+        Alert.objects.exclude(pk=self.recent_alert.pk).update(received_at=old)
+        SentNotification.objects.exclude(alert=self.recent_alert).update(sent_at=old)
+
+    def test_prune_in_chunks(self):
+        out = StringIO()
+        call_command("prune_history", "--chunk-size", "2", "--pause", "0", stdout=out)
+
+        self.assertIn("5 alert(s) and 5 notification(s) deleted.", out.getvalue())
+        self.assertEqual(list(Alert.objects.all()), [self.recent_alert])
+        self.assertEqual(SentNotification.objects.get().alert, self.recent_alert)
+
+    def test_chunks_are_deleted_by_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command("prune_history", "--chunk-size", "2", "--pause", "0", stdout=StringIO())
+
+        deletes = [query["sql"] for query in queries.captured_queries if query["sql"].startswith("DELETE")]
+        # 3 chunks of notifications, and 3 chunks of alerts with their notifications
+        self.assertEqual(len(deletes), 9)
+        self.assertTrue(all('"id" >= ' in sql for sql in deletes))
+
+    def test_unfinished_notifications_are_kept(self):
+        SentNotification.objects.filter(alert=self.old_alerts[0]).update(status="pending", sent=False)
+        call_command("prune_history", "--pause", "0", stdout=StringIO())
+
+        self.assertEqual(Alert.objects.count(), 2)
+        self.assertEqual(SentNotification.objects.filter(status="pending").count(), 1)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command("prune_history", "--dry-run", stdout=out)
+
+        self.assertIn("5 alert(s) and 5 notification(s) would be deleted.", out.getvalue())
+        self.assertEqual(Alert.objects.count(), 6)
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            # The notifications are kept longer than the alerts, they are archived when their alert is deleted
+            call_command(
+                "prune_history",
+                "--notifications-days", "365",
+                "--chunk-size", "2",
+                "--pause", "0",
+                "--archive-dir", archive_dir,
+                stdout=StringIO(),
+            )
+
+            archives = {path.name.split("-")[0]: path for path in Path(archive_dir).iterdir()}
+            with gzip.open(archives["alerts"], "rt") as archive:
+                alerts = [json.loads(line) for line in archive]
+            with gzip.open(archives["notifications"], "rt") as archive:
+                notifications = [json.loads(line) for line in archive]
+
+        self.assertEqual(sorted(alert["alert_uuid"] for alert in alerts), [f"old-alert-{i}" for i in range(5)])
+        self.assertEqual(len(notifications), 5)
+        self.assertEqual(SentNotification.objects.count(), 1)
+
+    def test_archive_only_holds_deleted_rows(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with mock.patch("django.db.models.query.QuerySet.delete", side_effect=DatabaseError("database is locked")):
+                with self.assertRaises(DatabaseError):
+                    call_command("prune_history", "--pause", "0", "--archive-dir", archive_dir, stdout=StringIO())
+
+            with gzip.open(next(Path(archive_dir).iterdir()), "rt") as archive:
+                self.assertEqual(archive.read(), "")
+        self.assertEqual(SentNotification.objects.count(), 6)
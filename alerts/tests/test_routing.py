@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from alerts.models.cache_version import CacheVersion
+from alerts.models.store import Store
+from alerts.models.user import User
+from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.routing import ROUTING_CACHE_NAME, SubscriptionRoutingIndex
+
+
+class SubscriptionRoutingIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = SubscriptionRoutingIndex()
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        self.user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        self.subscription = UserAlertSubscripion.objects.create(
+            user=self.user, store=self.store, alert_preference="critical", notification_channel="api"
+        )
+
+    def test_routes_by_store_and_severity(self):
+        both_user = User.objects.create(email="both@user.com", api_uid="both_api_uid")
+        UserAlertSubscripion.objects.create(
+            user=both_user, store=self.store, alert_preference="both", notification_channel="api"
+        )
+
+        critical = self.index.get_subscriptions("test-store", "critical")
+        self.assertEqual([s.user.email for s in critical], ["test@user.com", "both@user.com"])
+        standard = self.index.get_subscriptions("test-store", "standard")
+        self.assertEqual([s.user.email for s in standard], ["both@user.com"])
+        self.assertEqual(self.index.get_subscriptions("other-store", "critical"), [])
+
+    def test_lookup_does_not_query(self):
+        with self.settings(ALERTS_ROUTING_REFRESH_INTERVAL=60):
+            self.index.get_subscriptions("test-store", "critical")
+            with self.assertNumQueries(0):
+                subscriptions = self.index.get_subscriptions("test-store", "critical")
+                # The user fields needed by the channels are loaded
+                self.assertEqual(subscriptions[0].user.api_uid, "test_api_uid")
+
+    def test_refresh_when_version_changes(self):
+        with self.settings(ALERTS_ROUTING_REFRESH_INTERVAL=0):
+            self.index.get_subscriptions("test-store", "critical")
+            # The version is only read while it does not change
+            with self.assertNumQueries(1):
+                self.index.get_subscriptions("test-store", "critical")
+
+            # Simulate a change made by another process
+            UserAlertSubscripion.objects.filter(pk=self.subscription.pk).update(alert_preference="standard")
+            CacheVersion.bump(ROUTING_CACHE_NAME)
+            self.assertEqual(self.index.get_subscriptions("test-store", "critical"), [])
+            self.assertEqual(len(self.index.get_subscriptions("test-store", "standard")), 1)
+
+    def test_signals_bump_version(self):
+        version = CacheVersion.current(ROUTING_CACHE_NAME)
+        self.subscription.delete()
+        self.assertEqual(CacheVersion.current(ROUTING_CACHE_NAME), version + 1)
@@ -0,0 +1,79 @@
+from django.test import TestCase
+
+from alerts.models.store import Store
+from alerts.serializers import AlertSerializer
+from alerts.validation import store_locations, validate_alert
+
+
+class ValidateAlertTestCase(TestCase):
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        self.alert_data = {
+            "url": "http://example.com/alert",
+            "location": "test-store",
+            "alert_uuid": "test-alert-uuid",
+            "label": "theft",
+            "time_spotted": 1234567890,
+        }
+
+    def assertSameAsSerializer(self, alert_data):
+        serializer = AlertSerializer(data=alert_data)
+        valid = serializer.is_valid()
+        validated_data, errors = validate_alert(alert_data)
+        if valid:
+            self.assertIsNone(errors)
+            self.assertEqual(validated_data, serializer.validated_data)
+        else:
+            self.assertIsNone(validated_data)
+            self.assertEqual(errors, serializer.errors)
+
+    def test_valid_alert_does_not_query(self):
+        self.assertIn("test-store", store_locations)
+        with self.settings(ALERTS_ROUTING_REFRESH_INTERVAL=60, ALERTS_CLASSIFICATION_REFRESH_INTERVAL=60):
+            validate_alert(self.alert_data)
+            with self.assertNumQueries(0):
+                validated_data, errors = validate_alert(self.alert_data)
+        self.assertIsNone(errors)
+        self.assertEqual(validated_data["location"].pk, "test-store")
+        self.assertEqual(validated_data["time_spotted"], 1234567890.0)
+
+    def test_same_result_as_serializer(self):
+        self.assertSameAsSerializer(self.alert_data)
+        self.assertSameAsSerializer({**self.alert_data, "alert_uuid": "  padded-uuid  ", "label": " theft "})
+        self.assertSameAsSerializer({**self.alert_data, "time_spotted": "1234567890.5"})
+        self.assertSameAsSerializer({**self.alert_data, "alert_uuid": 1234})
+
+    def test_same_errors_as_serializer(self):
+        invalid_alerts_data = [
+            [self.alert_data],
+            "not an alert",
+            {},
+            {**self.alert_data, "url": "not a url"},
+            {**self.alert_data, "url": ""},
+            {**self.alert_data, "location": "unknown-store"},
+            {**self.alert_data, "label": "unknown"},
+            {**self.alert_data, "label": "x" * 30},
+            {**self.alert_data, "alert_uuid": "x" * 101},
+            {**self.alert_data, "time_spotted": "yesterday"},
+            {**self.alert_data, "time_spotted": None},
+        ]
+        for alert_data in invalid_alerts_data:
+            with self.subTest(alert_data=alert_data):
+                self.assertSameAsSerializer(alert_data)
+
+    def test_store_created_by_another_process(self):
+        with self.settings(ALERTS_ROUTING_REFRESH_INTERVAL=60):
+            self.assertNotIn("new-store", store_locations)
+            # Created without the signals, the cached locations are outdated
+            Store.objects.bulk_create([Store(location="new-store", name="New Store")])
+            validated_data, errors = validate_alert({**self.alert_data, "location": "new-store"})
+        self.assertIsNone(errors)
+        self.assertEqual(validated_data["location"].name, "New Store")
+
+    def test_store_signals(self):
+        with self.settings(ALERTS_ROUTING_REFRESH_INTERVAL=60):
+            self.assertNotIn("new-store", store_locations)
+            Store.objects.create(location="new-store", name="New Store")
+            self.assertIn("new-store", store_locations)
+            self.store.delete()
+            self.assertNotIn("test-store", store_locations)
@@ -1,12 +1,19 @@
+import threading
 import time
 from unittest import mock
 from django.test import TestCase
 
+from alerts.channels import NOTIFICATION_CHANNELS
+from alerts.channels.base_channel import ChannelResult
+from alerts.dedup import recent_alerts
+from alerts.dispatch import dispatch_pending
 from alerts.models.alert import Alert
 from alerts.models.sent_notification import SentNotification
 from alerts.models.store import Store
 from alerts.models.user import User
 from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.routing import routing_index
+from alerts.validation import store_locations
 
 from django.urls import reverse
 from rest_framework import status
@@ -39,7 +46,11 @@ class AlertWebhookViewTestCase(TestCase):
         }
         response = self.client.post(url, data, format="json")
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # Notifications are only queued by the webhook
+        self.assertFalse(mock_send_alert.called)
+        dispatch_pending()
+
         self.assertTrue(Alert.objects.filter(alert_uuid="test-alert-uuid").exists())
         alert = Alert.objects.get(alert_uuid="test-alert-uuid")
         self.assertEqual(alert.url, "http://example.com/alert")
@@ -53,7 +64,14 @@ class AlertWebhookViewTestCase(TestCase):
         self.assertTrue(mock_send_alert.called)
     
 
-    def test_post_existing_alert(self):
+    @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
+    def test_post_existing_alert(self, mock_send_alert):
+        UserAlertSubscripion.objects.create(
+            user=self.user,
+            store=self.store,
+            alert_preference="both",
+            notification_channel="api",
+        )
         alert = Alert.objects.create(
             alert_uuid="existing-alert-uuid",
             url="http://example.com/existing",
@@ -70,7 +88,30 @@ class AlertWebhookViewTestCase(TestCase):
             "time_spotted": 1234567890.0,
         }
         response = self.client.post(url, data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["alert_uuid"], "existing-alert-uuid")
+        # No notification is queued for a duplicate
+        self.assertFalse(SentNotification.objects.exists())
+        dispatch_pending()
+        self.assertFalse(mock_send_alert.called)
+
+    def test_post_recent_duplicate(self):
+        url = reverse("alert-webhook")
+        data = {
+            "url": "http://example.com/alert",
+            "location": self.store.location,
+            "alert_uuid": "recent-alert-uuid",
+            "label": "theft",
+            "time_spotted": 1234567890.0,
+        }
+        recent_alerts.add("recent-alert-uuid")
+        try:
+            # The duplicate is rejected without any query
+            with self.assertNumQueries(0):
+                response = self.client.post(url, data, format="json")
+        finally:
+            recent_alerts.clear()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
     def test_post_invalid_data(self):
         url = reverse("alert-webhook")
@@ -111,8 +152,10 @@ class AlertWebhookViewTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(response.data, {"status": "No user subscriptions found"})
 
+    @mock.patch("alerts.channels.email_channel.EmailChannel.send_alert_batch")
     @mock.patch("alerts.channels.api_channel.APIChannel.send_alert")
-    def test_post_mulitple_subscriptions(self, mock_send_alert):
+    def test_post_mulitple_subscriptions(self, mock_send_alert, mock_send_email):
+        mock_send_email.return_value = [ChannelResult(success=False, info="SMTP server down")]
         # Create a user alert subscription
         UserAlertSubscripion.objects.create(
             user=self.user,
@@ -136,8 +179,10 @@ class AlertWebhookViewTestCase(TestCase):
             "time_spotted": 1234567890.0,
         }
         response = self.client.post(url, data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["notifications"], 2)
         self.assertTrue(Alert.objects.filter(alert_uuid="test-alert-uuid").exists())
+        dispatch_pending()
 
         # Check that two notifications were created       
         notifications = SentNotification.objects.all()
@@ -146,9 +191,279 @@ class AlertWebhookViewTestCase(TestCase):
             self.assertEqual(notification.alert.alert_uuid, "test-alert-uuid")
             if notification.method == "api":
                 self.assertTrue(notification.sent)
+                self.assertEqual(notification.status, "sent")
             elif notification.method == "email":
-                # Email channel is not implemented in this test, so it should not be sent
+                # The email could not be sent in this test
                 self.assertFalse(notification.sent)
+                self.assertEqual(notification.status, "failed")
+
+
+class AsyncAlertWebhookViewTestCase(TestCase):
+
+    def setUp(self):
+        self.store = Store.objects.create(location="test-store", name="Test Store")
+        self.data = {
+            "url": "http://example.com/alert",
+            "location": self.store.location,
+            "alert_uuid": "test-alert-uuid",
+            "label": "theft",
+            "time_spotted": 1234567890.0,
+        }
+
+    def subscribe_users(self, count):
+        for i in range(count):
+            user = User.objects.create(email=f"user{i}@user.com", api_uid=f"uid{i}")
+            UserAlertSubscripion.objects.create(
+                user=user, store=self.store, alert_preference="both", notification_channel="api"
+            )
+
+    @mock.patch("alerts.channels.api_channel.APIChannel._post")
+    def test_post_sends_concurrently(self, mock_post):
+        self.subscribe_users(5)
+        lock = threading.Lock()
+        in_flight = {"current": 0, "max": 0}
+
+        def slow_post(user, alert):
+            with lock:
+                in_flight["current"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["current"])
+            time.sleep(0.05)
+            with lock:
+                in_flight["current"] -= 1
+            return ChannelResult(success=True)
+
+        mock_post.side_effect = slow_post
+        response = self.client.post(
+            reverse("alert-webhook-async"), self.data, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["sent"], 5)
+        self.assertEqual(mock_post.call_count, 5)
+        self.assertGreater(in_flight["max"], 1)
+        self.assertEqual(SentNotification.objects.filter(status="sent", sent=True).count(), 5)
+
+    @mock.patch("alerts.channels.email_channel.smtplib.SMTP")
+    def test_post_renders_email_with_store(self, mock_smtp):
+        # The alert is validated without fetching its store, the email still names it
+        user = User.objects.create(email="user@user.com")
+        UserAlertSubscripion.objects.create(
+            user=user, store=self.store, alert_preference="both", notification_channel="email"
+        )
+        mock_smtp.return_value.send_message.return_value = {}
+        # The mocked connection is not kept in the pool of the email channel for the next tests
+        self.addCleanup(NOTIFICATION_CHANNELS["email"].pool.close)
+        self.assertIn(self.store.location, store_locations)
+        response = self.client.post(
+            reverse("alert-webhook-async"), self.data, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["sent"], 1)
+        message = mock_smtp.return_value.send_message.call_args.args[0]
+        self.assertEqual(message["Subject"], "[CRITICAL] Theft alert at Test Store")
+        self.assertIn("detected at Test Store (test-store)", message.get_content())
+        self.assertEqual(str(Alert.objects.get().location), "Test Store")
+
+    @mock.patch("alerts.channels.api_channel.APIChannel._post")
+    def test_post_classifies_outside_event_loop(self, mock_post):
+        # The classification rules are checked again on each lookup, with a query which can not run in the event loop
+        self.subscribe_users(2)
+        mock_post.return_value = ChannelResult(success=True)
+        with self.settings(ALERTS_CLASSIFICATION_REFRESH_INTERVAL=0):
+            response = self.client.post(
+                reverse("alert-webhook-async"), self.data, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["sent"], 2)
+        self.assertEqual(SentNotification.objects.filter(status="sent", sent=True).count(), 2)
+
+    @mock.patch("alerts.channels.api_channel.APIChannel._post")
+    def test_post_concurrency_limit(self, mock_post):
+        self.subscribe_users(4)
+        lock = threading.Lock()
+        in_flight = {"current": 0, "max": 0}
+
+        def slow_post(user, alert):
+            with lock:
+                in_flight["current"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["current"])
+            time.sleep(0.02)
+            with lock:
+                in_flight["current"] -= 1
+            return ChannelResult(success=True)
+
+        mock_post.side_effect = slow_post
+        with self.settings(ALERTS_ASYNC_CONCURRENCY=1):
+            response = self.client.post(
+                reverse("alert-webhook-async"), self.data, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(in_flight["max"], 1)
+
+    def test_post_invalid_data(self):
+        del self.data["label"]
+        response = self.client.post(
+            reverse("alert-webhook-async"), self.data, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("label", response.json())
 
 
+class AlertBatchWebhookViewTestCase(TestCase):
 
+    def setUp(self):
+        self.stores = [
+            Store.objects.create(location=f"test-store-{i}", name=f"Test Store {i}")
+            for i in range(3)
+        ]
+        for i, store in enumerate(self.stores):
+            user = User.objects.create(email=f"user{i}@user.com", api_uid=f"uid{i}")
+            UserAlertSubscripion.objects.create(
+                user=user, store=store, alert_preference="critical", notification_channel="api"
+            )
+
+    def alert_data(self, index, store, label="theft"):
+        return {
+            "url": f"http://example.com/alert/{index}",
+            "location": store.location,
+            "alert_uuid": f"test-alert-uuid-{index}",
+            "label": label,
+            "time_spotted": 1234567890.0,
+        }
+
+    def test_post_batch(self):
+        data = [self.alert_data(i, store) for i, store in enumerate(self.stores)]
+        data.append(self.alert_data(3, self.stores[0], label="normal"))
+
+        response = self.client.post(reverse("alert-webhook-batch"), data, content_type="application/json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["queued"] * 3 + ["no_subscriptions"])
+        self.assertEqual(Alert.objects.count(), 4)
+        self.assertEqual(SentNotification.objects.filter(status="pending").count(), 3)
+
+    def test_post_batch_query_count(self):
+        data = [self.alert_data(i, store) for i, store in enumerate(self.stores)]
+        with self.settings(ALERTS_ROUTING_REFRESH_INTERVAL=60, ALERTS_CLASSIFICATION_REFRESH_INTERVAL=60):
+            routing_index.get_subscriptions(self.stores[0].location, "critical")
+            self.assertIn(self.stores[0].location, store_locations)
+            # Validation runs no query, the stores being cached, the duplicates check and inserts a fixed number,
+            # and the subscriptions come from the routing index
+            with self.assertNumQueries(5):
+                response = self.client.post(reverse("alert-webhook-batch"), data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_post_batch_partially_invalid(self):
+        data = [
+            self.alert_data(0, self.stores[0]),
+            {"url": "http://example.com/alert", "location": "invalid-location"},
+            self.alert_data(0, self.stores[1]),
+        ]
+
+        response = self.client.post(reverse("alert-webhook-batch"), data, content_type="application/json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["status"], "queued")
+        self.assertEqual(results[1]["status"], "invalid")
+        self.assertIn("location", results[1]["errors"])
+        self.assertEqual(results[2]["status"], "invalid")
+        self.assertIn("alert_uuid", results[2]["errors"])
+        self.assertEqual(Alert.objects.count(), 1)
+
+    def test_post_batch_duplicates(self):
+        Alert.objects.create(
+            alert_uuid="test-alert-uuid-0",
+            url="http://example.com/existing",
+            location=self.stores[0],
+            label="theft",
+            time_spotted=1234567890.0,
+        )
+        data = [self.alert_data(i, store) for i, store in enumerate(self.stores[:2])]
+
+        response = self.client.post(reverse("alert-webhook-batch"), data, content_type="application/json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["duplicate", "queued"])
+        self.assertEqual(SentNotification.objects.count(), 1)
+
+    def test_post_batch_all_invalid(self):
+        response = self.client.post(
+            reverse("alert-webhook-batch"), [{"url": "invalid"}], content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Alert.objects.exists())
+
+    def test_post_not_a_list(self):
+        response = self.client.post(
+            reverse("alert-webhook-batch"), self.alert_data(0, self.stores[0]), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListViewsTestCase(TestCase):
+
+    def setUp(self):
+        self.stores = [
+            Store.objects.create(location=f"test-store-{i}", name=f"Test Store {i}") for i in range(2)
+        ]
+        self.user = User.objects.create(email="test@user.com", api_uid="test_api_uid")
+        for i in range(5):
+            alert = Alert.objects.create(
+                alert_uuid=f"test-alert-uuid-{i}",
+                url=f"http://example.com/alert/{i}",
+                location=self.stores[i % 2],
+                label="theft" if i % 2 else "normal",
+                time_spotted=1234567890.0,
+            )
+            SentNotification.objects.create(
+                alert=alert, user=self.user, method="api", sent=bool(i % 2), status="sent" if i % 2 else "failed"
+            )
+        # Rows with the same timestamp are ordered by id
+        Alert.objects.update(received_at="2025-01-01T00:00:00Z")
+
+    def test_alert_list_pages(self):
+        url = reverse("alert-list-create")
+        uuids = []
+        while url:
+            response = self.client.get(url, {"page_size": 2} if not uuids else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            uuids += [alert["alert_uuid"] for alert in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(uuids, [f"test-alert-uuid-{i}" for i in reversed(range(5))])
+
+    def test_alert_list_filters(self):
+        response = self.client.get(reverse("alert-list-create"), {"store": "test-store-1", "label": "theft"})
+        self.assertEqual(
+            [alert["alert_uuid"] for alert in response.data["results"]],
+            ["test-alert-uuid-3", "test-alert-uuid-1"],
+        )
+        response = self.client.get(reverse("alert-list-create"), {"since": "2025-01-02T00:00:00Z"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_notification_list_filters(self):
+        url = reverse("notification-list-create")
+        response = self.client.get(url, {"sent": "false", "channel": "api", "user": "test@user.com"})
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertTrue(all(not notification["sent"] for notification in response.data["results"]))
+        response = self.client.get(url, {"store": "test-store-1", "status": "sent"})
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_notification_list_filters_use_indexes(self):
+        queryset = SentNotification.objects.filter(alert__location_id="test-store-1", alert__label="theft")
+        self.assertIn("alert_location_label_idx", queryset.order_by("-sent_at", "-id").explain())
+        queryset = SentNotification.objects.filter(status="sent")
+        self.assertIn("notification_status_sent_idx", queryset.order_by("-sent_at", "-id").explain())
+
+    def test_invalid_parameters(self):
+        response = self.client.get(reverse("alert-list-create"), {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("notification-list-create"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("notification-list-create"), {"sent": "maybe"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('webhooks/alerts/', views.AlertWebhookView.as_view(), name='alert-webhook'),
+    path('webhooks/alerts/batch/', views.AlertBatchWebhookView.as_view(), name='alert-webhook-batch'),
+    path('webhooks/alerts/async/', views.AsyncAlertWebhookView.as_view(), name='alert-webhook-async'),
+    path('metrics', views.metrics_view, name='metrics'),
     
     # API endpoints for listing and creating resources
     path('users', views.UserListView.as_view(), name='user-list-create'),
@@ -10,4 +13,8 @@ urlpatterns = [
     path('subscriptions/', views.UserAlertSubscriptionListView.as_view(), name='subscription-list-create'),
     path('notifications/', views.SentNotificationListView.as_view(), name='notification-list-create'),
     path('alerts/', views.AlertListView.as_view(), name='alert-list-create'),
+
+    # Streaming NDJSON exports of the history
+    path('exports/alerts/', views.HistoryExportView.as_view(model='alerts'), name='alert-export'),
+    path('exports/notifications/', views.HistoryExportView.as_view(model='notifications'), name='notification-export'),
 ]
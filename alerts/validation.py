@@ -0,0 +1,144 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+
+from alerts.alerts import classification_index
+from alerts.models.alert import Alert
+from alerts.models.cache_version import CacheVersion
+from alerts.models.store import Store
+from alerts.serializers import AlertSerializer
+
+
+STORE_LOCATIONS_CACHE_NAME = "store-locations"
+
+URL_MAX_LENGTH = Alert._meta.get_field("url").max_length
+ALERT_UUID_MAX_LENGTH = Alert._meta.get_field("alert_uuid").max_length
+LABEL_MAX_LENGTH = Alert._meta.get_field("label").max_length
+
+validate_url = URLValidator()
+
+
+class StoreLocationCache:
+    """
+    Process-local map of the store locations to their names, so that the location of an alert is validated, and its
+    store built with the same fields as if it was fetched, without a query.
+
+    It is invalidated locally by the store signals, and reloaded when the shared CacheVersion changes,
+    which is checked at most every ALERTS_ROUTING_REFRESH_INTERVAL seconds, like the subscription routing index.
+    """
+
+    def __init__(self):
+        self._stores = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __contains__(self, location: str) -> bool:
+        return location in self._get_stores()
+
+    def get_store(self, location: str) -> Store | None:
+        """
+        The store at the given location, not fetched from the database, or None if there is no such store.
+        """
+        name = self._get_stores().get(location)
+        if name is None:
+            return None
+        return Store.from_db(None, ["location", "name"], [location, name])
+
+    def invalidate(self) -> None:
+        """
+        Drop the stores, they are loaded again on the next lookup.
+        """
+        self._stores = None
+
+    def _get_stores(self) -> dict:
+        stores = self._stores
+        if stores is not None and time.monotonic() - self._checked_at < settings.ALERTS_ROUTING_REFRESH_INTERVAL:
+            return stores
+
+        with self._lock:
+            version = CacheVersion.current(STORE_LOCATIONS_CACHE_NAME)
+            if self._stores is None or version != self._version:
+                self._stores = dict(Store.objects.values_list("location", "name"))
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._stores
+
+
+store_locations = StoreLocationCache()
+
+
+def _clean_string(value, max_length: int) -> str | None:
+    """
+    The value without its surrounding whitespace if it is a valid non-empty string, None otherwise.
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    return value if value and len(value) <= max_length else None
+
+
+def validate_alert(alert_data) -> tuple[dict | None, dict | None]:
+    """
+    Validate the data of an alert received by the webhooks, as AlertSerializer does but without any query.
+
+    The fields of a valid alert are checked directly, the location against the cached store locations.
+    As soon as a field is not valid, or the location is unknown, the alert is validated again by AlertSerializer,
+    so that the errors have the same format, and a store created by another process in the meantime is found.
+
+    :param alert_data: The data of the alert, as parsed from the request.
+    :return: The validated data of the alert and None, or None and the errors of each field.
+    """
+    validated_data = _validate_alert(alert_data)
+    if validated_data is not None:
+        return validated_data, None
+
+    serializer = AlertSerializer(data=alert_data)
+    if serializer.is_valid():
+        return serializer.validated_data, None
+    return None, serializer.errors
+
+
+def _validate_alert(alert_data) -> dict | None:
+    """
+    The validated data of an alert, or None if it is not trivially valid.
+    """
+    if not isinstance(alert_data, dict):
+        return None
+
+    url = _clean_string(alert_data.get("url"), URL_MAX_LENGTH)
+    alert_uuid = _clean_string(alert_data.get("alert_uuid"), ALERT_UUID_MAX_LENGTH)
+    location = alert_data.get("location")
+    label = _clean_string(alert_data.get("label"), LABEL_MAX_LENGTH)
+    time_spotted = alert_data.get("time_spotted")
+    if (
+        url is None
+        or alert_uuid is None
+        or label is None
+        or not isinstance(location, str)
+        or type(time_spotted) not in (int, float)
+        or not math.isfinite(time_spotted)
+    ):
+        return None
+    if label not in classification_index.get_labels():
+        return None
+    store = store_locations.get_store(location)
+    if store is None:
+        return None
+    try:
+        validate_url(url)
+    except ValidationError:
+        return None
+
+    return {
+        "url": url,
+        # The store is built from the cache, it is not fetched
+        "location": store,
+        "alert_uuid": alert_uuid,
+        "label": label,
+        "time_spotted": float(time_spotted),
+    }
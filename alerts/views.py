@@ -1,18 +1,32 @@
+import json
 import logging
-import threading
 
-from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.generics import CreateAPIView, ListCreateAPIView, ListAPIView
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from alerts.channels import NOTIFICATION_CHANNELS
+from alerts.admission import webhook_admission
 from alerts.alerts import get_alert_classification
+from alerts.dedup import DuplicateAlertError, recent_alerts
+from alerts.dispatch import adeliver_notifications, queue_alert, queue_alerts
+from alerts.export import get_export_queryset, iter_gzip, iter_ndjson
+from alerts.filters import filter_alerts, filter_notifications
+from alerts.group_commit import GroupCommitTimeoutError, group_writer
+from alerts.metrics import CONTENT_TYPE, REGISTRY, STAGE_LATENCY, instrument_webhook
 from alerts.models.alert import Alert
 from alerts.models.store import Store
 from alerts.models.sent_notification import SentNotification
 from alerts.models.user import User
 from alerts.models.user_alert_subscription import UserAlertSubscripion
+from alerts.pagination import KeysetPagination
+from alerts.validation import validate_alert
 
 
 from alerts.serializers import (
@@ -27,98 +41,267 @@ from alerts.serializers import (
 logger = logging.getLogger(__name__)
 
 
+def get_alert_uuid(alert_data) -> str | None:
+    """
+    Get the uuid of an alert from the raw request data, before its validation.
+    """
+    alert_uuid = alert_data.get("alert_uuid") if isinstance(alert_data, dict) else None
+    return alert_uuid if isinstance(alert_uuid, str) else None
+
+
+def duplicate_alert_data(alert_uuid: str) -> dict:
+    """
+    Response data for an alert which was already received, no notification is sent again.
+    """
+    return {"status": "Duplicate alert", "alert_uuid": alert_uuid}
+
+
+def get_alert_data_severity(alert_data: dict) -> str:
+    """
+    Severity of a validated alert, before it is saved.
+    """
+    return get_alert_classification(alert_data["label"], alert_data["location"].pk, alert_data["time_spotted"])
+
+
+def shed_alert_data() -> dict:
+    """
+    Response data for an alert rejected while the service is overloaded, to be sent again later.
+    """
+    return {"status": "Service overloaded, retry later", "retry_after": webhook_admission.retry_after}
+
+
+def get_retry_after_headers() -> dict:
+    return {"Retry-After": str(webhook_admission.retry_after)}
+
+
 class AlertWebhookView(CreateAPIView):
     """
     View to handle incoming alerts via webhook.
-    This view processes the alert data, checks user preferences, and sends notifications.
+    This view validates the alert data, checks user preferences, and queues the notifications to send.
     """
 
     # serializer_class is used to validate the incoming data and show the html representation of the data
     serializer_class = AlertSerializer
 
+    @instrument_webhook("alert")
+    @webhook_admission.track
     def post(self, request, *args, **kwargs):
 
-        logger.info(f"Received alert data: {request.data}")
+        logger.debug("Received alert data: %s", request.data)
 
-        # Validate the incoming request data
-        serializer = AlertSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Reject the alerts resent by the edge devices before any database work
+        alert_uuid = get_alert_uuid(request.data)
+        if alert_uuid in recent_alerts:
+            return Response(duplicate_alert_data(alert_uuid), status=status.HTTP_409_CONFLICT)
 
-        # Process the alert data
-        alert_data = serializer.validated_data
+        # Validate the incoming request data, without querying the store
+        with STAGE_LATENCY.time(stage="validation"):
+            alert_data, errors = validate_alert(request.data)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create or get the alert instance
-        alert = Alert.objects.create(
-            alert_uuid=alert_data["alert_uuid"],
-            url=alert_data["url"],
-            location=alert_data["location"],
-            label=alert_data["label"],
-            time_spotted=alert_data["time_spotted"],
-        )
+        # Shed the alerts which are not critical while the service is overloaded, before any write
+        if not webhook_admission.admit(get_alert_data_severity(alert_data)):
+            return Response(
+                shed_alert_data(), status=status.HTTP_429_TOO_MANY_REQUESTS, headers=get_retry_after_headers()
+            )
 
-        # Get all the subscriptions for the store and alert preference based on the alert label
-        severity = get_alert_classification(alert.label)
-        severity_filter = [severity, "both"]
-        user_alert_subscriptions = UserAlertSubscripion.objects.filter(
-            store=alert.location, alert_preference__in=severity_filter
-        ).prefetch_related("user")
+        # Persist the alert and its pending notifications, they are sent by the dispatch workers
+        try:
+            if settings.ALERTS_GROUP_COMMIT:
+                alert, sent_notifications = group_writer.queue_alert(alert_data)
+            else:
+                alert, sent_notifications = queue_alert(alert_data)
+        except DuplicateAlertError as e:
+            return Response(duplicate_alert_data(e.alert_uuid), status=status.HTTP_409_CONFLICT)
+        except GroupCommitTimeoutError:
+            # The alert was not committed, it can be sent again without being a duplicate
+            return Response(
+                {"status": "Alert not stored in time, retry later", "retry_after": webhook_admission.retry_after},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers=get_retry_after_headers(),
+            )
 
-        if not user_alert_subscriptions:
+        if not sent_notifications:
             logger.info(
-                f"No user subscriptions found for store {alert.location} with alert preference {severity_filter}."
+                "No user subscriptions found for store %s with alert label %s.", alert.location_id, alert.label
             )
             return Response(
                 {"status": "No user subscriptions found"},
                 status=status.HTTP_204_NO_CONTENT,
             )
-        
-       
-        # This method should be called in a separate thread to avoid blocking the request, but is currently called directly
-        self.send_alerts(alert, user_alert_subscriptions)
-
-        return Response({"status": "Alert correctly received"}, status=status.HTTP_200_OK)
-    
-    def send_alerts(self, alert: Alert, user_alert_subscriptions: list[UserAlertSubscripion]):
-        """
-        Send alerts to all users subscribed to the store and alert preference.
-        This method is called in a separate thread to avoid blocking the request.
-        """
-        for subscription in user_alert_subscriptions:
-            # Create the SentNotification instance
-            # Initially set sent to False, it will be updated after sending the notification
-            sent_notification = SentNotification.objects.create(
-                alert=alert,
-                user=subscription.user,
-                method=subscription.notification_channel,
-                sent_at=timezone.now(),
-                sent=False,
+
+        return Response(
+            {"status": "Alert correctly received", "notifications": len(sent_notifications)},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class AlertBatchWebhookView(CreateAPIView):
+    """
+    View to handle a batch of incoming alerts via webhook.
+    All the valid alerts are inserted and their notifications queued in bulk, and a result is returned for each alert.
+    """
+
+    serializer_class = AlertSerializer
+
+    @instrument_webhook("batch")
+    @webhook_admission.track
+    def post(self, request, *args, **kwargs):
+        alerts_data = request.data
+        if not isinstance(alerts_data, list):
+            return Response(
+                {"detail": "Expected a list of alerts."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(alerts_data) > settings.ALERTS_BATCH_MAX_SIZE:
+            return Response(
+                {"detail": f"A batch can not contain more than {settings.ALERTS_BATCH_MAX_SIZE} alerts."},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        
-            channel = NOTIFICATION_CHANNELS.get(subscription.notification_channel)
-            if not channel:
-                logger.error(
-                    f"Notification channel {subscription.notification_channel} not found for user {subscription.user.email}."
+
+        logger.info("Received batch of %d alerts", len(alerts_data))
+
+        results = [{"index": index} for index in range(len(alerts_data))]
+
+        # The unique validator only checks the database, duplicates inside the batch are rejected here
+        seen_uuids = set()
+        candidates = []
+        for index, alert_data in enumerate(alerts_data):
+            alert_uuid = get_alert_uuid(alert_data)
+            if alert_uuid in recent_alerts:
+                results[index].update(alert_uuid=alert_uuid, status="duplicate")
+                continue
+            if alert_uuid in seen_uuids:
+                results[index].update(
+                    status="invalid",
+                    errors={"alert_uuid": ["Duplicate alert_uuid in batch."]},
                 )
                 continue
+            if alert_uuid is not None:
+                seen_uuids.add(alert_uuid)
+            candidates.append(index)
 
-            # Send the alert using the specified channel
-            result = channel.send_alert(
-                subscription.user,
-                alert,
-            )
+        # Validate the incoming request data, without querying the stores
+        valid_alerts_data = []
+        valid_candidates = []
+        with STAGE_LATENCY.time(stage="validation"):
+            for index in candidates:
+                alert_data, errors = validate_alert(alerts_data[index])
+                if errors:
+                    results[index].update(status="invalid", errors=errors)
+                else:
+                    valid_alerts_data.append(alert_data)
+                    valid_candidates.append(index)
 
-            # Log the result of the notification attempt
-            if result.success:
-                logger.info(
-                    f"Alert sent successfully to {subscription.user.email} via {subscription.notification_channel}."
-                )
-                sent_notification.sent = True
-                sent_notification.save()
+        # Shed the alerts which are not critical while the service is overloaded, the critical ones are still queued
+        admitted_alerts_data = []
+        admitted_candidates = []
+        for index, alert_data in zip(valid_candidates, valid_alerts_data):
+            if webhook_admission.admit(get_alert_data_severity(alert_data)):
+                admitted_alerts_data.append(alert_data)
+                admitted_candidates.append(index)
             else:
-                logger.error(
-                    f"Failed to send alert to {subscription.user.email} via {subscription.notification_channel}: {result.info}"
-                )
+                results[index].update(alert_uuid=alert_data["alert_uuid"], status="shed")
+        shed = len(admitted_candidates) < len(valid_candidates)
+        valid_alerts_data, valid_candidates = admitted_alerts_data, admitted_candidates
+        headers = get_retry_after_headers() if shed else None
+
+        if not valid_candidates:
+            if all(result["status"] == "duplicate" for result in results):
+                return Response({"results": results}, status=status.HTTP_409_CONFLICT)
+            if shed:
+                return Response({"results": results}, status=status.HTTP_429_TOO_MANY_REQUESTS, headers=headers)
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Persist the alerts and their pending notifications, they are sent by the dispatch workers
+        queued = queue_alerts(valid_alerts_data)
+
+        for index, alert_data, queued_alert in zip(valid_candidates, valid_alerts_data, queued):
+            if queued_alert is None:
+                results[index].update(alert_uuid=alert_data["alert_uuid"], status="duplicate")
+                continue
+            alert, sent_notifications = queued_alert
+            results[index].update(
+                alert_uuid=alert.alert_uuid,
+                status="queued" if sent_notifications else "no_subscriptions",
+                notifications=len(sent_notifications),
+            )
+
+        return Response({"results": results}, status=status.HTTP_202_ACCEPTED, headers=headers)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAlertWebhookView(View):
+    """
+    Asynchronous version of the alert webhook, to be served under ASGI.
+    Instead of queuing the notifications, this view sends them right away to all the subscribed users concurrently,
+    with at most ALERTS_ASYNC_CONCURRENCY notifications being sent at the same time.
+    """
+
+    @instrument_webhook("async")
+    @webhook_admission.track
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"detail": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.debug("Received alert data: %s", data)
+
+        # Reject the alerts resent by the edge devices before any database work
+        alert_uuid = get_alert_uuid(data)
+        if alert_uuid in recent_alerts:
+            return JsonResponse(duplicate_alert_data(alert_uuid), status=status.HTTP_409_CONFLICT)
+
+        # Validate the incoming request data, the store locations may have to be loaded
+        with STAGE_LATENCY.time(stage="validation"):
+            alert_data, errors = await sync_to_async(validate_alert)(data)
+        if errors:
+            return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Shed the alerts which are not critical while the service is overloaded, the outbox depth may be counted
+        if not await sync_to_async(lambda: webhook_admission.admit(get_alert_data_severity(alert_data)))():
+            return JsonResponse(
+                shed_alert_data(), status=status.HTTP_429_TOO_MANY_REQUESTS, headers=get_retry_after_headers()
+            )
+
+        # The notifications are created claimed, so that the dispatch workers do not send them as well
+        try:
+            alert, sent_notifications = await sync_to_async(queue_alert)(alert_data, claimed=True)
+        except DuplicateAlertError as e:
+            return JsonResponse(duplicate_alert_data(e.alert_uuid), status=status.HTTP_409_CONFLICT)
+
+        if not sent_notifications:
+            logger.info(
+                "No user subscriptions found for store %s with alert label %s.", alert.location_id, alert.label
+            )
+            return JsonResponse(
+                {"status": "No user subscriptions found"},
+                status=status.HTTP_204_NO_CONTENT,
+            )
+
+        # The notifications held for a digest are sent by the dispatch workers at the end of their window
+        claimed_notifications = [
+            sent_notification for sent_notification in sent_notifications if sent_notification.status == "processing"
+        ]
+        sent = await adeliver_notifications(claimed_notifications) if claimed_notifications else 0
+
+        return JsonResponse(
+            {
+                "status": "Alert correctly received",
+                "sent": sent,
+                "failed": len(claimed_notifications) - sent,
+                "held": len(sent_notifications) - len(claimed_notifications),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+def metrics_view(request):
+    """
+    Expose the metrics of the web process in the Prometheus text format.
+    """
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 
 # API Views for listing and creating resources (these are used to fill the tables using the browser version of the API)
@@ -140,8 +323,43 @@ class UserAlertSubscriptionListView(ListCreateAPIView):
 class SentNotificationListView(ListAPIView):
     queryset = SentNotification.objects.all()
     serializer_class = SentNotificationSerializer
+    pagination_class = KeysetPagination
+    keyset_field = "sent_at"
+
+    def get_queryset(self):
+        return filter_notifications(super().get_queryset(), self.request.query_params)
 
 
 class AlertListView(ListAPIView):
     queryset = Alert.objects.all()
-    serializer_class = AlertSerializer
\ No newline at end of file
+    serializer_class = AlertSerializer
+    pagination_class = KeysetPagination
+    keyset_field = "received_at"
+
+    def get_queryset(self):
+        return filter_alerts(super().get_queryset(), self.request.query_params)
+
+class HistoryExportView(APIView):
+    """
+    Stream the whole alert or notification history as NDJSON, with the same filters as the lists.
+
+    The rows are read and written by chunks, so the export uses constant memory whatever the period exported.
+    Add compression=gzip to the query parameters to download it gzip compressed.
+    """
+
+    # "alerts" or "notifications", set in the urls
+    model = None
+
+    def get(self, request, *args, **kwargs):
+        # Filters are validated before the response starts streaming, so that invalid ones get a 400 response
+        queryset, fields = get_export_queryset(self.model, request.query_params)
+        content = iter_ndjson(queryset, fields)
+        filename = f"{self.model}.ndjson"
+
+        if request.query_params.get("compression") == "gzip":
+            response = StreamingHttpResponse(iter_gzip(content), content_type="application/gzip")
+            filename += ".gz"
+        else:
+            response = StreamingHttpResponse(content, content_type="application/x-ndjson")
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,73 @@
+import signal
+
+import django
+
+
+# The functions of this module are run in the dispatch worker processes, which import this module before Django
+# is set up: the app modules are only imported inside the functions, once it is.
+
+# Event stopping the shard of a worker process, given when the process is spawned
+_stop = None
+
+
+def init_process_worker(stop=None):
+    """
+    Set up Django in a freshly spawned worker process.
+
+    :param stop: The event stopping the shard of the worker. When given, the worker is stopped by it and not by Ctrl+C,
+        and SIGTERM sets it like in the main process, so that the worker finishes its current batch before exiting.
+    """
+    global _stop
+    if stop is not None:
+        _stop = stop
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    django.setup()
+
+
+def send_chunk(notification_ids: list[int], claim_token: str) -> list:
+    """
+    Send a chunk of claimed notifications from a pool worker.
+    Each worker thread or process uses its own database connection, closed once the chunk is sent.
+
+    :param claim_token: The token the notifications were claimed with.
+    """
+    from django.db import connections
+
+    from alerts.dispatch import send_notification_ids
+
+    try:
+        return send_notification_ids(notification_ids, claim_token)
+    finally:
+        connections.close_all()
+
+
+def run_shard(shard: int, shards: int, batch_size: int, poll_interval: float, once: bool, stop=None) -> int:
+    """
+    Send the notifications of the stores of a shard, one batch after the other in the order they were queued,
+    until the stop event is set. The current batch is always finished and saved before stopping.
+
+    :param stop: The event stopping the worker, the one given to the worker process by default.
+    :return: The number of notifications sent.
+    """
+    from django.db import connections
+
+    from alerts.dispatch import claim_pending_notifications, save_results, send_notification_ids
+
+    if stop is None:
+        stop = _stop
+    sent = 0
+    try:
+        while not stop.is_set():
+            notification_ids = claim_pending_notifications(batch_size, shard=shard, shards=shards)
+            if not notification_ids:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            sent += save_results(
+                send_notification_ids(notification_ids, notification_ids.claim_token), notification_ids.claim_token
+            )
+    finally:
+        connections.close_all()
+    return sent
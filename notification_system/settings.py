@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,6 +82,26 @@ DATABASES = {
     }
 }
 
+# SQLite production profile, opt-in with SQLITE_PRODUCTION_PROFILE=true:
+# - WAL journal, so that the readers do not block the writer and the writer does not block the readers
+# - synchronous NORMAL, safe with WAL, only syncing at checkpoints instead of at each commit
+# - busy timeout, the writes waiting for the write lock up to this number of seconds instead of failing
+# - immediate transactions, taking the write lock when they start, so that they wait for it instead of failing
+#   with "database is locked" when upgrading a read lock
+
+SQLITE_PRODUCTION_PROFILE = os.getenv("SQLITE_PRODUCTION_PROFILE", "false").lower() in ("1", "true", "yes")
+
+if SQLITE_PRODUCTION_PROFILE:
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': float(os.getenv("SQLITE_BUSY_TIMEOUT", 20)),
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            "PRAGMA journal_mode=WAL;"
+            f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')};"
+            "PRAGMA temp_store=MEMORY;"
+        ),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,3 +143,133 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Notification dispatch
+# Pending notifications are stored in the outbox by the webhook and sent by the `dispatch_notifications` command
+
+ALERTS_DISPATCH_WORKERS = int(os.getenv("ALERTS_DISPATCH_WORKERS", 4))
+
+# Workers of `dispatch_notifications` reserved to each lane, so that critical alerts are not queued behind a storm of
+# standard ones. The lanes with 0 workers are sent by the ALERTS_DISPATCH_WORKERS shared ones, the critical ones first.
+ALERTS_DISPATCH_CRITICAL_WORKERS = int(os.getenv("ALERTS_DISPATCH_CRITICAL_WORKERS", 2))
+ALERTS_DISPATCH_STANDARD_WORKERS = int(os.getenv("ALERTS_DISPATCH_STANDARD_WORKERS", ALERTS_DISPATCH_WORKERS))
+
+ALERTS_DISPATCH_BATCH_SIZE = int(os.getenv("ALERTS_DISPATCH_BATCH_SIZE", 100))
+
+ALERTS_DISPATCH_POLL_INTERVAL = float(os.getenv("ALERTS_DISPATCH_POLL_INTERVAL", 1))
+
+# Seconds after which a notification claimed by a worker that died is claimed again
+ALERTS_DISPATCH_CLAIM_TIMEOUT = int(os.getenv("ALERTS_DISPATCH_CLAIM_TIMEOUT", 300))
+
+# Number of shards the stores are split into by the `dispatch_sharded` command, one worker process per shard
+ALERTS_DISPATCH_SHARDS = int(os.getenv("ALERTS_DISPATCH_SHARDS", 4))
+
+# Maximum number of notifications sent at the same time by the asynchronous webhook
+ALERTS_ASYNC_CONCURRENCY = int(os.getenv("ALERTS_ASYNC_CONCURRENCY", 10))
+
+# Admission control of the alert webhooks: when more than ALERTS_ADMISSION_MAX_IN_FLIGHT requests are processed at
+# the same time by a process, or more than ALERTS_ADMISSION_MAX_OUTBOX_DEPTH notifications are pending in the outbox,
+# the alerts which are not critical are rejected with a 429, to be sent again after ALERTS_ADMISSION_RETRY_AFTER seconds.
+# The outbox depth is counted at most every ALERTS_ADMISSION_REFRESH_INTERVAL seconds. 0 disables a threshold.
+
+ALERTS_ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ALERTS_ADMISSION_MAX_IN_FLIGHT", 64))
+
+ALERTS_ADMISSION_MAX_OUTBOX_DEPTH = int(os.getenv("ALERTS_ADMISSION_MAX_OUTBOX_DEPTH", 100000))
+
+ALERTS_ADMISSION_REFRESH_INTERVAL = float(os.getenv("ALERTS_ADMISSION_REFRESH_INTERVAL", 1))
+
+ALERTS_ADMISSION_RETRY_AFTER = int(os.getenv("ALERTS_ADMISSION_RETRY_AFTER", 5))
+
+# Maximum number of alerts accepted in one request by the batch webhook
+ALERTS_BATCH_MAX_SIZE = int(os.getenv("ALERTS_BATCH_MAX_SIZE", 500))
+
+# Seconds between two checks that the in-memory subscription routing index is still up to date.
+# Changes made in the same process are applied right away, changes made by other processes after at most this delay.
+ALERTS_ROUTING_REFRESH_INTERVAL = float(os.getenv("ALERTS_ROUTING_REFRESH_INTERVAL", 1))
+
+# Time zone of the time of day of the classification rules
+ALERTS_CLASSIFICATION_TIME_ZONE = os.getenv("ALERTS_CLASSIFICATION_TIME_ZONE", TIME_ZONE)
+
+# Seconds between two checks that the compiled classification rules are still up to date, as for the routing index
+ALERTS_CLASSIFICATION_REFRESH_INTERVAL = float(os.getenv("ALERTS_CLASSIFICATION_REFRESH_INTERVAL", 1))
+
+# Retry of the failed notifications by the `retry_notifications` command
+# The delay before the next attempt doubles after each attempt, from the base delay up to the max delay (in seconds)
+
+ALERTS_RETRY_MAX_ATTEMPTS = int(os.getenv("ALERTS_RETRY_MAX_ATTEMPTS", 5))
+
+ALERTS_RETRY_BASE_DELAY = float(os.getenv("ALERTS_RETRY_BASE_DELAY", 30))
+
+ALERTS_RETRY_MAX_DELAY = float(os.getenv("ALERTS_RETRY_MAX_DELAY", 3600))
+
+ALERTS_RETRY_BATCH_SIZE = int(os.getenv("ALERTS_RETRY_BATCH_SIZE", 50))
+
+# Maximum number of notifications retried per second, so that the catch-up after an outage stays bounded
+ALERTS_RETRY_RATE = float(os.getenv("ALERTS_RETRY_RATE", 10))
+
+# Number of recently received alert uuids kept in memory to reject the duplicates, and seconds during which they are kept
+ALERTS_DEDUP_CACHE_SIZE = int(os.getenv("ALERTS_DEDUP_CACHE_SIZE", 10000))
+
+ALERTS_DEDUP_CACHE_TTL = float(os.getenv("ALERTS_DEDUP_CACHE_TTL", 600))
+
+# Default number of rows per page of the alert and notification lists
+ALERTS_PAGE_SIZE = int(os.getenv("ALERTS_PAGE_SIZE", 100))
+
+# Retention of the history by the `prune_history` command, in days
+# Old rows are deleted by chunks of consecutive primary keys, with a pause (in seconds) between two chunks
+
+ALERTS_RETENTION_ALERTS_DAYS = int(os.getenv("ALERTS_RETENTION_ALERTS_DAYS", 90))
+
+ALERTS_RETENTION_NOTIFICATIONS_DAYS = int(os.getenv("ALERTS_RETENTION_NOTIFICATIONS_DAYS", 30))
+
+ALERTS_RETENTION_CHUNK_SIZE = int(os.getenv("ALERTS_RETENTION_CHUNK_SIZE", 500))
+
+ALERTS_RETENTION_PAUSE = float(os.getenv("ALERTS_RETENTION_PAUSE", 0.1))
+
+# Number of rows fetched at once from the database by the history exports
+ALERTS_EXPORT_CHUNK_SIZE = int(os.getenv("ALERTS_EXPORT_CHUNK_SIZE", 2000))
+
+# Logging
+# The records of the app are written as JSON lines by a background thread, so that logging never blocks a request
+
+ALERTS_LOG_LEVEL = os.getenv("ALERTS_LOG_LEVEL", "INFO")
+
+# Maximum number of records waiting to be written, the next ones are dropped
+ALERTS_LOG_QUEUE_SIZE = int(os.getenv("ALERTS_LOG_QUEUE_SIZE", 10000))
+
+# Maximum number of failed notifications logged individually per alert and channel, the others are only counted
+ALERTS_LOG_FAILURES_PER_ALERT = int(os.getenv("ALERTS_LOG_FAILURES_PER_ALERT", 5))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "alerts.log.JSONFormatter"},
+    },
+    "handlers": {
+        "queue": {
+            "class": "alerts.log.QueueLogHandler",
+            "formatter": "json",
+            "max_size": ALERTS_LOG_QUEUE_SIZE,
+        },
+    },
+    "loggers": {
+        "alerts": {
+            "handlers": ["queue"],
+            "level": ALERTS_LOG_LEVEL,
+            "propagate": False,
+        },
+    },
+}
+
+# Group commit of the alerts received by the webhook: the alerts received concurrently are inserted together,
+# in one transaction every ALERTS_GROUP_COMMIT_WINDOW seconds, with at most ALERTS_GROUP_COMMIT_MAX_SIZE alerts
+ALERTS_GROUP_COMMIT = os.getenv("ALERTS_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+
+ALERTS_GROUP_COMMIT_WINDOW = float(os.getenv("ALERTS_GROUP_COMMIT_WINDOW", 0.005))
+
+ALERTS_GROUP_COMMIT_MAX_SIZE = int(os.getenv("ALERTS_GROUP_COMMIT_MAX_SIZE", 200))
+
+# Maximum number of seconds a request waits for its alert to be committed
+ALERTS_GROUP_COMMIT_TIMEOUT = float(os.getenv("ALERTS_GROUP_COMMIT_TIMEOUT", 10))